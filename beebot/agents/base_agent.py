@@ -1,12 +1,23 @@
 import json
 from typing import TYPE_CHECKING
 
-from beebot.body.pack_utils import functions_detail_list
+from beebot.body.llm import call_llm, reserved_prompt_tokens
+from beebot.body.pack_utils import functions_detail_list, precompute_pack_functions
+from beebot.body.tokens import count_tokens, fit_prompt_variables
+from beebot.execution.history_summarization_prompt import (
+    history_summarization_template,
+)
 from beebot.planner.planning_prompt import planning_prompt_template
 
 if TYPE_CHECKING:
+    from beebot.execution import Step
     from beebot.execution.task_execution import TaskExecution
 
+VARIABLES_HEADER = (
+    "\n# Variables\n## The AI Assistant has access to these variables. Variables are local unless explicitly "
+    'declared as global. Each variable is a string with the value enclosed in triple quotes ("""):'
+)
+
 
 class BaseAgent:
     NAME = ""
@@ -16,6 +27,12 @@ class BaseAgent:
     def __init__(self, task_execution: "TaskExecution"):
         self.task_execution = task_execution
 
+    @classmethod
+    def precompute_functions(cls):
+        """Render the functions of every agent's packs ahead of time, so that the first prompts don't have to"""
+        for agent_class in [cls, *cls.__subclasses__()]:
+            precompute_pack_functions(agent_class.PACKS)
+
     @property
     def planning_prompt_template(self) -> str:
         return planning_prompt_template()
@@ -26,14 +43,13 @@ class BaseAgent:
 
     async def prompt_kwargs(self) -> dict[str, str]:
         task = self.task_execution.instructions
-        variables = self.compile_variables()
+        history, variables = await self.compile_context(
+            self.task_execution.body.planner_llm.model_name
+        )
 
-        files = []
-        for document in await self.task_execution.body.file_manager.all_documents():
-            files.append(document.name)
+        files = await self.task_execution.body.file_manager.document_names()
 
         functions = functions_detail_list(self.task_execution.packs.values())
-        history = await self.task_execution.compile_history()
 
         if files:
             file_list = ", ".join(files)
@@ -58,17 +74,34 @@ class BaseAgent:
         }
 
     async def planning_prompt(self) -> tuple[str, dict[str, str]]:
-        prompt_variables = await self.prompt_kwargs()
+        body = self.task_execution.body
+        model_name = body.planner_llm.model_name
+        prompt_variables = fit_prompt_variables(
+            self.planning_prompt_template,
+            await self.prompt_kwargs(),
+            model_name,
+            reserved_prompt_tokens(body, model_name),
+        )
         return (
             self.planning_prompt_template.format(**prompt_variables),
             prompt_variables,
         )
 
-    def compile_variables(self) -> str:
+    def compile_variables(self, variable_names: set[str] = None) -> str:
+        """Render the variables, optionally only the local variables with one of `variable_names`"""
+        variable_table = self.variable_rows(variable_names)
+        if not variable_table:
+            return ""
+
+        return "\n".join([VARIABLES_HEADER, *variable_table])
+
+    def variable_rows(self, variable_names: set[str] = None) -> list[str]:
         variable_table = []
 
         for value, names in self.variables.items():
-            if value:
+            if variable_names is not None:
+                names = [name for name in names if name in variable_names]
+            if value and names:
                 name_equals = " = ".join(names)
                 variable_row = f'{name_equals} = """{value}"""'
                 variable_table.append(variable_row)
@@ -78,56 +111,118 @@ class BaseAgent:
                 variable_row = f'global {name} = """{value}"""'
                 variable_table.append(variable_row)
 
-        if not variable_table:
-            return ""
+        return variable_table
 
-        header = (
-            "\n# Variables\n## The AI Assistant has access to these variables. Variables are local unless explicitly "
-            'declared as global. Each variable is a string with the value enclosed in triple quotes ("""):\n'
+    async def compile_history(self) -> str:
+        return self.task_execution.history.compile(
+            self.task_execution.steps, self.variables, self.compile_step_history
         )
-        return header + "\n".join(variable_table)
 
-    async def compile_history(self) -> str:
-        if not self.task_execution.steps:
-            return ""
+    async def compile_context(self, model_name: str) -> tuple[str, str]:
+        """
+        The history and variables sections of a prompt for `model_name`. When they don't fit in the model's history
+        token budget, the oldest steps are folded into a rolling summary, whole windows at a time so that each summary
+        is only generated once, and only the variables of the steps that are still shown are included.
+        """
+        buffer = self.task_execution.history
+        history = await self.compile_history()
+        variable_rows = self.variable_rows()
+        variables = self.compile_variables()
+
+        config = self.task_execution.body.config
+        budget = config.history_token_budget(model_name)
+        # Finished steps and variables are only tokenized the first time they are seen, so this check doesn't get
+        # slower as the history grows
+        token_count = buffer.token_count(model_name)
+        if variable_rows:
+            token_count += buffer.rows_token_count(
+                [VARIABLES_HEADER, *variable_rows], model_name
+            )
+        if token_count <= budget:
+            return history, variables
+
+        # The cached counts are an estimate, make sure the budget really is exceeded before summarizing
+        exact_count = count_tokens(history, model_name)
+        exact_count += count_tokens(variables, model_name)
+        if exact_count <= budget:
+            return history, variables
+
+        steps = self.task_execution.steps
+        window_size = max(config.history_window_steps, 1)
+        # Always keep at least one full window of the most recent steps verbatim
+        folded_count = (len(steps) - window_size) // window_size * window_size
+        if folded_count <= 0:
+            return history, variables
+
+        summary = await self.summarize_history(folded_count, window_size)
+        recent_history = buffer.compile(
+            steps, self.variables, self.compile_step_history, start=folded_count
+        )
+        history = (
+            f"(Summary of the first {folded_count} functions executed)\n{summary}\n"
+            f"(The most recent functions executed)\n{recent_history}"
+        )
+        variables = self.compile_variables(
+            buffer.window_variable_names(steps, self.variables, folded_count)
+        )
+        return history, variables
+
+    async def summarize_history(self, step_count: int, window_size: int) -> str:
+        """A summary of the first `step_count` steps, extending the latest cached summary one window at a time"""
+        buffer = self.task_execution.history
+        if step_count in buffer.summaries:
+            return buffer.summaries[step_count]
+
+        covered_count = max(
+            (count for count in buffer.summaries if count < step_count), default=0
+        )
+        summary = buffer.summaries.get(covered_count, "")
+        while covered_count < step_count:
+            window_end = min(covered_count + window_size, step_count)
+            window_history = "\n".join(
+                segment
+                for segment in buffer.segments[covered_count:window_end]
+                if segment
+            )
+            prompt = history_summarization_template().format(
+                task=self.task_execution.instructions,
+                previous_summary=summary or "(None)",
+                history=window_history,
+            )
+            response = await call_llm(
+                self.task_execution.body,
+                prompt,
+                function_call="none",
+                include_functions=False,
+            )
+            summary = response.text.strip()
+            buffer.summaries[window_end] = summary
+            covered_count = window_end
 
+        return summary
+
+    def compile_step_history(self, step: "Step", variable_name: str) -> list[str]:
         step_table = []
-        used_variables = []
-
-        for step in self.task_execution.steps:
-            if not step.observation:
-                continue
-
-            outcome = step.observation.response
-
-            variable_names = self.variables.get(outcome)
-            try:
-                variable_name = next(
-                    name for name in variable_names if name not in used_variables
-                )
-            except StopIteration:
-                variable_name = variable_names[-1]
-
-            used_variables.append(variable_name)
-
-            tool_arg_list = [
-                f"{name}={json.dumps(value)}"
-                for name, value in step.decision.tool_args.items()
-            ]
-            tool_args = ", ".join(tool_arg_list)
-
-            if outcome and outcome in self.variables:
-                step_table.append(
-                    f">>> {variable_name} = {step.decision.tool_name}({tool_args})"
-                )
-            else:
-                step_table.append(f">>> {step.decision.tool_name}({tool_args})")
-
-            if not step.observation.success or outcome.startswith("Error"):
-                step_table.append(step.observation.error_reason or outcome)
-            else:
-                step_table.append(
-                    f"Success! Result stored in local variable {variable_name}."
-                )
-
-        return "\n".join(step_table)
+        outcome = step.observation.response
+
+        tool_arg_list = [
+            f"{name}={json.dumps(value)}"
+            for name, value in step.decision.tool_args.items()
+        ]
+        tool_args = ", ".join(tool_arg_list)
+
+        if outcome and outcome in self.variables:
+            step_table.append(
+                f">>> {variable_name} = {step.decision.tool_name}({tool_args})"
+            )
+        else:
+            step_table.append(f">>> {step.decision.tool_name}({tool_args})")
+
+        if not step.observation.success or outcome.startswith("Error"):
+            step_table.append(step.observation.error_reason or outcome)
+        else:
+            step_table.append(
+                f"Success! Result stored in local variable {variable_name}."
+            )
+
+        return step_table
@@ -39,12 +39,7 @@ class CodingAgent(BaseAgent):
         kwargs = await super().prompt_kwargs()
         kwargs.pop("file_list")
 
-        structure = []
-        documents = await self.task_execution.body.file_manager.all_documents()
-        documents.sort(key=lambda d: d.name)
-        for document in documents:
-            indent_count = len(document.name.split("/"))
-            structure.append(f"{' ' * indent_count}- {document.name}")
+        structure = await self.task_execution.body.file_manager.directory_structure()
 
         if structure:
             kwargs["file_list"] = "\n# Project structure\n" + "\n".join(structure)
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, AsyncIterator, ClassVar, Union
+
+from beebot.body import Body
+from beebot.models.database_models import BodyModel
+
+if TYPE_CHECKING:
+    from beebot.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class BodyCache:
+    """
+    Keeps live Bodies in memory between API requests, so that consecutive steps of a task don't have to rebuild the
+    Body from the database. The least recently used Bodies are evicted once there are more than `max_size`, as are any
+    which have been idle for `idle_timeout` seconds. On a miss the Body is hydrated from the database.
+
+    This assumes that this process is the only one running the tasks it caches. Use `checkout` to keep concurrent
+    requests for the same task from interleaving. Bodies which are checked out are never evicted to make room, and
+    each task has its own workspace directory under `workspace_path`, so that their files don't mix.
+    """
+
+    max_size: int
+    idle_timeout: int
+    workspace_path: Union[str, None]
+    # Body and the time it was last used, by task ID. Most recently used last.
+    bodies: OrderedDict[int, tuple[Body, float]]
+    locks: dict[int, asyncio.Lock]
+    # How many requests are holding or waiting for the lock of each task
+    checkout_counts: dict[int, int]
+
+    _global_cache: ClassVar["BodyCache"] = None
+
+    def __init__(
+        self, max_size: int = 32, idle_timeout: int = 600, workspace_path: str = None
+    ):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.workspace_path = workspace_path
+        self.bodies = OrderedDict()
+        self.locks = {}
+        self.checkout_counts = {}
+
+    @classmethod
+    def from_config(cls, config: "Config") -> "BodyCache":
+        return cls(
+            max_size=config.api_body_cache_size,
+            idle_timeout=config.api_body_cache_idle_timeout,
+            workspace_path=config.workspace_path,
+        )
+
+    @classmethod
+    def global_cache(cls, config: "Config") -> "BodyCache":
+        if not cls._global_cache:
+            cls._global_cache = cls.from_config(config)
+        return cls._global_cache
+
+    def task_workspace_path(self, task_id: int) -> Union[str, None]:
+        """The workspace directory of a task, or None to use the configured one"""
+        if not self.workspace_path:
+            return None
+        return os.path.join(self.workspace_path, f"task_{task_id}")
+
+    @asynccontextmanager
+    async def checkout(self, task_id: int) -> AsyncIterator[Union[Body, None]]:
+        """
+        The Body of a task, held under the task's lock for the duration of the block so that concurrent requests for
+        the same task don't interleave. None if there is no such task.
+        """
+        known = task_id in self.locks or task_id in self.bodies
+        if not known and not await BodyModel.exists(id=task_id):
+            yield None
+            return
+
+        lock = self.locks.setdefault(task_id, asyncio.Lock())
+        self.checkout_counts[task_id] = self.checkout_counts.get(task_id, 0) + 1
+        try:
+            async with lock:
+                yield await self.get(task_id)
+        finally:
+            self.checkout_counts[task_id] -= 1
+            if not self.checked_out(task_id):
+                del self.checkout_counts[task_id]
+                if task_id not in self.bodies:
+                    del self.locks[task_id]
+
+    def checked_out(self, task_id: int) -> bool:
+        return self.checkout_counts.get(task_id, 0) > 0
+
+    async def get(self, task_id: int) -> Union[Body, None]:
+        """The Body of a task, or None if there is no such task. Use `checkout` unless the task's lock is held."""
+        await self.evict_idle()
+
+        if task_id in self.bodies:
+            body, _last_used = self.bodies.pop(task_id)
+            self.bodies[task_id] = (body, time.monotonic())
+            return body
+
+        body_model = await BodyModel.get_or_none(id=task_id).prefetch_related(
+            *BodyModel.INCLUSIVE_PREFETCH
+        )
+        if not body_model:
+            return None
+
+        body = await Body.from_model(
+            body_model, workspace_path=self.task_workspace_path(task_id)
+        )
+        await self.add(body)
+        return body
+
+    async def add(self, body: Body):
+        task_id = body.model_object.id
+        self.bodies.pop(task_id, None)
+        self.bodies[task_id] = (body, time.monotonic())
+
+        # Bodies which are checked out may be in the middle of a cycle, they are left over the limit until they're free
+        evictable_ids = [
+            evictable_id
+            for evictable_id in self.bodies
+            if evictable_id != task_id and not self.checked_out(evictable_id)
+        ]
+        for evicted_id in evictable_ids[: max(len(self.bodies) - self.max_size, 0)]:
+            await self.evict(evicted_id)
+
+    async def evict(self, task_id: int):
+        """Drop a Body, e.g. when it may no longer match the database. It will be hydrated again on the next `get`."""
+        entry = self.bodies.pop(task_id, None)
+        if not self.checked_out(task_id):
+            self.locks.pop(task_id, None)
+
+        if entry:
+            body, _last_used = entry
+            await body.pack_manager.teardown()
+
+    async def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        idle_ids = [
+            task_id
+            for task_id, (_body, last_used) in self.bodies.items()
+            if last_used < cutoff and not self.checked_out(task_id)
+        ]
+        for task_id in idle_ids:
+            logger.debug(f"Evicting idle Body of task {task_id}")
+            await self.evict(task_id)
+
+    async def clear(self):
+        for task_id in list(self.bodies):
+            await self.evict(task_id)
@@ -1,131 +1,339 @@
 import logging
+import os
+from datetime import datetime
+from typing import Any, Iterator, Union
+from urllib.parse import quote
 
 from fastapi import HTTPException
 from starlette.requests import Request
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, StreamingResponse
+from tortoise.queryset import QuerySet
 
+from beebot.api.body_cache import BodyCache
+from beebot.api.step_runner import StepRunner
 from beebot.body import Body
+from beebot.config import Config
+from beebot.config.large_files import iter_file
 from beebot.execution import Step
-from beebot.models.database_models import BodyModel, StepModel
+from beebot.models.database_models import (
+    BodyModel,
+    DocumentModel,
+    StepModel,
+    initialize_db,
+)
 
 logger = logging.getLogger(__name__)
 
-
-async def body_response(body: Body) -> JSONResponse:
-    artifacts = [
-        {"name": document.name, "content": document.content}
-        for document in await body.file_manager.all_documents()
-    ]
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+ARTIFACT_CHUNK_SIZE = 64 * 1024
+# The fields the list endpoints can return, and their columns. The first is the ID, which is returned by default.
+TASK_FIELDS = {
+    "task_id": "id",
+    "input": "task",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+}
+STEP_FIELDS = {
+    "step_id": "id",
+    "task_execution_id": "task_execution_id",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+}
+
+
+async def body_response(body: Body, since_step_id: int = None) -> JSONResponse:
     return JSONResponse(
         {
             "task_id": str(body.model_object.id),
             "input": body.task,
-            "artifacts": artifacts,
+            **await artifacts_output(body, since_step_id),
         }
     )
 
 
-async def step_response(step: Step, body: Body) -> JSONResponse:
-    artifacts = [
-        {"name": document.name, "content": document.content}
-        for document in await body.file_manager.all_documents()
-    ]
+async def step_response(
+    step: Step, body: Body, since_step_id: int = None
+) -> JSONResponse:
+    # Parts of the step may be missing while it is still running, or if it was the last step
     step_output = {
-        "plan": step.plan.json(),
-        "decision": step.decision.json(),
-        "observation": step.observation.json(),
+        "plan": step.plan.json() if step.plan else None,
+        "decision": step.decision.json() if step.decision else None,
+        "observation": step.observation.json() if step.observation else None,
         "reversible": step.reversible,
     }
+    job = step_runner().job(step.model_object.id)
     return JSONResponse(
         {
             "step_id": str(step.model_object.id),
             "task_id": str(body.model_object.id),
+            "status": job.status if job else "completed",
             "output": step_output,
-            "artifacts": artifacts,
+            **await artifacts_output(body, since_step_id),
             "is_last": body.is_done,
         }
     )
 
 
-async def create_agent_task(request: Request) -> JSONResponse:
-    request_data = await request.json()
-    body = Body(request_data.get("input"))
-    await body.setup()
+async def artifacts_output(body: Body, since_step_id: int = None) -> dict[str, Any]:
+    """The metadata of the artifacts, their content is downloaded separately. With `since_step_id`, only the artifacts
+    which changed since that step, and the names of the ones which were removed."""
+    try:
+        artifacts, removed_names = await body.file_manager.artifacts(since_step_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid since_step_id")
+    if since_step_id is None:
+        return {"artifacts": artifacts}
+    return {"artifacts": artifacts, "removed_artifacts": removed_names}
 
-    return await body_response(body)
 
+def body_cache() -> BodyCache:
+    return BodyCache.global_cache(Config.global_config())
 
-async def execute_agent_task_step(request: Request) -> JSONResponse:
+
+def step_runner() -> StepRunner:
+    return StepRunner.global_runner(Config.global_config())
+
+
+def parse_task_id(request: Request) -> int:
     task_id = request.path_params.get("task_id")
     try:
-        body_model = await BodyModel.get(id=int(task_id)).prefetch_related(
-            BodyModel.INCLUSIVE_PREFETCH
-        )
+        return int(task_id)
     except ValueError:
         logger.error(f"Body ID {task_id} is invalid")
         raise HTTPException(status_code=404, detail="Invalid Task ID")
 
-    if not body_model:
-        logger.error(f"Body with ID {task_id} not found")
-        raise HTTPException(status_code=404, detail="Task not found")
 
-    body = await Body.from_model(body_model)
-    step = await body.cycle()
-    if not step:
-        raise HTTPException(status_code=400, detail="Task is complete")
+def parse_since_step_id(request: Request) -> Union[int, None]:
+    since_step_id = request.query_params.get("since_step_id")
+    if not since_step_id:
+        return None
+    try:
+        return int(since_step_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid since_step_id")
 
-    return await step_response(step, body)
 
+async def create_agent_task(request: Request) -> JSONResponse:
+    request_data = await request.json()
+    config = Config.global_config()
+    cache = body_cache()
+    # The task is saved first, so that it can be given its own workspace
+    await initialize_db(config.database_url)
+    body_model = await BodyModel.create(task=request_data.get("input"))
+    body = Body(
+        body_model.task,
+        config=config,
+        workspace_path=cache.task_workspace_path(body_model.id),
+    )
+    body.model_object = body_model
+    await body.setup()
+    await cache.add(body)
 
-async def agent_task_ids(request: Request) -> JSONResponse:
-    bodies = await BodyModel.filter()
-    return JSONResponse([str(body.id) for body in bodies])
+    return await body_response(body)
 
 
-async def get_agent_task(request: Request) -> JSONResponse:
-    task_id = request.path_params.get("task_id")
-    body_model = await BodyModel.get(id=int(task_id)).prefetch_related(
-        BodyModel.INCLUSIVE_PREFETCH
+async def execute_agent_task_step(request: Request) -> JSONResponse:
+    task_id = parse_task_id(request)
+    if Config.global_config().api_async_steps:
+        return await enqueue_agent_task_step(task_id)
+
+    since_step_id = parse_since_step_id(request)
+    body, step = await cycle_task(task_id)
+    return await step_response(step, body, since_step_id)
+
+
+async def enqueue_agent_task_step(task_id: int) -> JSONResponse:
+    """Queue the next step of the task and return its ID without waiting for it to run"""
+    cache = body_cache()
+    async with cache.checkout(task_id) as body:
+        if not body:
+            logger.error(f"Body with ID {task_id} not found")
+            raise HTTPException(status_code=404, detail="Task not found")
+        if body.is_done:
+            raise HTTPException(status_code=400, detail="Task is complete")
+
+        # The current step is the one the cycle will run
+        step = body.current_task_execution.current_step
+        step_id = step.model_object.id
+        if (job := step_runner().job(step_id)) and not job.done:
+            raise HTTPException(status_code=409, detail="Step is already running")
+
+    job = step_runner().submit(task_id, step_id, cycle_task(task_id))
+    return JSONResponse(
+        {"step_id": str(step_id), "task_id": str(task_id), "status": job.status},
+        status_code=202,
     )
 
-    if not body_model:
-        raise HTTPException(status_code=400, detail="Task not found")
 
-    return await body_response(await Body.from_model(body_model))
+async def cycle_task(task_id: int) -> tuple[Body, Step]:
+    cache = body_cache()
+    async with cache.checkout(task_id) as body:
+        if not body:
+            logger.error(f"Body with ID {task_id} not found")
+            raise HTTPException(status_code=404, detail="Task not found")
 
+        try:
+            step = await body.cycle()
+        except BaseException:
+            # The Body may have stopped part way through the step, so start over from the database next time
+            await cache.evict(task_id)
+            raise
 
-async def list_agent_task_steps(request: Request) -> JSONResponse:
-    task_id = request.path_params.get("task_id")
-    body_model = await BodyModel.get(id=int(task_id)).prefetch_related(
-        BodyModel.INCLUSIVE_PREFETCH
-    )
-    body = await Body.from_model(body_model)
+        if not step:
+            raise HTTPException(status_code=400, detail="Task is complete")
 
-    if not body_model:
-        raise HTTPException(status_code=400, detail="Task not found")
+        return body, step
 
-    step_ids = [
-        m.id for m in await body.current_task_execution.model_object.steps.all()
-    ]
 
-    return JSONResponse(step_ids)
+async def agent_task_ids(request: Request) -> JSONResponse:
+    return await paginated_response(request, BodyModel.all(), "tasks", TASK_FIELDS)
 
 
-async def get_agent_task_step(request: Request) -> JSONResponse:
-    task_id = request.path_params.get("task_id")
-    body_model = await BodyModel.get(id=int(task_id)).prefetch_related(
-        BodyModel.INCLUSIVE_PREFETCH
-    )
+async def get_agent_task(request: Request) -> JSONResponse:
+    task_id = parse_task_id(request)
+    since_step_id = parse_since_step_id(request)
+    cache = body_cache()
+    async with cache.checkout(task_id) as body:
+        if not body:
+            raise HTTPException(status_code=400, detail="Task not found")
 
-    if not body_model:
+        return await body_response(body, since_step_id)
+
+
+async def list_agent_task_steps(request: Request) -> JSONResponse:
+    task_id = parse_task_id(request)
+    if not await BodyModel.exists(id=task_id):
         raise HTTPException(status_code=400, detail="Task not found")
 
-    step_id = request.path_params.get("step_id")
-    step_model = await StepModel.get(id=int(step_id))
+    steps = StepModel.filter(task_execution__body_id=task_id)
+    return await paginated_response(request, steps, "steps", STEP_FIELDS)
+
+
+async def paginated_response(
+    request: Request, queryset: QuerySet, name: str, fields: dict[str, str]
+) -> JSONResponse:
+    """
+    One page of the rows of `queryset` in ID order, without hydrating any models. Query parameters:
+    - `cursor`: the `next_cursor` of the previous page
+    - `page_size`: the number of rows per page, up to MAX_PAGE_SIZE
+    - `fields`: a comma separated list of the `fields` to include, only the ID by default
+    """
+    cursor = request.query_params.get("cursor")
+    page_size = request.query_params.get("page_size", DEFAULT_PAGE_SIZE)
+    try:
+        page_size = min(int(page_size), MAX_PAGE_SIZE)
+        if page_size < 1:
+            raise ValueError
+        if cursor:
+            queryset = queryset.filter(id__gt=int(cursor))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor or page size")
+
+    id_field = next(iter(fields))
+    requested_fields = request.query_params.get("fields")
+    if requested_fields:
+        field_names = [field.strip() for field in requested_fields.split(",")]
+        unknown_fields = set(field_names) - set(fields)
+        if unknown_fields:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(sorted(unknown_fields))}",
+            )
+    else:
+        field_names = [id_field]
+
+    # Fetch one extra row to know whether there is another page
+    columns = dict.fromkeys(["id", *(fields[field_name] for field_name in field_names)])
+    rows = await queryset.order_by("id").limit(page_size + 1).values(*columns)
+    next_cursor = str(rows[page_size - 1]["id"]) if len(rows) > page_size else None
+
+    items = []
+    for row in rows[:page_size]:
+        item = {}
+        for field_name in field_names:
+            value = row[fields[field_name]]
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            elif field_name.endswith("_id") and value is not None:
+                value = str(value)
+            item[field_name] = value
+        items.append(item)
+
+    return JSONResponse({name: items, "next_cursor": next_cursor})
+
+
+async def get_agent_task_step(request: Request) -> JSONResponse:
+    task_id = parse_task_id(request)
+    step_id = int(request.path_params.get("step_id"))
+    since_step_id = parse_since_step_id(request)
+    job = step_runner().job(step_id)
+    if job and not job.done:
+        # Don't wait for the running step to release the task
+        return JSONResponse(
+            {"step_id": str(step_id), "task_id": str(task_id), "status": job.status}
+        )
+
+    cache = body_cache()
+    async with cache.checkout(task_id) as body:
+        if not body:
+            raise HTTPException(status_code=400, detail="Task not found")
+
+        step = next(
+            (
+                step
+                for execution in body.task_executions
+                for step in execution.steps
+                if step.model_object and step.model_object.id == step_id
+            ),
+            None,
+        )
+        if not step:
+            step_model = await StepModel.get_or_none(id=step_id).prefetch_related(
+                *StepModel.RELATED_PREFETCH
+            )
+            if not step_model:
+                raise HTTPException(status_code=400, detail="Step not found")
+            step = await Step.from_model(step_model)
+
+        return await step_response(step, body, since_step_id)
+
+
+async def download_agent_task_artifact(request: Request) -> StreamingResponse:
+    task_id = parse_task_id(request)
+    try:
+        artifact_id = int(request.path_params.get("artifact_id"))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Invalid Artifact ID")
+
+    document = (
+        await DocumentModel.get_or_none(
+            id=artifact_id, document_steps__step__task_execution__body_id=task_id
+        )
+        .distinct()
+        .prefetch_related("blob")
+    )
+    if not document:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+
+    # Only this artifact is read, and it is sent in chunks rather than in one JSON body
+    if document.blob.external:
+        # Only the config of the task's Body is read, so a running step doesn't hold up the download
+        body = await body_cache().get(task_id)
+        store_path = body.config.large_file_store_path
+        chunks = iter_file(os.path.join(store_path, document.blob.hash))
+    else:
+        chunks = iter_chunks(document.blob.content_bytes)
+    return StreamingResponse(
+        chunks,
+        media_type=document.blob.content_type,
+        headers={
+            "Content-Disposition": f"attachment; filename*=UTF-8''{quote(document.name)}",
+            "Content-Length": str(document.blob.size),
+        },
+    )
 
-    if not step_model:
-        raise HTTPException(status_code=400, detail="Step not found")
 
-    body = await Body.from_model(body_model)
-    step = await Step.from_model(step_model)
-    return await step_response(step, body)
+def iter_chunks(content: memoryview) -> Iterator[bytes]:
+    for start in range(0, len(content), ARTIFACT_CHUNK_SIZE):
+        yield bytes(content[start : start + ARTIFACT_CHUNK_SIZE])
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Awaitable, ClassVar, Union
+
+from beebot.notifications import publish_notification
+
+if TYPE_CHECKING:
+    from beebot.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs are remembered so that their status can still be polled, up to this many
+FINISHED_JOB_LIMIT = 1000
+
+
+@dataclass
+class StepJob:
+    task_id: int
+    step_id: int
+    status: str = "running"
+    error: Union[str, None] = None
+    asyncio_task: asyncio.Task = None
+
+    @property
+    def done(self) -> bool:
+        return self.status != "running"
+
+
+class StepRunner:
+    """
+    Runs the steps requested through the API in the background, so that the request can return as soon as the step
+    is queued. At most `max_concurrent_steps` steps run at once in this process, the rest wait their turn. Completion is
+    published on the notifications channel and can also be polled by step ID.
+    """
+
+    max_concurrent_steps: int
+    jobs: OrderedDict[int, StepJob]
+
+    _global_runner: ClassVar["StepRunner"] = None
+
+    def __init__(self, max_concurrent_steps: int = 4):
+        self.max_concurrent_steps = max_concurrent_steps
+        self.jobs = OrderedDict()
+        self._semaphore = None
+
+    @classmethod
+    def from_config(cls, config: "Config") -> "StepRunner":
+        return cls(max_concurrent_steps=config.api_max_concurrent_steps)
+
+    @classmethod
+    def global_runner(cls, config: "Config") -> "StepRunner":
+        if not cls._global_runner:
+            cls._global_runner = cls.from_config(config)
+        return cls._global_runner
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if not self._semaphore:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_steps)
+        return self._semaphore
+
+    def submit(self, task_id: int, step_id: int, run_step: Awaitable) -> StepJob:
+        job = StepJob(task_id=task_id, step_id=step_id)
+        job.asyncio_task = asyncio.create_task(self.run(job, run_step))
+        self.jobs[step_id] = job
+        return job
+
+    def job(self, step_id: int) -> Union[StepJob, None]:
+        return self.jobs.get(step_id)
+
+    async def run(self, job: StepJob, run_step: Awaitable):
+        try:
+            async with self.semaphore:
+                await run_step
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            raise
+        except BaseException as e:
+            logger.error(f"Step {job.step_id} of task {job.task_id} failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+        else:
+            job.status = "completed"
+        finally:
+            self.forget_finished_jobs()
+
+        try:
+            await publish_notification(
+                {
+                    f"step_{job.status}": {
+                        "task_id": job.task_id,
+                        "step_id": job.step_id,
+                        "error": job.error,
+                    }
+                }
+            )
+        except Exception as e:
+            logger.warning(f"Could not publish status of step {job.step_id}: {e}")
+
+    def forget_finished_jobs(self):
+        finished_ids = [step_id for step_id, job in self.jobs.items() if job.done]
+        excess_count = max(len(finished_ids) - FINISHED_JOB_LIMIT, 0)
+        for step_id in finished_ids[:excess_count]:
+            del self.jobs[step_id]
+
+    async def shutdown(self):
+        running_tasks = [job.asyncio_task for job in self.jobs.values() if not job.done]
+        for task in running_tasks:
+            task.cancel()
+        await asyncio.gather(*running_tasks, return_exceptions=True)
@@ -2,52 +2,135 @@ import asyncio
 import json
 import logging
 from json import JSONDecodeError
-from typing import Any
+from typing import ClassVar, Union
 
-import psycopg2
-from psycopg2._psycopg import connection
-from starlette.websockets import WebSocket
+import asyncpg
+from starlette.websockets import WebSocket, WebSocketDisconnect
 
 from beebot.config import Config
+from beebot.notifications import (
+    NOTIFICATION_CHANNEL,
+    ORIGIN_KEY,
+    PROCESS_ID,
+    NotificationBus,
+    cross_process_notifications_enabled,
+)
 
 logger = logging.getLogger(__name__)
 
 
-async def producer(conn: connection) -> dict[str, dict[str, Any]]:
-    while True:
-        conn.poll()
-        if conn.notifies:
-            notify = conn.notifies.pop(0)
+class NotificationListener:
+    """
+    Forwards the notifications published by other processes over Postgres NOTIFY to the in-process NotificationBus.
+    There is a single LISTEN connection per process, opened when the first websocket client connects and closed after
+    the last one leaves.
+    """
+
+    database_url: str
+    client_count: int
+
+    _global_listener: ClassVar["NotificationListener"] = None
+
+    def __init__(self, database_url: str):
+        self.database_url = database_url
+        self.client_count = 0
+        self._connection: Union[asyncpg.Connection, None] = None
+        self._connection_lock = asyncio.Lock()
+
+    @classmethod
+    def global_listener(cls, config: Config) -> "NotificationListener":
+        if not cls._global_listener:
+            cls._global_listener = cls(database_url=config.database_url)
+        return cls._global_listener
+
+    async def add_client(self):
+        self.client_count += 1
+        try:
+            await self.connect()
+        except BaseException:
+            self.client_count -= 1
+            raise
+
+    async def remove_client(self):
+        self.client_count -= 1
+        if not self.client_count:
+            await self.close()
+
+    async def connect(self):
+        async with self._connection_lock:
+            if self._connection and not self._connection.is_closed():
+                return
+            self._connection = await asyncpg.connect(self.database_url)
+            await self._connection.add_listener(NOTIFICATION_CHANNEL, self.dispatch)
+
+    async def close(self):
+        async with self._connection_lock:
+            if not self._connection:
+                return
+            connection, self._connection = self._connection, None
             try:
-                parsed_payload = json.loads(notify.payload)
-                return {notify.channel: parsed_payload}
-            except JSONDecodeError as e:
-                logger.error(f"Invalid NOTIFY payload received {e}: {notify.payload}")
+                await connection.close()
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.warning(f"Could not close notification listener: {e}")
+
+    def dispatch(self, _connection, _pid: int, channel: str, payload: str):
+        try:
+            parsed_payload = json.loads(payload)
+        except JSONDecodeError as e:
+            logger.error(f"Invalid NOTIFY payload received {e}: {payload}")
+            return
+
+        # Notifications from this process were already delivered through the bus
+        if parsed_payload.pop(ORIGIN_KEY, None) == PROCESS_ID:
+            return
+
+        NotificationBus.global_bus().publish({channel: parsed_payload})
+
+
+async def forward_notifications(websocket: WebSocket, queue: asyncio.Queue):
+    while True:
+        notification = await queue.get()
+        await websocket.send_json(notification)
 
-        await asyncio.sleep(0.1)
+
+async def wait_for_disconnect(websocket: WebSocket):
+    """Clients only listen, but reading is the only way to notice they left while no notifications are flowing"""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
 
 
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     config = Config.global_config()
-    conn = psycopg2.connect(config.database_url)
-    conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
-
-    curs = conn.cursor()
-    curs.execute("LISTEN beebot_notifications;")
-    await websocket.send_json({"ready": True})
-    while True:
-        try:
-            await websocket.send_json({"poll": True})
-            notify = await producer(conn)
-            if not notify:
-                # Connection closed
-                break
+    queue = NotificationBus.global_bus().subscribe(config.notification_queue_size)
 
-            await websocket.send_json(notify)
+    listener = None
+    tasks = []
+    try:
+        if cross_process_notifications_enabled():
+            await NotificationListener.global_listener(config).add_client()
+            listener = NotificationListener.global_listener(config)
 
-        except (SystemExit, KeyboardInterrupt):
-            raise
-        except BaseException as e:
-            logger.error(f"Unknown error occurred in websocket connection: {e}")
-        await asyncio.sleep(0.1)
+        await websocket.send_json({"ready": True})
+        tasks = [
+            asyncio.create_task(forward_notifications(websocket, queue)),
+            asyncio.create_task(wait_for_disconnect(websocket)),
+        ]
+        done, _pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if error and not isinstance(error, WebSocketDisconnect):
+                logger.warning(f"Notification websocket closed: {error}")
+    except WebSocketDisconnect:
+        pass
+    except (OSError, RuntimeError) as e:
+        logger.warning(f"Notification websocket closed: {e}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        NotificationBus.global_bus().unsubscribe(queue)
+        if listener:
+            await listener.remove_client()
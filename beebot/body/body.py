@@ -4,9 +4,11 @@ import subprocess
 from typing import Union
 
 import baserun
+from autopack.pack_config import PackConfig
 from langchain.chat_models.base import BaseChatModel
 
 from beebot.body.llm import create_llm
+from beebot.body.pack_manager import PackManager
 from beebot.config import Config
 from beebot.config.database_file_manager import DatabaseFileManager
 from beebot.decomposer.decomposer import Decomposer
@@ -34,35 +36,50 @@ class Body:
 
     decomposer: Decomposer
     config: Config
+    # Packs of this Body are configured with this, so that they use its file manager and workspace
+    pack_config: PackConfig
+    pack_manager: PackManager
+    # The directory the files of this Body are synced with
+    workspace_path: str
 
     model_object: BodyModel = None
     file_manager: DatabaseFileManager = None
 
-    def __init__(self, task: str = "", config: Config = None):
+    def __init__(
+        self, task: str = "", config: Config = None, workspace_path: str = None
+    ):
         self.task = task
         self.config = config or Config.global_config()
+        self.workspace_path = workspace_path or self.config.workspace_path
+        self.pack_config = self.config.pack_config.copy(
+            update={"workspace_path": self.workspace_path, "filesystem_manager": None}
+        )
 
         self.decomposer_llm = create_llm(self.config, self.config.decomposer_model)
         self.planner_llm = create_llm(self.config, self.config.planner_model)
         self.decider_llm = create_llm(self.config, self.config.decider_model)
         self.decomposer = Decomposer(body=self)
+        self.pack_manager = PackManager(body=self)
         self.task_executions = []
         self.processes = {}
         self.global_variables = {}
 
-        if not os.path.exists(self.config.workspace_path):
-            os.makedirs(self.config.workspace_path, exist_ok=True)
+        if not os.path.exists(self.workspace_path):
+            os.makedirs(self.workspace_path, exist_ok=True)
 
     @classmethod
-    async def from_model(cls, body_model: BodyModel):
-        body = cls(task=body_model.task)
+    async def from_model(cls, body_model: BodyModel, workspace_path: str = None):
+        body = cls(task=body_model.task, workspace_path=workspace_path)
         body.model_object = body_model
 
-        body.file_manager = DatabaseFileManager(
-            config=body.config.pack_config, body=body
-        )
+        body.file_manager = DatabaseFileManager(config=body.pack_config, body=body)
 
-        for execution_model in await body_model.task_executions.all():
+        # Use the prefetched task executions, if they were prefetched
+        execution_models = [
+            execution_model async for execution_model in body_model.task_executions
+        ]
+        execution_models.sort(key=lambda model: model.id)
+        for execution_model in execution_models:
             body.task_executions.append(
                 await TaskExecution.from_model(body, execution_model)
             )
@@ -92,9 +109,7 @@ class Body:
         # TODO: Remove duplication between this method and `from_model`
         await initialize_db(self.config.database_url)
 
-        self.file_manager = DatabaseFileManager(
-            config=self.config.pack_config, body=self
-        )
+        self.file_manager = DatabaseFileManager(config=self.pack_config, body=self)
 
         await self.decompose_task()
 
@@ -132,6 +147,7 @@ class Body:
                 for name, document in documents.items():
                     if name in next_execution.inputs:
                         await next_execution.current_step.add_document(document)
+                self.file_manager.invalidate_index()
 
         await self.save()
 
@@ -170,13 +186,11 @@ class Body:
         await self.model_object.save()
 
         await self.current_task_execution.save()
-        await self.file_manager.flush_to_directory(self.config.workspace_path)
+        await self.file_manager.flush_to_directory(self.workspace_path)
 
     async def setup_file_manager(self):
         if not self.file_manager:
-            self.file_manager = DatabaseFileManager(
-                config=self.config.pack_config, body=self
-            )
+            self.file_manager = DatabaseFileManager(config=self.pack_config, body=self)
         await self.file_manager.load_from_directory()
 
-        self.config.pack_config.filesystem_manager = self.file_manager
+        self.pack_config.filesystem_manager = self.file_manager
@@ -1,13 +1,25 @@
+import asyncio
 import json
 import logging
+import time
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Any
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Optional,
+    Union,
+)
 
+import aiohttp
 import openai
-from autopack.utils import format_packs_to_openai_functions
 from langchain.chat_models import ChatOpenAI
 from langchain.schema import SystemMessage
 
+from beebot.body.llm_cache import LLMResponseCache, cache_key
+from beebot.body.tokens import count_tokens
 from beebot.config.config import Config
 
 logger = logging.getLogger(__name__)
@@ -15,6 +27,21 @@ logger = logging.getLogger(__name__)
 if TYPE_CHECKING:
     from beebot.body import Body
 
+# Minimum number of seconds between progress updates while streaming a response
+STREAM_UPDATE_INTERVAL = 0.25
+# Errors which are worth retrying when opening a streaming request
+RETRYABLE_ERRORS = (
+    openai.error.APIConnectionError,
+    openai.error.RateLimitError,
+    openai.error.ServiceUnavailableError,
+    openai.error.Timeout,
+)
+
+# Process-wide registry of LLM clients, so that every Body (including those of subagents) shares them
+_llm_clients: dict[tuple[str, str, frozenset], ChatOpenAI] = {}
+# The aiohttp session (and its keep-alive connection pool) used for every OpenAI request, with the loop it belongs to
+_aiosession: Optional[tuple[asyncio.AbstractEventLoop, aiohttp.ClientSession]] = None
+
 
 @dataclass
 class LLMResponse:
@@ -27,18 +54,68 @@ def create_llm(config: Config, model_name: str):
     if config.openai_api_base:
         openai.api_base = config.openai_api_base
     if config.helicone_key:
-        logger.info("Using helicone to make requests with cache enabled.")
         headers["Helicone-Auth"] = f"Bearer {config.helicone_key}"
         headers["Helicone-Cache-Enabled"] = "true"
 
+    client_key = (model_name, config.openai_api_base, frozenset(headers.items()))
+    if client_key in _llm_clients:
+        return _llm_clients[client_key]
+
+    if config.helicone_key:
+        logger.info("Using helicone to make requests with cache enabled.")
+
     llm = ChatOpenAI(
         model_name=model_name,
         # temperature=0,
         model_kwargs={"headers": headers, "top_p": 0.1},
     )
+    _llm_clients[client_key] = llm
     return llm
 
 
+def shared_aiosession(config: Config) -> aiohttp.ClientSession:
+    """Get the aiohttp session shared by all LLM requests on the running event loop, creating it if necessary"""
+    global _aiosession
+
+    loop = asyncio.get_running_loop()
+    if _aiosession:
+        session_loop, session = _aiosession
+        if session_loop is loop and not session.closed:
+            return session
+        release_aiosession(session_loop, session)
+
+    connector = aiohttp.TCPConnector(limit=config.llm_max_connections)
+    _aiosession = (loop, aiohttp.ClientSession(connector=connector))
+    return _aiosession[1]
+
+
+def release_aiosession(loop: asyncio.AbstractEventLoop, session: aiohttp.ClientSession):
+    """Release a session that belongs to a loop other than the running one"""
+    if session.closed:
+        return
+
+    if loop.is_closed():
+        # Its connections died along with the loop, so there is nothing left to close
+        session.detach()
+    elif loop.is_running():
+        asyncio.run_coroutine_threadsafe(session.close(), loop)
+    else:
+        loop.run_until_complete(session.close())
+
+
+async def close_llm_clients():
+    """Close the shared HTTP connection pool. Clients will reconnect on their next request."""
+    global _aiosession
+
+    if _aiosession:
+        session_loop, session = _aiosession
+        _aiosession = None
+        if session_loop is asyncio.get_running_loop():
+            await session.close()
+        else:
+            release_aiosession(session_loop, session)
+
+
 async def call_llm(
     body: "Body",
     message: str,
@@ -48,17 +125,21 @@ async def call_llm(
     llm=None,
 ) -> LLMResponse:
     llm = llm or body.planner_llm
-    output_kwargs = {}
-
-    if include_functions and body.current_task_execution.packs:
-        output_kwargs["functions"] = format_packs_to_openai_functions(
-            body.current_task_execution.packs.values()
-        )
-        output_kwargs["function_call"] = function_call
+    output_kwargs = function_kwargs(body, function_call, include_functions)
 
     if disregard_cache:
         output_kwargs["headers"] = {"Helicone-Cache-Enabled": "false"}
 
+    llm_cache, key = response_cache(body, llm, message, output_kwargs)
+    if llm_cache and not disregard_cache:
+        cached_response = await llm_cache.get(key)
+        if cached_response:
+            logger.debug(f"~~ LLM Cache Hit ~~\n{message}")
+            return cached_response
+
+    # OpenAI opens a new session (and TLS connection) for each request unless one is set in its context var
+    openai.aiosession.set(shared_aiosession(body.config))
+
     logger.debug(f"~~ LLM Request ~~\n{message}")
     response = await llm.agenerate(
         messages=[[SystemMessage(content=message)]], **output_kwargs
@@ -76,4 +157,147 @@ async def call_llm(
 
     logger.debug(f"~~ LLM Response ~~\n{generation.text}")
     logger.debug(json.dumps(function_called))
-    return LLMResponse(text=generation.text, function_call=function_called)
+    llm_response = LLMResponse(text=generation.text, function_call=function_called)
+
+    if llm_cache:
+        await llm_cache.set(key, llm.model_name, llm_response)
+
+    return llm_response
+
+
+async def stream_llm(
+    body: "Body",
+    message: str,
+    function_call: str = "none",
+    include_functions: bool = True,
+    llm=None,
+) -> AsyncIterator[str]:
+    """A variant of `call_llm` which yields the text of the response as it is generated"""
+    llm = llm or body.planner_llm
+    output_kwargs = function_kwargs(body, function_call, include_functions)
+
+    llm_cache, key = response_cache(body, llm, message, output_kwargs)
+    if llm_cache:
+        cached_response = await llm_cache.get(key)
+        if cached_response:
+            logger.debug(f"~~ LLM Cache Hit ~~\n{message}")
+            yield cached_response.text
+            return
+
+    openai.aiosession.set(shared_aiosession(body.config))
+
+    logger.debug(f"~~ LLM Streaming Request ~~\n{message}")
+    params = {
+        "model": llm.model_name,
+        "messages": [{"role": "system", "content": message}],
+        "temperature": llm.temperature,
+        "request_timeout": llm.request_timeout,
+        "api_key": llm.openai_api_key,
+        **llm.model_kwargs,
+        **output_kwargs,
+        "stream": True,
+    }
+    if llm.openai_api_base:
+        params["api_base"] = llm.openai_api_base
+    if llm.openai_organization:
+        params["organization"] = llm.openai_organization
+    if llm.max_tokens:
+        params["max_tokens"] = llm.max_tokens
+
+    text = ""
+    async for chunk in await open_stream(params, max_retries=llm.max_retries):
+        token = chunk["choices"][0]["delta"].get("content") or ""
+        if token:
+            text += token
+            yield token
+
+    logger.debug(f"~~ LLM Streaming Response ~~\n{text}")
+    if llm_cache:
+        await llm_cache.set(
+            key, llm.model_name, LLMResponse(text=text, function_call={})
+        )
+
+
+async def open_stream(params: dict[str, Any], max_retries: int) -> AsyncIterator:
+    """Open a streaming chat completion, retrying transient errors with exponential backoff. Only opening the stream
+    is retried, a stream that fails midway can't be resumed."""
+    for attempt in range(max(max_retries, 1)):
+        try:
+            return await openai.ChatCompletion.acreate(**params)
+        except RETRYABLE_ERRORS as e:
+            if attempt + 1 >= max_retries:
+                raise
+            logger.warning(f"Retrying streaming LLM request after error: {e}")
+            await asyncio.sleep(min(2**attempt, 10))
+
+
+async def stream_llm_text(
+    body: "Body",
+    message: str,
+    on_update: Callable[[str, str], Awaitable[None]],
+    **kwargs,
+) -> str:
+    """Stream a response, calling `on_update(text_so_far, delta)` as it grows, and return the full text. Updates are
+    throttled to one every `STREAM_UPDATE_INTERVAL` seconds."""
+    text = ""
+    delta = ""
+    last_update = time.monotonic()
+    async for token in stream_llm(body, message, **kwargs):
+        text += token
+        delta += token
+        if time.monotonic() - last_update >= STREAM_UPDATE_INTERVAL:
+            await on_update(text, delta)
+            delta = ""
+            last_update = time.monotonic()
+
+    if delta:
+        await on_update(text, delta)
+
+    return text
+
+
+def function_kwargs(
+    body: "Body", function_call: str, include_functions: bool
+) -> dict[str, Any]:
+    from beebot.body.pack_utils import openai_functions
+
+    output_kwargs = {}
+    if include_functions and body.current_task_execution.packs:
+        output_kwargs["functions"] = openai_functions(
+            body.current_task_execution.packs.values()
+        )
+        output_kwargs["function_call"] = function_call
+    return output_kwargs
+
+
+def reserved_prompt_tokens(
+    body: "Body", model_name: str, include_functions: bool = True
+) -> dict[str, int]:
+    """The tokens of a request which aren't part of the prompt text: the function schemas and the response"""
+    reserved_tokens = {"response": body.config.response_token_reserve}
+    functions = function_kwargs(body, "auto", include_functions).get("functions")
+    if functions:
+        reserved_tokens["function_schemas"] = count_tokens(
+            json.dumps(functions), model_name
+        )
+    return reserved_tokens
+
+
+def response_cache(
+    body: "Body", llm: ChatOpenAI, message: str, output_kwargs: dict[str, Any]
+) -> tuple[Union[LLMResponseCache, None], Union[str, None]]:
+    """Get the local response cache and the key for this request, if the cache is enabled and usable"""
+    if not body.config.llm_cache_enabled:
+        return None, None
+
+    llm_cache = LLMResponseCache.global_cache(body.config)
+    if not llm_cache.available:
+        return None, None
+
+    key = cache_key(
+        model=llm.model_name,
+        message=message,
+        functions=output_kwargs.get("functions"),
+        function_call=output_kwargs.get("function_call"),
+    )
+    return llm_cache, key
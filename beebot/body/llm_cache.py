@@ -0,0 +1,148 @@
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, ClassVar, Union
+
+from tortoise import Tortoise
+from tortoise.exceptions import BaseORMException
+
+from beebot.models.database_models import LLMCacheEntry
+
+if TYPE_CHECKING:
+    from beebot.body.llm import LLMResponse
+    from beebot.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(
+    model: str,
+    message: str,
+    functions: list[dict[str, Any]] = None,
+    function_call: str = None,
+) -> str:
+    """A content hash of everything that determines the LLM's response"""
+    key_material = json.dumps(
+        {
+            "model": model,
+            "message": message,
+            "functions": functions or [],
+            "function_call": function_call,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    A content-addressed cache of LLM responses stored in the `llm_cache` table. Entries expire after `ttl` seconds and
+    the least recently used entries are evicted once there are more than `max_entries` of them. Eviction only runs
+    every `eviction_interval` new entries, so the table may briefly hold up to that many more.
+
+    Cache failures are logged and treated as misses, they should never fail the LLM request itself.
+    """
+
+    ttl: int
+    max_entries: int
+    eviction_interval: int
+    hits: int
+    misses: int
+
+    _global_cache: ClassVar["LLMResponseCache"] = None
+
+    def __init__(
+        self, ttl: int = 86400, max_entries: int = 5000, eviction_interval: int = 100
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.eviction_interval = eviction_interval
+        self.hits = 0
+        self.misses = 0
+        self._inserts_since_eviction = 0
+
+    @classmethod
+    def from_config(cls, config: "Config") -> "LLMResponseCache":
+        return cls(ttl=config.llm_cache_ttl, max_entries=config.llm_cache_max_entries)
+
+    @classmethod
+    def global_cache(cls, config: "Config") -> "LLMResponseCache":
+        if not cls._global_cache:
+            cls._global_cache = cls.from_config(config)
+        return cls._global_cache
+
+    @property
+    def available(self) -> bool:
+        # The cache lives in the database, so it can't be used until the database is initialized
+        return Tortoise._inited
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    async def get(self, key: str) -> Union["LLMResponse", None]:
+        from beebot.body.llm import LLMResponse
+
+        try:
+            entry = await LLMCacheEntry.get_or_none(key=key)
+            if entry and entry.created_at < self.expiry_cutoff():
+                await entry.delete()
+                entry = None
+
+            if entry:
+                # Saving bumps `updated_at`, which is what the LRU eviction is based on
+                await entry.save(update_fields=["updated_at"])
+        except BaseORMException as e:
+            logger.warning(f"Could not read from the LLM cache: {e}")
+            entry = None
+
+        if not entry:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return LLMResponse(text=entry.text, function_call=entry.function_call)
+
+    async def set(self, key: str, model: str, response: "LLMResponse"):
+        try:
+            _entry, created = await LLMCacheEntry.update_or_create(
+                key=key,
+                defaults={
+                    "model": model,
+                    "text": response.text,
+                    "function_call": response.function_call,
+                    # A refreshed response starts a new TTL
+                    "created_at": datetime.now(timezone.utc),
+                },
+            )
+        except BaseORMException as e:
+            # Most likely a concurrent request inserted the same key first, which is just as good
+            logger.warning(f"Could not write to the LLM cache: {e}")
+            return
+
+        if created:
+            self._inserts_since_eviction += 1
+            if self._inserts_since_eviction >= self.eviction_interval:
+                await self.evict()
+
+    async def evict(self):
+        self._inserts_since_eviction = 0
+        try:
+            await LLMCacheEntry.filter(created_at__lt=self.expiry_cutoff()).delete()
+
+            # Walk the `updated_at` index from most to least recently used, everything past `max_entries` goes
+            stale_ids = (
+                await LLMCacheEntry.all()
+                .order_by("-updated_at")
+                .offset(self.max_entries)
+                .values_list("id", flat=True)
+            )
+            if stale_ids:
+                logger.debug(f"Evicting {len(stale_ids)} LLM cache entries")
+                await LLMCacheEntry.filter(id__in=stale_ids).delete()
+        except BaseORMException as e:
+            logger.warning(f"Could not evict entries from the LLM cache: {e}")
+
+    def expiry_cutoff(self) -> datetime:
+        return datetime.now(timezone.utc) - timedelta(seconds=self.ttl)
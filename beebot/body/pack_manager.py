@@ -0,0 +1,87 @@
+import logging
+from typing import TYPE_CHECKING, Callable
+
+from autopack.pack import Pack
+
+from beebot.body.pack_utils import llm_wrapper
+
+if TYPE_CHECKING:
+    from beebot.body import Body
+
+logger = logging.getLogger(__name__)
+
+# Pack classes whose one-time setup (e.g. installing browsers) has already run in this process
+_warmed_up_pack_classes: set[type[Pack]] = set()
+
+
+class PackManager:
+    """
+    Owns the pack instances of a Body. Each pack class is instantiated once per Body and shared by all of its
+    TaskExecutions. Packs are bound to their Body through its LLM wrapper, so they can't be shared between Bodies.
+
+    Packs may define two optional async hooks:
+    - `warm_up()`: one-time setup with side effects, e.g. installing dependencies. It runs once per process, before
+      the pack is first handed out.
+    - `teardown()`: release anything the pack holds on to. It runs when the Body is done with its packs.
+    """
+
+    body: "Body"
+    packs: dict[type[Pack], Pack]
+
+    def __init__(self, body: "Body"):
+        self.body = body
+        self.packs = {}
+        self._llm = None
+
+    @property
+    def llm(self) -> Callable:
+        if not self._llm:
+            self._llm = llm_wrapper(self.body)
+        return self._llm
+
+    async def get_packs(self, pack_classes: list[type[Pack]]) -> dict[str, Pack]:
+        """The instances of `pack_classes`, by name"""
+        packs = {}
+        for pack_class in pack_classes:
+            pack = self.packs.get(pack_class)
+            if not pack:
+                pack = self.packs[pack_class] = self.create_pack(pack_class)
+                await warm_up(pack)
+            packs[pack.name] = pack
+        return packs
+
+    def create_pack(self, pack_class: type[Pack]) -> Pack:
+        from beebot.packs.system_base_pack import SystemBasePack
+
+        # The Body's own config, so that its packs use its file manager rather than whichever was set up last
+        config = self.body.pack_config
+        if issubclass(pack_class, SystemBasePack):
+            return pack_class(body=self.body, llm=self.llm, config=config)
+        return pack_class(llm=self.llm, allm=self.llm, config=config)
+
+    async def teardown(self):
+        for pack in self.packs.values():
+            teardown = getattr(pack, "teardown", None)
+            if not teardown:
+                continue
+            try:
+                await teardown()
+            except Exception as e:
+                logger.warning(f"Could not tear down pack {pack.name}: {e}")
+        self.packs = {}
+
+
+async def warm_up(pack: Pack):
+    pack_class = type(pack)
+    if pack_class in _warmed_up_pack_classes:
+        return
+
+    hook = getattr(pack, "warm_up", None)
+    if hook:
+        try:
+            await hook()
+        except Exception as e:
+            # The pack may still work, or fail with a clearer error when it's used. Try again for the next Body.
+            logger.warning(f"Could not warm up pack {pack.name}: {e}")
+            return
+    _warmed_up_pack_classes.add(pack_class)
@@ -1,8 +1,13 @@
 import logging
 import subprocess
-from typing import TYPE_CHECKING
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, Iterable, Union
 
 from autopack.pack import Pack
+from autopack.utils import (
+    format_packs_to_openai_functions,
+    run_args_from_args_schema,
+)
 
 from beebot.body.llm import call_llm
 
@@ -13,6 +18,26 @@ logger = logging.getLogger(__name__)
 
 # TODO: This should be a config value?
 SUPPRESSED_PACKS = ["list_files", "delete_file"]
+# Packs which don't change anything, so the next plan can be started while they run. See `speculative_planning`.
+READ_ONLY_PACKS = [
+    "read_file",
+    "list_files",
+    "wikipedia",
+    "google_search",
+    "get_website_content",
+    "get_webpage_html_content",
+    "extract_information_from_webpage",
+    "wolfram_alpha_query",
+    "os_name_and_version",
+    "disk_usage",
+    "get_process_status",
+    "list_processes",
+]
+
+# Rendered function descriptions by pack set. The name, description and arguments of a pack are all defined by its
+# class, so every pack set with the same classes renders identically.
+_functions_detail_lists: dict[tuple[type[Pack], ...], str] = {}
+_openai_functions: dict[tuple[type[Pack], ...], list[dict[str, Any]]] = {}
 
 
 def llm_wrapper(body: "Body") -> str:
@@ -36,7 +61,49 @@ def init_workspace_poetry(workspace_path: str):
     )
 
 
-def functions_detail_list(packs: list["Pack"]) -> str:
+def pack_set_key(packs: Iterable[Union[Pack, type[Pack]]]) -> tuple[type[Pack], ...]:
+    return tuple(pack if isinstance(pack, type) else type(pack) for pack in packs)
+
+
+def functions_detail_list(packs: Iterable["Pack"]) -> str:
+    packs = list(packs)
+    key = pack_set_key(packs)
+    if key not in _functions_detail_lists:
+        _functions_detail_lists[key] = render_functions_detail_list(packs)
+    return _functions_detail_lists[key]
+
+
+def openai_functions(packs: Iterable["Pack"]) -> list[dict[str, Any]]:
+    """The OpenAI function schemas of the packs. These are shared between requests, so don't modify them."""
+    packs = list(packs)
+    key = pack_set_key(packs)
+    if key not in _openai_functions:
+        _openai_functions[key] = format_packs_to_openai_functions(packs)
+    return _openai_functions[key]
+
+
+def precompute_pack_functions(pack_classes: list[type["Pack"]]):
+    """Render the function descriptions of a set of pack classes ahead of time, without instantiating them"""
+    key = pack_set_key(pack_classes)
+    if key in _functions_detail_lists and key in _openai_functions:
+        return
+
+    # The rendering only needs what the class defines, the same as an instance would have
+    pack_views = [
+        SimpleNamespace(
+            name=pack_class.name,
+            description=pack_class.description,
+            args=run_args_from_args_schema(pack_class.args_schema)
+            if pack_class.args_schema
+            else {},
+        )
+        for pack_class in pack_classes
+    ]
+    _functions_detail_lists[key] = render_functions_detail_list(pack_views)
+    _openai_functions[key] = format_packs_to_openai_functions(pack_views)
+
+
+def render_functions_detail_list(packs: list["Pack"]) -> str:
     pack_details = []
     for pack in packs:
         pack_args = []
@@ -0,0 +1,163 @@
+import logging
+import math
+from functools import lru_cache
+from typing import Any, Union
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Rough average for English text, used when no tokenizer is available
+CHARS_PER_TOKEN = 4
+FALLBACK_ENCODING = "cl100k_base"
+
+
+@lru_cache(maxsize=None)
+def encoding_for_model(model_name: str) -> Union[Any, None]:
+    """The tiktoken encoding for a model, or None if tiktoken isn't installed or the encoding can't be loaded"""
+    if not tiktoken:
+        return None
+
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        pass
+    except Exception as e:
+        logger.warning(f"Could not load tokenizer for {model_name}, estimating: {e}")
+        return None
+
+    try:
+        return tiktoken.get_encoding(FALLBACK_ENCODING)
+    except Exception as e:
+        logger.warning(f"Could not load tokenizer for {model_name}, estimating: {e}")
+        return None
+
+
+def count_tokens(text: str, model_name: str) -> int:
+    if not text:
+        return 0
+
+    encoding = encoding_for_model(model_name)
+    if not encoding:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+# Context window sizes by model name prefix, the longest matching prefix wins
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-3.5-turbo": 4096,
+    "gpt-3.5-turbo-16k": 16384,
+}
+DEFAULT_CONTEXT_WINDOW = 4096
+
+# The order in which prompt sections are truncated when a prompt doesn't fit in the context window, and the share of
+# each section that is kept from its start. The rest is kept from its end, e.g. the most recent history. Sections
+# which aren't listed here are never truncated.
+TRUNCATION_PRIORITY = {
+    "file_list": 1.0,
+    "variables": 0.25,
+    "history": 0.25,
+    "functions": 1.0,
+    "plan": 0.5,
+}
+TRUNCATION_MARKER = "\n... (truncated) ...\n"
+
+
+def context_window(model_name: str) -> int:
+    matching_prefixes = [
+        prefix for prefix in MODEL_CONTEXT_WINDOWS if model_name.startswith(prefix)
+    ]
+    if not matching_prefixes:
+        return DEFAULT_CONTEXT_WINDOW
+    return MODEL_CONTEXT_WINDOWS[max(matching_prefixes, key=len)]
+
+
+def truncate_tokens(
+    text: str, max_tokens: int, model_name: str, head_share: float = 1.0
+) -> str:
+    """Cut `text` down to about `max_tokens`, keeping `head_share` of it from the start and the rest from the end"""
+    if count_tokens(text, model_name) <= max_tokens:
+        return text
+
+    kept_tokens = max_tokens - count_tokens(TRUNCATION_MARKER, model_name)
+    if kept_tokens <= 0:
+        return ""
+
+    head_tokens = int(kept_tokens * head_share)
+    tail_tokens = kept_tokens - head_tokens
+
+    encoding = encoding_for_model(model_name)
+    if encoding:
+        tokens = encoding.encode(text, disallowed_special=())
+        head = encoding.decode(tokens[:head_tokens])
+        tail = encoding.decode(tokens[-tail_tokens:]) if tail_tokens else ""
+    else:
+        head = text[: head_tokens * CHARS_PER_TOKEN]
+        tail = text[-tail_tokens * CHARS_PER_TOKEN :] if tail_tokens else ""
+
+    return head + TRUNCATION_MARKER + tail
+
+
+def fit_prompt_variables(
+    template: str,
+    prompt_variables: dict[str, str],
+    model_name: str,
+    reserved_tokens: dict[str, int] = None,
+) -> dict[str, Any]:
+    """
+    Truncate the sections of a prompt by priority until the prompt, plus `reserved_tokens` (e.g. the function schemas
+    and the response), fits in the context window of the model. The token count of each section is recorded in the
+    `token_counts` key of the returned prompt variables.
+    """
+    reserved_tokens = reserved_tokens or {}
+    sections = {
+        name: value
+        for name, value in prompt_variables.items()
+        if isinstance(value, str)
+    }
+    token_counts = {
+        name: count_tokens(value, model_name) for name, value in sections.items()
+    }
+    template_tokens = count_tokens(
+        template.format(**{name: "" for name in sections}), model_name
+    )
+
+    available_tokens = (
+        context_window(model_name) - template_tokens - sum(reserved_tokens.values())
+    )
+    overflow = sum(token_counts.values()) - available_tokens
+    fitted_variables = dict(prompt_variables)
+    for name, head_share in TRUNCATION_PRIORITY.items():
+        if overflow <= 0:
+            break
+        if not token_counts.get(name):
+            continue
+
+        max_tokens = max(token_counts[name] - overflow, 0)
+        fitted_variables[name] = truncate_tokens(
+            sections[name], max_tokens, model_name, head_share
+        )
+        truncated_count = count_tokens(fitted_variables[name], model_name)
+        logger.warning(
+            f"Truncated the {name} section of the prompt from {token_counts[name]} to {truncated_count} tokens"
+        )
+        overflow -= token_counts[name] - truncated_count
+        token_counts[name] = truncated_count
+
+    if overflow > 0:
+        logger.warning(
+            f"Prompt exceeds the context window of {model_name} by {overflow} tokens"
+        )
+
+    fitted_variables["token_counts"] = {
+        **token_counts,
+        "template": template_tokens,
+        **reserved_tokens,
+    }
+    return fitted_variables
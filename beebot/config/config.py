@@ -8,6 +8,8 @@ from openai.util import logger as openai_logger
 from pydantic import BaseSettings  # IDEAL_MODEL = "gpt-4-0613"
 import openai
 
+from beebot.models.database_models import BlobModel, zstandard
+
 DEFAULT_DECOMPOSER_MODEL = "gpt-4"
 FALLBACK_DECOMPOSER_MODEL = "gpt-3.5-turbo-16k-0613"
 DEFAULT_PLANNER_MODEL = "gpt-3.5-turbo-16k-0613"
@@ -16,6 +18,8 @@ LOG_FORMAT = (
     "%(levelname)s %(asctime)s.%(msecs)03d %(filename)s:%(lineno)d- %(message)s"
 )
 
+logger = logging.getLogger(__name__)
+
 
 class Config(BaseSettings):
     log_level: str = "INFO"
@@ -28,6 +32,43 @@ class Config(BaseSettings):
     planner_model: str = DEFAULT_PLANNER_MODEL
     decider_model: str = DEFAULT_DECIDER_MODEL
     database_url: str = "sqlite://:memory:"
+    llm_cache_enabled: bool = True
+    # Seconds before a cached LLM response is considered stale
+    llm_cache_ttl: int = 86400
+    llm_cache_max_entries: int = 5000
+    # Size of the keep-alive connection pool shared by every LLM request in the process
+    llm_max_connections: int = 100
+    # Stream plans from the LLM, saving and publishing them as they are generated
+    stream_plans: bool = False
+    # Start planning the next step while read-only packs are executing
+    speculative_planning: bool = False
+    # Plan and decide on the next action with one LLM request instead of two
+    fused_cycle: bool = False
+    # Token budget for the history and variables sections of a prompt, by model. Once the budget is exceeded, older
+    # steps are folded into a summary, `history_window_steps` at a time.
+    history_token_budgets: dict[str, int] = {
+        DEFAULT_DECOMPOSER_MODEL: 3000,
+        DEFAULT_PLANNER_MODEL: 8000,
+    }
+    default_history_token_budget: int = 3000
+    history_window_steps: int = 10
+    # Number of live Bodies the API keeps in memory between requests, and how long (seconds) they are kept when idle
+    api_body_cache_size: int = 32
+    api_body_cache_idle_timeout: int = 600
+    # Also send notifications to other processes over Postgres NOTIFY. Has no effect on other databases.
+    cross_process_notifications: bool = True
+    # Notifications buffered per websocket client, the oldest are dropped when a client falls this far behind
+    notification_queue_size: int = 100
+    # Queue API steps to run in the background instead of running them in the request, with at most this many at once
+    api_async_steps: bool = False
+    api_max_concurrent_steps: int = 4
+    # Tokens of the context window kept free for the LLM's response when truncating prompts
+    response_token_reserve: int = 1000
+    # Workspace files of at least this many bytes are kept on disk in the large file store instead of in the database
+    large_file_threshold: int = 10 * 1024 * 1024
+    large_file_store_path: str = "large_files"
+    # Compress large blobs in the database with zstd, needs the `compression` extra
+    blob_compression: bool = False
 
     workspace_path: str = "workspace"
     hard_exit: bool = False
@@ -52,6 +93,7 @@ class Config(BaseSettings):
         super().__init__(**kwargs)
         self.configure_autopack()
         self.setup_logging()
+        self.configure_blob_compression()
         self.configure_decomposer_model()
 
     def configure_decomposer_model(self):
@@ -60,6 +102,11 @@ class Config(BaseSettings):
             if self.decomposer_model not in model_ids:
                 self.decomposer_model = FALLBACK_DECOMPOSER_MODEL
 
+    def history_token_budget(self, model_name: str) -> int:
+        return self.history_token_budgets.get(
+            model_name, self.default_history_token_budget
+        )
+
     def configure_autopack(self, is_global: bool = True):
         pack_config = PackConfig(
             workspace_path=self.workspace_path,
@@ -71,6 +118,13 @@ class Config(BaseSettings):
         if is_global:
             PackConfig.set_global_config(pack_config)
 
+    def configure_blob_compression(self):
+        if self.blob_compression and not zstandard:
+            logger.warning(
+                "Blob compression is enabled but zstandard is not installed, blobs are stored uncompressed"
+            )
+        BlobModel.compress_large_blobs = self.blob_compression
+
     def setup_logging(self) -> logging.Logger:
         os.makedirs("logs", exist_ok=True)
         console_handler = logging.StreamHandler()
@@ -1,12 +1,37 @@
+import asyncio
 import logging
 import os
-from typing import TYPE_CHECKING, Union
+import shutil
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Iterator, Union
 
 from autopack.filesystem_emulation.file_manager import FileManager
 from autopack.pack_config import PackConfig
-
+from tortoise.transactions import in_transaction
+
+from beebot.config.directory_tree import DirectoryTree
+from beebot.config.large_files import (
+    DEFAULT_WINDOW_LINES,
+    hash_file,
+    read_bytes,
+    read_lines,
+    store_file,
+    window_lines,
+)
 from beebot.execution import Step
-from beebot.models.database_models import DocumentModel, DocumentStep
+from beebot.models.database_models import (
+    CONTENT_SNIFF_SIZE,
+    TEXT_CONTENT_TYPE,
+    BlobModel,
+    Content,
+    DocumentModel,
+    DocumentStep,
+    StepModel,
+    detect_content_type,
+    encode_content,
+    hash_content,
+)
+from beebot.utils import restrict_path
 
 if TYPE_CHECKING:
     from beebot.body import Body
@@ -14,6 +39,64 @@ if TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 IGNORE_FILES = ["poetry.lock", "pyproject.toml", "__pycache__"]
+INDEX_COLUMNS = (
+    "id",
+    "name",
+    "blob__hash",
+    "blob__size",
+    "blob__content_type",
+    "blob__external",
+)
+
+
+@dataclass
+class SyncedFile:
+    """A file in the workspace as it was when it was last written or read"""
+
+    content_hash: str
+    mtime_ns: int
+    size: int
+
+
+@dataclass
+class IndexedDocument:
+    """A document of the current step. Its content is only loaded once it is needed."""
+
+    document_id: int
+    name: str
+    content_hash: str
+    size: int
+    content_type: str = TEXT_CONTENT_TYPE
+    # Kept in the large file store rather than the database, it is read from there a window at a time
+    external: bool = False
+    # Binary content is kept as a view of the blob's bytes, so that it is written out without being copied
+    content: Union[str, memoryview, None] = None
+
+    @property
+    def binary(self) -> bool:
+        return self.content_type != TEXT_CONTENT_TYPE
+
+
+async def run_in_executor(function: Callable, *args) -> Any:
+    """Run blocking file IO on large files without holding up the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+
+def workspace_files(directory: str) -> Iterator[tuple[str, str]]:
+    """The name and absolute path of each file under the directory, skipping ignored and hidden directories. Symlinks
+    are skipped too, they could point outside of the workspace or back into it."""
+    directories = [os.path.abspath(directory)]
+    while directories:
+        with os.scandir(directories.pop()) as entries:
+            for entry in entries:
+                if entry.name in IGNORE_FILES:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    if not entry.name.startswith("."):
+                        directories.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    name = os.path.relpath(entry.path, directory).replace(os.sep, "/")
+                    yield name, os.path.abspath(entry.path)
 
 
 class DatabaseFileManager(FileManager):
@@ -28,6 +111,13 @@ class DatabaseFileManager(FileManager):
         super().__init__(config)
         self.body = body
         self.files = {}
+        # The files in the workspace which match a document, by absolute path. Only files which were changed since
+        # they were synced are written or read again.
+        self.synced_files: dict[str, SyncedFile] = {}
+        # The documents of the step with ID `index_step_id` by name, kept up to date by the writes made through here
+        self.document_index: dict[str, IndexedDocument] = {}
+        self.index_step_id: Union[int, None] = None
+        self.directory_tree = DirectoryTree()
 
     @property
     def current_step(self) -> Union[Step, None]:
@@ -52,31 +142,80 @@ class DatabaseFileManager(FileManager):
     def list_files(self, *args, **kwargs):
         raise NotImplementedError
 
-    async def aread_file(self, file_path: str) -> str:
+    async def aread_file(
+        self, file_path: str, start_line: int = None, line_count: int = None
+    ) -> str:
         """Reads a file from the virtual file system in RAM.
 
         Args:
             file_path (str): The path to the file to be read.
+            start_line (int): Only return the lines from this one on, counting from 1.
+            line_count (int): Only return this many lines, DEFAULT_WINDOW_LINES if only `start_line` is given.
 
         Returns:
             str: The content of the file. If the file does not exist, returns an error message.
         """
-        documents = await self.current_step.documents
-        document = documents.get(file_path)
-        if document:
-            return document.content
-        else:
-            nonlocal_file = await DocumentModel.get_or_none(name=file_path)
-            if nonlocal_file:
-                return nonlocal_file.content
-            return "Error: File not found"
+        document = (await self.documents_index()).get(file_path)
+        if not document:
+            # A file written by another task
+            rows = (
+                await DocumentModel.filter(name=file_path)
+                .order_by("-id")
+                .limit(1)
+                .values_list(*INDEX_COLUMNS)
+            )
+            if not rows:
+                return "Error: File not found"
+            document = IndexedDocument(*rows[0])
+
+        if document.binary:
+            return f"Error: {file_path} is a binary file ({document.content_type}), it can't be read as text"
+
+        windowed = start_line is not None or line_count is not None
+        start_line = max(start_line or 1, 1)
+        line_count = line_count or DEFAULT_WINDOW_LINES
+        if document.external:
+            if not windowed:
+                return (
+                    f"Error: {file_path} is {document.size} bytes, which is too large to read at once. Read it a "
+                    f"window at a time with start_line and line_count."
+                )
+            return await run_in_executor(
+                read_lines, self.large_file_path(document), start_line, line_count
+            )
+
+        await self.load_contents([document])
+        if windowed:
+            return window_lines(document.content, start_line, line_count)
+        return document.content
+
+    async def aread_bytes(self, file_path: str, offset: int, length: int) -> bytes:
+        """A byte range of a file of the current step, without loading the rest of it if it is a large file"""
+        document = (await self.documents_index()).get(file_path)
+        if not document:
+            raise FileNotFoundError(file_path)
 
-    async def awrite_file(self, file_path: str, content: str) -> str:
+        if document.external:
+            return await run_in_executor(
+                read_bytes, self.large_file_path(document), offset, length
+            )
+
+        await self.load_contents([document])
+        if document.binary:
+            return bytes(document.content[offset : offset + length])
+        return document.content.encode("utf-8")[offset : offset + length]
+
+    def large_file_path(self, document: IndexedDocument) -> str:
+        return os.path.join(
+            self.body.config.large_file_store_path, document.content_hash
+        )
+
+    async def awrite_file(self, file_path: str, content: Content) -> str:
         """Writes to a file in the virtual file system in RAM.
 
         Args:
             file_path (str): The path to the file to be written to.
-            content (str): The content to be written to the file.
+            content (Union[str, bytes]): The content to be written to the file.
 
         Returns:
             str: A success message indicating the file was written.
@@ -84,9 +223,7 @@ class DatabaseFileManager(FileManager):
         if not self.current_step:
             return ""
 
-        document, _created = await DocumentModel.get_or_create(
-            name=file_path, content=content
-        )
+        document = await DocumentModel.store(file_path, content)
 
         stale_link = await DocumentStep.filter(
             document__name=file_path, step=self.current_step.model_object
@@ -97,7 +234,14 @@ class DatabaseFileManager(FileManager):
             await stale_link.delete()
 
         await self.current_step.add_document(document)
-        return f"Successfully wrote {len(content.encode('utf-8'))} bytes to {file_path}"
+        self.index_document(
+            file_path,
+            document.id,
+            document.blob.hash,
+            document.blob.size,
+            content_type=document.blob.content_type,
+        )
+        return f"Successfully wrote {document.blob.size} bytes to {file_path}"
 
     async def adelete_file(self, file_path: str) -> str:
         """Deletes a file from the virtual file system in RAM.
@@ -111,20 +255,21 @@ class DatabaseFileManager(FileManager):
         if not self.current_step:
             return ""
 
-        document = await DocumentModel.get_or_none(name=file_path)
+        document_index = await self.documents_index()
+        document = document_index.get(file_path)
         if not document:
             return f"Error: File not found '{file_path}'"
 
-        document_step = await DocumentStep.filter(
-            document=document, step=self.current_step.model_object
+        stale_link = await DocumentStep.filter(
+            document__name=file_path, step=self.current_step.model_object
         ).first()
+        if stale_link:
+            await stale_link.delete()
 
-        if document_step:
-            await document.delete()
-        else:
-            logger.warning(
-                f"File {file_path} was supposed to be deleted but it does not exist"
-            )
+        # Earlier steps keep their version of the file, it is only gone from this step on
+        await self.current_step.delete_document(document.document_id)
+        document_index.pop(file_path)
+        self.directory_tree.remove(file_path)
 
         return f"Successfully deleted file {file_path}."
 
@@ -140,51 +285,339 @@ class DatabaseFileManager(FileManager):
         if not self.current_step:
             return ""
 
-        document_steps = await DocumentStep.filter(
-            step=self.current_step.model_object
-        ).prefetch_related("document")
-
-        file_paths = [dm.document.name for dm in document_steps]
-
+        await self.documents_index()
         files_in_dir = [
             file_path
-            for file_path in file_paths
-            if file_path.startswith(dir_path) and file_path not in self.IGNORE_FILES
+            for file_path in self.directory_tree.list_files(dir_path)
+            if file_path not in self.IGNORE_FILES
         ]
         if files_in_dir:
             return "\n".join(files_in_dir)
         else:
             return f"Error: No such directory {dir_path}."
 
-    async def all_documents(self) -> list[DocumentModel]:
-        if not self.current_step:
-            return []
-        document_steps = await DocumentStep.filter(
-            step=self.current_step.model_object
-        ).prefetch_related("document")
+    async def all_documents(self) -> list[IndexedDocument]:
+        documents = sorted(
+            (await self.documents_index()).values(), key=lambda document: document.name
+        )
+        await self.load_contents(documents)
+        return documents
+
+    async def document_names(self) -> list[str]:
+        return sorted(await self.documents_index())
+
+    async def directory_structure(self) -> list[str]:
+        """The directories and files of the current step as an indented list"""
+        await self.documents_index()
+        return self.directory_tree.render()
+
+    async def documents_index(self) -> dict[str, IndexedDocument]:
+        """The documents of the current step by name, without their content. Loaded once per step."""
+        if not self.current_step or not self.current_step.model_object:
+            return {}
+
+        step_model = self.current_step.model_object
+        if self.index_step_id != step_model.id:
+            document_ids = await DocumentStep.snapshot(step_model)
+            rows = await DocumentModel.filter(
+                id__in=list(document_ids.values())
+            ).values_list(*INDEX_COLUMNS)
+            documents = [IndexedDocument(*row) for row in rows]
+            self.document_index = {document.name: document for document in documents}
+            self.directory_tree = DirectoryTree(list(self.document_index))
+            self.index_step_id = step_model.id
+
+        return self.document_index
+
+    def index_document(
+        self,
+        name: str,
+        document_id: int,
+        content_hash: str,
+        size: int,
+        content_type: str = TEXT_CONTENT_TYPE,
+        external: bool = False,
+    ):
+        """Add a document which was just written to the current step to the index, if the index is for that step"""
+        step_model = self.current_step.model_object if self.current_step else None
+        if not step_model or self.index_step_id != step_model.id:
+            return
+
+        self.document_index[name] = IndexedDocument(
+            document_id=document_id,
+            name=name,
+            content_hash=content_hash,
+            size=size,
+            content_type=content_type,
+            external=external,
+        )
+        self.directory_tree.add(name)
+
+    def invalidate_index(self):
+        """Reload the index the next time it is used, e.g. after the documents of a step were changed directly"""
+        self.index_step_id = None
+
+    @staticmethod
+    async def load_contents(documents: list[IndexedDocument]):
+        """Load the content of the documents which don't have it yet, all at once"""
+        unloaded_documents = [
+            document
+            for document in documents
+            if document.content is None and not document.external
+        ]
+        if not unloaded_documents:
+            return
+
+        document_models = await DocumentModel.filter(
+            id__in=[document.document_id for document in unloaded_documents]
+        ).prefetch_related("blob")
+        contents = {
+            document.id: document.blob.content_bytes
+            if document.blob.binary
+            else document.content
+            for document in document_models
+        }
+        for document in unloaded_documents:
+            document.content = contents.get(document.document_id)
+
+    async def artifacts(
+        self, since_step_id: int = None
+    ) -> tuple[list[dict[str, Any]], list[str]]:
+        """
+        The metadata of the documents of the current step, without their content. If `since_step_id` is given, only
+        the documents which were added or changed since that step are included. It must be a step of this body,
+        otherwise a ValueError is raised.
+
+        Returns:
+            The metadata of the documents, and the names of any documents removed since `since_step_id`.
+        """
+        if not self.current_step or not self.current_step.model_object:
+            return [], []
+
+        documents = sorted(
+            (await self.documents_index()).values(), key=lambda document: document.name
+        )
+        removed_names = []
+        if since_step_id is not None:
+            since_step = await StepModel.get_or_none(
+                id=since_step_id, task_execution__body_id=self.body.model_object.id
+            )
+            if not since_step:
+                raise ValueError(f"Step {since_step_id} is not a step of this task")
+            previous_ids = await DocumentStep.snapshot(since_step)
+            current_names = {document.name for document in documents}
+            removed_names = sorted(set(previous_ids) - current_names)
+            documents = [
+                document
+                for document in documents
+                if previous_ids.get(document.name) != document.document_id
+            ]
+
+        artifacts = [
+            {
+                "artifact_id": str(document.document_id),
+                "name": document.name,
+                "size": document.size,
+                "hash": document.content_hash,
+                "content_type": document.content_type,
+            }
+            for document in documents
+        ]
+        return artifacts, removed_names
 
-        return [dm.document for dm in document_steps]
+    async def write_files(
+        self,
+        files: dict[str, Content],
+        large_files: dict[str, tuple[str, int, str]] = None,
+    ):
+        """
+        Write several files to the current step at once, in a constant number of queries however many there are.
+
+        Args:
+            files: The content of each file, by name, as text or bytes.
+            large_files: The hash, size and content type of each file, by name, for files which are already in the
+                large file store.
+        """
+        large_files = large_files or {}
+        if not (files or large_files) or not self.current_step:
+            return
+
+        step_model = self.current_step.model_object
+        async with in_transaction() as connection:
+            document_ids = {}
+            if files:
+                document_ids = await DocumentModel.store_many(
+                    files, using_db=connection
+                )
+            if large_files:
+                blob_ids = await BlobModel.store_external(
+                    {
+                        content_hash: (size, content_type)
+                        for content_hash, size, content_type in large_files.values()
+                    },
+                    using_db=connection,
+                )
+                document_ids |= await DocumentModel.store_for_blobs(
+                    {
+                        name: blob_ids[content_hash]
+                        for name, (content_hash, *_rest) in large_files.items()
+                    },
+                    using_db=connection,
+                )
+
+            stale_link_ids = (
+                await DocumentStep.filter(
+                    step=step_model, document__name__in=list(document_ids)
+                )
+                .using_db(connection)
+                .values_list("id", flat=True)
+            )
+            if stale_link_ids:
+                stale_links = DocumentStep.filter(id__in=stale_link_ids)
+                await stale_links.using_db(connection).delete()
+            await DocumentStep.bulk_create(
+                [
+                    DocumentStep(step=step_model, document_id=document_id)
+                    for document_id in document_ids.values()
+                ],
+                using_db=connection,
+            )
+
+        for name, document_id in document_ids.items():
+            if name in large_files:
+                content_hash, size, content_type = large_files[name]
+                self.index_document(
+                    name,
+                    document_id,
+                    content_hash,
+                    size,
+                    content_type=content_type,
+                    external=True,
+                )
+            else:
+                content = files[name]
+                self.index_document(
+                    name,
+                    document_id,
+                    hash_content(content),
+                    len(encode_content(content)),
+                    content_type=detect_content_type(content),
+                )
 
     async def load_from_directory(self, directory: str = None):
+        """Ingest the files in the directory which changed since they were last synced. Large files are copied to the
+        large file store without being read into memory."""
+        if not self.current_step:
+            return
+
         if not directory:
-            directory = self.body.config.workspace_path
+            directory = self.body.workspace_path
+
+        # The path, content and hash of each file by name. Files are read as bytes, which are stored as they are
+        # without being decoded. The content of large files is left on disk.
+        changed_files: dict[str, tuple[str, Union[bytes, None], str]] = {}
+        for name, path in workspace_files(directory):
+            if self.unchanged_on_disk(path):
+                continue
 
-        for file in os.listdir(directory):
-            abs_path = os.path.abspath(os.path.join(directory, file.replace("/", "_")))
-            if not os.path.isdir(abs_path) and file not in IGNORE_FILES:
-                with open(abs_path, "r") as f:
-                    await self.awrite_file(file, f.read())
+            if os.path.getsize(path) >= self.body.config.large_file_threshold:
+                content_hash = await run_in_executor(hash_file, path)
+                changed_files[name] = (path, None, content_hash)
+                continue
+
+            with open(path, "rb") as f:
+                content = f.read()
+            changed_files[name] = (path, content, hash_content(content))
+
+        if not changed_files:
+            return
+
+        # The files may not have been synced yet but still match the documents, e.g. after the Body was hydrated
+        document_index = await self.documents_index()
+        files_to_write = {}
+        large_files_to_write = {}
+        for name, (path, content, content_hash) in changed_files.items():
+            document = document_index.get(name)
+            if document and document.content_hash == content_hash:
+                continue
+
+            if content is not None:
+                files_to_write[name] = content
+            else:
+                await run_in_executor(
+                    store_file,
+                    path,
+                    self.body.config.large_file_store_path,
+                    content_hash,
+                )
+                head = await run_in_executor(read_bytes, path, 0, CONTENT_SNIFF_SIZE)
+                large_files_to_write[name] = (
+                    content_hash,
+                    os.path.getsize(path),
+                    detect_content_type(head, partial=True),
+                )
+        await self.write_files(files_to_write, large_files_to_write)
+
+        for path, _content, content_hash in changed_files.values():
+            self.record_sync(path, content_hash)
 
     async def flush_to_directory(self, directory: str = None):
+        """Write the documents which changed since they were last synced to the directory"""
         if not self.current_step:
             return
 
         if not directory:
-            directory = self.body.config.workspace_path
-
-        all_documents = await self.all_documents()
-        for document in all_documents:
-            with open(
-                os.path.join(directory, document.name.replace("/", "_")), "w+"
-            ) as f:
-                f.write(document.content)
+            directory = self.body.workspace_path
+
+        stale_documents = {}
+        for document in (await self.documents_index()).values():
+            path = restrict_path(os.path.join(directory, document.name), directory)
+            if not path:
+                logger.warning(
+                    f"Not writing {document.name}, it is outside {directory}"
+                )
+            elif not self.synced(path, document.content_hash):
+                stale_documents[path] = document
+
+        await self.load_contents(list(stale_documents.values()))
+        for path, document in stale_documents.items():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if document.external:
+                await run_in_executor(
+                    shutil.copyfile, self.large_file_path(document), path
+                )
+            elif document.binary:
+                with open(path, "wb") as f:
+                    f.write(document.content)
+            else:
+                with open(path, "w+") as f:
+                    f.write(document.content)
+            self.record_sync(path, document.content_hash)
+
+    def record_sync(self, path: str, content_hash: str):
+        stat = os.stat(path)
+        self.synced_files[path] = SyncedFile(
+            content_hash=content_hash, mtime_ns=stat.st_mtime_ns, size=stat.st_size
+        )
+
+    def unchanged_on_disk(self, path: str) -> bool:
+        synced_file = self.synced_files.get(path)
+        if not synced_file:
+            return False
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        return (stat.st_mtime_ns, stat.st_size) == (
+            synced_file.mtime_ns,
+            synced_file.size,
+        )
+
+    def synced(self, path: str, content_hash: str) -> bool:
+        """Whether the file at `path` already has this content"""
+        synced_file = self.synced_files.get(path)
+        return bool(
+            synced_file
+            and synced_file.content_hash == content_hash
+            and self.unchanged_on_disk(path)
+        )
@@ -0,0 +1,84 @@
+from typing import Union
+
+
+class DirectoryNode:
+    def __init__(self):
+        self.children: dict[str, "DirectoryNode"] = {}
+        # The full path of the file, if there is a file at this node
+        self.file_path: Union[str, None] = None
+
+    def file_paths(self) -> list[str]:
+        """The paths of the files at and under this node, sorted"""
+        file_paths = [self.file_path] if self.file_path is not None else []
+        for name in sorted(self.children):
+            file_paths.extend(self.children[name].file_paths())
+        return file_paths
+
+
+class DirectoryTree:
+    """
+    The paths of the documents as a tree of directories, so that a directory can be listed in time proportional to
+    what it contains rather than to the number of documents.
+    """
+
+    def __init__(self, file_paths: list[str] = None):
+        self.root = DirectoryNode()
+        for file_path in file_paths or []:
+            self.add(file_path)
+
+    @staticmethod
+    def split_path(path: str) -> list[str]:
+        return [part for part in path.split("/") if part not in ("", ".")]
+
+    def node(self, path: str) -> Union[DirectoryNode, None]:
+        node = self.root
+        for part in self.split_path(path):
+            node = node.children.get(part)
+            if not node:
+                return None
+        return node
+
+    def add(self, file_path: str):
+        node = self.root
+        for part in self.split_path(file_path):
+            node = node.children.setdefault(part, DirectoryNode())
+        node.file_path = file_path
+
+    def remove(self, file_path: str):
+        parts = self.split_path(file_path)
+        nodes = [self.root]
+        for part in parts:
+            node = nodes[-1].children.get(part)
+            if not node:
+                return
+            nodes.append(node)
+
+        nodes[-1].file_path = None
+        # Prune the directories which are now empty
+        for part, parent, node in reversed(list(zip(parts, nodes, nodes[1:]))):
+            if node.children or node.file_path is not None:
+                break
+            del parent.children[part]
+
+    def list_files(self, dir_path: str) -> list[str]:
+        """The paths of the files in the directory and its subdirectories, sorted"""
+        node = self.node(dir_path)
+        if not node:
+            return []
+        return node.file_paths()
+
+    def render(self) -> list[str]:
+        """The tree as an indented list, one line per directory or file"""
+        lines = []
+
+        def render_node(node: DirectoryNode, depth: int):
+            for name in sorted(node.children):
+                child = node.children[name]
+                if child.file_path is not None:
+                    lines.append(f"{' ' * depth}- {name}")
+                if child.children:
+                    lines.append(f"{' ' * depth}- {name}/")
+                    render_node(child, depth + 1)
+
+        render_node(self.root, 1)
+        return lines
@@ -0,0 +1,82 @@
+"""
+Workspace files of at least `Config.large_file_threshold` bytes are kept in the large file store on disk, named by the
+hash of their content, instead of in the database. They are read through memory maps, a window at a time.
+"""
+import hashlib
+import mmap
+import os
+import shutil
+import uuid
+from typing import Iterator
+
+# The number of lines in a window when no count is given
+DEFAULT_WINDOW_LINES = 200
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: str) -> str:
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return hashlib.sha256(b"").hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return hashlib.sha256(mapped).hexdigest()
+
+
+def store_file(path: str, store_path: str, content_hash: str) -> str:
+    """Copy a file into the store unless it is already there, and return its path in the store"""
+    stored_path = os.path.join(store_path, content_hash)
+    if not os.path.exists(stored_path):
+        os.makedirs(store_path, exist_ok=True)
+        # Written under a temporary name first so that a partial copy is never mistaken for the file
+        temporary_path = f"{stored_path}.{uuid.uuid4().hex}.tmp"
+        shutil.copyfile(path, temporary_path)
+        os.replace(temporary_path, stored_path)
+    return stored_path
+
+
+def read_bytes(path: str, offset: int, length: int) -> bytes:
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return b""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return mapped[offset : offset + length]
+
+
+def read_lines(path: str, start_line: int, line_count: int) -> str:
+    """Lines `start_line` (counting from 1) onwards, without reading the rest of the file"""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            start = 0
+            for _ in range(start_line - 1):
+                start = mapped.find(b"\n", start) + 1
+                if not start:
+                    return ""
+
+            end = start
+            for _ in range(line_count):
+                end = mapped.find(b"\n", end) + 1
+                if not end:
+                    end = size
+                    break
+            return mapped[start:end].decode("utf-8", errors="replace")
+
+
+def window_lines(content: str, start_line: int, line_count: int) -> str:
+    """The same window as `read_lines`, of content which is already in memory. Like `read_lines`, lines only end at
+    newlines, not at the other line boundaries of `str.splitlines`."""
+    lines = content.split("\n")
+    first_line, end_line = start_line - 1, start_line - 1 + line_count
+    if first_line >= len(lines):
+        return ""
+    window = "\n".join(lines[first_line:end_line])
+    # Every line ends with a newline except the last one of the content
+    return window + "\n" if end_line < len(lines) else window
+
+
+def iter_file(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            yield chunk
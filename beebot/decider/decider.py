@@ -3,8 +3,9 @@ import logging
 from json import JSONDecodeError
 from typing import TYPE_CHECKING, Any
 
-from beebot.body.llm import call_llm, LLMResponse
+from beebot.body.llm import call_llm, LLMResponse, reserved_prompt_tokens
 from beebot.body.pack_utils import functions_detail_list
+from beebot.body.tokens import fit_prompt_variables
 from beebot.decider.deciding_prompt import decider_template
 from beebot.models.database_models import Decision, Oversight
 
@@ -30,21 +31,30 @@ class Decider:
         self, oversight: Oversight, disregard_cache: bool = False
     ) -> Decision:
         """Take a Plan and send it to the LLM, returning it back to the Body"""
+        body = self.task_execution.body
+        model_name = body.decider_llm.model_name
+        history, variables = await self.task_execution.compile_context(model_name)
         # TODO: Get from agent?
         prompt_variables = {
             "plan": oversight.modified_plan_text,
             "task": self.task_execution.instructions,
-            "variables": self.task_execution.compile_variables(),
-            "history": await self.task_execution.compile_history(),
+            "variables": variables,
+            "history": history,
             "functions": functions_detail_list(self.task_execution.packs.values()),
         }
+        prompt_variables = fit_prompt_variables(
+            decider_template(),
+            prompt_variables,
+            model_name,
+            reserved_prompt_tokens(body, model_name),
+        )
         prompt = decider_template().format(**prompt_variables)
 
         response = await call_llm(
-            self.task_execution.body,
+            body,
             prompt,
             disregard_cache=disregard_cache,
-            llm=self.task_execution.body.decider_llm,
+            llm=body.decider_llm,
         )
 
         logger.info("\n=== Decision received from LLM ===")
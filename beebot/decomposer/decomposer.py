@@ -1,13 +1,12 @@
 import json
 import logging
-import os
 from json import JSONDecodeError
 from typing import TYPE_CHECKING
 
 from pydantic import Field, BaseModel
 
 from beebot.body.llm import call_llm
-from beebot.config.database_file_manager import IGNORE_FILES
+from beebot.config.database_file_manager import workspace_files
 from beebot.decomposer.decomposer_prompt import decomposer_prompt
 
 logger = logging.getLogger(__name__)
@@ -68,13 +67,9 @@ class Decomposer:
         return self.subtasks
 
     def starting_files(self) -> str:
-        directory = self.body.config.workspace_path
+        directory = self.body.workspace_path
 
-        file_list = []
-        for file in os.listdir(directory):
-            abs_path = os.path.abspath(os.path.join(directory, file.replace("/", "_")))
-            if not os.path.isdir(abs_path) and file not in IGNORE_FILES:
-                file_list.append(f"- {file}")
+        file_list = [f"- {name}" for name, _path in workspace_files(directory)]
 
         if not file_list:
             return ""
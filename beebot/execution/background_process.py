@@ -35,7 +35,7 @@ class BackgroundProcess:
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             universal_newlines=True,
-            cwd=self.body.config.workspace_path,
+            cwd=self.body.workspace_path,
             start_new_session=self.daemonize,
         )
 
@@ -0,0 +1,176 @@
+from typing import TYPE_CHECKING, Callable, Union
+
+from beebot.body.tokens import count_tokens
+
+if TYPE_CHECKING:
+    from beebot.execution import Step
+
+
+class HistoryBuffer:
+    """
+    An append-only cache of the rendered history of a TaskExecution. Finished steps never change, so each of them is
+    rendered once and appended to the cached text. Only the current step, whose observation may still change, is
+    rendered on every call. Token counts are cached the same way, so checking the history against a token budget
+    only tokenizes what changed since the last check.
+    """
+
+    steps: list["Step"]
+    text: str
+    # The rendered text and variable name of each finished step, in order
+    segments: list[str]
+    variable_names: list[Union[str, None]]
+    # Map of value to how many of its variable names have been used by rendered steps
+    used_variables: dict[str, int]
+    # Rolling summaries of the history, keyed by the number of steps they cover
+    summaries: dict[int, str]
+    # The rendered current step, as of the last compile
+    current_segment: str
+    # How many finished segments have been counted for each model, and the sum of their token counts
+    counted_segments: dict[str, int]
+    segment_tokens: dict[str, int]
+    # The token count of each rendered variable row, by model and row
+    row_tokens: dict[tuple[str, str], int]
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.steps = []
+        self.text = ""
+        self.segments = []
+        self.variable_names = []
+        self.used_variables = {}
+        self.summaries = {}
+        self.current_segment = ""
+        self.counted_segments = {}
+        self.segment_tokens = {}
+        self.row_tokens = {}
+
+    def compile(
+        self,
+        steps: list["Step"],
+        variables: dict[str, list[str]],
+        render_step: Callable[["Step", Union[str, None]], list[str]],
+        start: int = 0,
+    ) -> str:
+        """Render the history of `steps`, optionally leaving out the ones before `start`"""
+        self.update(steps, variables, render_step)
+
+        if start:
+            rendered_segments = [
+                segment for segment in self.segments[start:] if segment
+            ]
+            text = "\n".join(rendered_segments)
+        else:
+            text = self.text
+
+        self.current_segment = ""
+        if len(self.steps) >= len(steps):
+            return text
+
+        current_lines = self.render_current_step(steps[-1], variables, render_step)
+        if not current_lines:
+            return text
+        self.current_segment = "\n".join(current_lines)
+        if not text:
+            return self.current_segment
+        return text + "\n" + self.current_segment
+
+    def update(
+        self,
+        steps: list["Step"],
+        variables: dict[str, list[str]],
+        render_step: Callable[["Step", Union[str, None]], list[str]],
+    ):
+        """Render any steps which have been finished since the last update"""
+        rendered_count = len(self.steps)
+        if rendered_count > len(steps) or (
+            rendered_count and steps[rendered_count - 1] is not self.steps[-1]
+        ):
+            # The steps have been replaced, e.g. when rolling back. Start over.
+            self.reset()
+            rendered_count = 0
+
+        # Everything but the last step is finished
+        for step in steps[rendered_count:-1]:
+            variable_name = None
+            lines = []
+            if step.observation:
+                variable_name = self.variable_name(step.observation.response, variables)
+                lines = render_step(step, variable_name)
+            self.append(step, lines, variable_name)
+
+    def window_variable_names(
+        self, steps: list["Step"], variables: dict[str, list[str]], start: int
+    ) -> set[str]:
+        """The names of the variables set by `steps[start:]`. Must be called after `compile`."""
+        names = {name for name in self.variable_names[start:] if name}
+        if len(self.steps) < len(steps) and steps[-1].observation:
+            current_name = self.variable_name(
+                steps[-1].observation.response, variables, commit=False
+            )
+            if current_name:
+                names.add(current_name)
+        return names
+
+    def token_count(self, model_name: str) -> int:
+        """
+        The number of tokens in the whole history for `model_name`, give or take the tokens where segments are joined.
+        Only the steps finished since the last call and the current step are tokenized. Must be called after `compile`.
+        """
+        counted_count = self.counted_segments.get(model_name, 0)
+        total = self.segment_tokens.get(model_name, 0)
+        for segment in self.segments[counted_count:]:
+            if segment:
+                # Plus the newline joining it to the previous segment
+                total += count_tokens(segment, model_name) + 1
+        self.counted_segments[model_name] = len(self.segments)
+        self.segment_tokens[model_name] = total
+        return total + count_tokens(self.current_segment, model_name)
+
+    def rows_token_count(self, rows: list[str], model_name: str) -> int:
+        """The number of tokens in rows joined by newlines, only tokenizing the rows which haven't been seen before"""
+        total = 0
+        for row in rows:
+            key = (model_name, row)
+            if key not in self.row_tokens:
+                self.row_tokens[key] = count_tokens(row, model_name) + 1
+            total += self.row_tokens[key]
+        return total
+
+    def append(self, step: "Step", lines: list[str], variable_name: Union[str, None]):
+        segment = "\n".join(lines)
+        self.steps.append(step)
+        self.segments.append(segment)
+        self.variable_names.append(variable_name)
+        if segment:
+            self.text = f"{self.text}\n{segment}" if self.text else segment
+
+    def render_current_step(
+        self,
+        step: "Step",
+        variables: dict[str, list[str]],
+        render_step: Callable[["Step", Union[str, None]], list[str]],
+    ) -> list[str]:
+        if not step.observation:
+            return []
+        variable_name = self.variable_name(
+            step.observation.response, variables, commit=False
+        )
+        return render_step(step, variable_name)
+
+    def variable_name(
+        self, value: str, variables: dict[str, list[str]], commit: bool = True
+    ) -> Union[str, None]:
+        """The first variable name holding this value which hasn't been used by an earlier step"""
+        variable_names = variables.get(value)
+        if not variable_names:
+            return None
+
+        used_count = self.used_variables.get(value, 0)
+        if commit:
+            self.used_variables[value] = used_count + 1
+
+        if used_count < len(variable_names):
+            return variable_names[used_count]
+        return variable_names[-1]
@@ -0,0 +1,16 @@
+TEMPLATE = """You are summarizing the history of functions that an AI Assistant has executed while working on a task, so that it can continue with the task without reading the whole history.
+
+# Task
+{task}
+
+# Summary of the earlier history
+{previous_summary}
+
+# History to add to the summary
+{history}
+
+Write an updated summary of the entire history in a few sentences. Retain key details such as file names, IDs, variable names, results, and errors, as well as which approaches have already been tried. Respond with only the summary."""
+
+
+def history_summarization_template() -> str:
+    return TEMPLATE
@@ -1,5 +1,7 @@
-from dataclasses import dataclass
-from typing import TYPE_CHECKING
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Awaitable, Union
+
+from tortoise import BaseDBAsyncClient, Model
 
 from beebot.models.database_models import (
     StepModel,
@@ -24,25 +26,62 @@ class Step:
     observation: Observation = None
     plan: Plan = None
     reversible: bool = True
+    # The ids of the related rows as of the last save, to tell whether the step needs to be written again
+    saved_related_ids: tuple = field(default=None, init=False, repr=False)
 
     @property
-    async def documents(self) -> dict[str, DocumentModel]:
-        documents = {}
+    def related_objects(
+        self,
+    ) -> tuple[Union[Oversight, Decision, Observation, Plan, None], ...]:
+        return self.oversight, self.decision, self.observation, self.plan
+
+    @property
+    def dirty(self) -> bool:
         if not self.model_object:
-            return documents
+            return True
+        if any(related and related.pk is None for related in self.related_objects):
+            # A new related row which hasn't been written yet
+            return True
+        return self.saved_related_ids != self.related_ids()
 
-        document_steps = await DocumentStep.filter(
-            step=self.model_object
-        ).prefetch_related("document")
-        for document_step in document_steps:
-            documents[document_step.document.name] = document_step.document
+    def related_ids(self) -> tuple[Union[int, None], ...]:
+        return tuple(
+            related.pk if related else None for related in self.related_objects
+        )
 
-        return documents
+    @property
+    async def documents(self) -> dict[str, DocumentModel]:
+        """The files as of this step, by name"""
+        if not self.model_object:
+            return {}
+
+        document_ids = await DocumentStep.snapshot(self.model_object)
+        documents = await DocumentModel.filter(
+            id__in=list(document_ids.values())
+        ).prefetch_related("blob")
+        return {
+            document.name: document
+            for document in sorted(documents, key=lambda document: document.name)
+        }
 
     async def add_document(self, document: DocumentModel):
         await DocumentStep.get_or_create(document=document, step=self.model_object)
 
-    async def save(self):
+    async def delete_document(self, document_id: int):
+        await DocumentStep.get_or_create(
+            document_id=document_id, step=self.model_object, deleted=True
+        )
+
+    async def save(self, using_db: BaseDBAsyncClient = None):
+        """Write the step, and any of its related rows which haven't been written yet. Does nothing if nothing has
+        changed since the last save."""
+        if not self.dirty:
+            return
+
+        for related in self.related_objects:
+            if related and related.pk is None:
+                await related.save(using_db=using_db)
+
         if not self.model_object:
             self.model_object = StepModel(
                 task_execution=self.task_execution.model_object,
@@ -57,15 +96,16 @@ class Step:
             self.model_object.observation = self.observation
             self.model_object.plan = self.plan
 
-        await self.model_object.save()
+        await self.model_object.save(using_db=using_db)
+        self.saved_related_ids = self.related_ids()
 
     @classmethod
     async def from_model(cls, step_model: StepModel):
         kwargs = {"model_object": step_model, "reversible": False}
-        oversight = await step_model.oversight
-        decision = await step_model.decision
-        observation = await step_model.observation
-        plan = await step_model.plan
+        oversight = await fetch_related(step_model.oversight)
+        decision = await fetch_related(step_model.decision)
+        observation = await fetch_related(step_model.observation)
+        plan = await fetch_related(step_model.plan)
 
         if oversight:
             kwargs["oversight"] = oversight
@@ -77,5 +117,15 @@ class Step:
             kwargs["plan"] = plan
 
         step = cls(**kwargs)
+        step.saved_related_ids = step.related_ids()
 
         return step
+
+
+async def fetch_related(
+    related: Union[Awaitable[Model], Model, None]
+) -> Union[Model, None]:
+    """A foreign key's row. If it was prefetched it is already there (or None), otherwise it is queried."""
+    if related is None:
+        return None
+    return await related
@@ -1,13 +1,16 @@
+import asyncio
 import logging
 from typing import TYPE_CHECKING, Union
 
 from autopack import Pack
 from pydantic import ValidationError
+from tortoise.transactions import in_transaction
 
-from beebot.body.pack_utils import llm_wrapper
+from beebot.body.pack_utils import READ_ONLY_PACKS
 from beebot.decider import Decider
 from beebot.execution import Step
 from beebot.execution.executor import Executor
+from beebot.execution.history_buffer import HistoryBuffer
 from beebot.execution.task_state_machine import TaskStateMachine
 from beebot.models.database_models import (
     Plan,
@@ -26,6 +29,8 @@ if TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 RETRY_LIMIT = 3
+# Stands in for the result of a pack while it is still running, when planning speculatively
+PROVISIONAL_OBSERVATION = "(This result is still being retrieved)"
 
 
 class TaskExecution:
@@ -45,6 +50,9 @@ class TaskExecution:
 
     # NOTE! Map of value to list of names
     variables: dict[str, list[str]]
+    # Decision for the next step made alongside its plan, when running with `fused_cycle`
+    pending_decision: Decision = None
+    history: HistoryBuffer
 
     def __init__(
         self,
@@ -62,6 +70,7 @@ class TaskExecution:
         self.model_object = model_object
         self.packs = {}
         self.variables = {}
+        self.history = HistoryBuffer()
 
         if model_object:
             self.agent_name = model_object.agent
@@ -96,7 +105,9 @@ class TaskExecution:
             task_execution_model.state
         ]
 
-        for step_model in await task_execution_model.steps.all():
+        # Use the prefetched steps, if they were prefetched
+        step_models = [step_model async for step_model in task_execution_model.steps]
+        for step_model in sorted(step_models, key=lambda model: model.id):
             task.steps.append(await Step.from_model(step_model))
 
         if task.current_step and task.current_step.plan:
@@ -119,22 +130,21 @@ class TaskExecution:
             oversight = Oversight(
                 original_plan_text=plan.plan_text, modified_plan_text=plan.plan_text
             )
-            await oversight.save()
 
-            new_incomplete_step = Step(task_execution=self, oversight=oversight)
+            new_incomplete_step = Step(
+                task_execution=self,
+                oversight=oversight,
+                decision=self.pending_decision,
+            )
+            self.pending_decision = None
         else:
             new_incomplete_step = Step(task_execution=self)
 
-        await new_incomplete_step.save()
+        # Written along with its new oversight by the save. It inherits the documents of the steps before it.
         self.steps.append(new_incomplete_step)
         await self.save()
-        # Create links from previous documents to this execution
 
-        if old_step:
-            previous_documents = await old_step.documents
-            for document in previous_documents.values():
-                await new_incomplete_step.add_document(document)
-        else:
+        if not old_step:
             await self.create_initial_oversight()
 
         return new_incomplete_step
@@ -156,24 +166,29 @@ class TaskExecution:
         await self.save()
 
         decision = await self.decide(oversight)
-        await self.execute(decision)
+        if self.can_plan_speculatively(decision):
+            new_plan = await self.execute_and_plan(decision)
+        else:
+            await self.execute(decision)
+            new_plan = None
 
         return_step = self.current_step
         if not self.complete:
-            new_plan = await self.plan()
+            if not new_plan:
+                new_plan = await self.plan()
             await self.add_plan(new_plan)
             await self.finish_step()
 
         await self.save()
         return return_step
 
+    # The steps are written by the `save` that follows each state transition, not as each part is added
     async def add_oversight(self, oversight: Oversight):
         self.current_step.oversight = oversight
-        await self.current_step.save()
+        await self.save()
 
     async def add_decision(self, decision: str):
         self.current_step.decision = decision
-        await self.current_step.save()
 
     async def add_observation(self, observation: Observation):
         step = self.current_step
@@ -183,43 +198,53 @@ class TaskExecution:
         else:
             self.variables[observation.response] = [variable_name]
         step.observation = observation
-        await step.save()
 
     async def add_plan(self, plan: Plan):
         self.current_step.plan = plan
-        await self.current_step.save()
 
     async def finish_step(self) -> Step:
         completed_step = self.current_step
         await self.create_new_step()
         return completed_step
 
-    async def save(self):
-        if not self.model_object:
-            path_model = TaskExecutionModel(
-                body=self.body.model_object,
-                agent=self.agent_name,
-                instructions=self.instructions,
-                inputs=self.inputs,
-                outputs=self.outputs,
-                complete=self.complete,
-            )
-            await path_model.save()
-            self.model_object = path_model
-
-        for step in self.steps:
-            await step.save()
-
-    async def get_packs(self) -> list[Pack]:
-        for pack_class in self.agent.PACKS:
-            from beebot.packs.system_base_pack import SystemBasePack
+    @property
+    def dirty(self) -> bool:
+        return (
+            not self.model_object
+            or self.model_object.complete != self.complete
+            or any(step.dirty for step in self.steps)
+        )
 
-            if pack_class in SystemBasePack.__subclasses__():
-                pack = pack_class(body=self.body)
-            else:
-                llm = llm_wrapper(self.body)
-                pack = pack_class(llm=llm, allm=llm)
-            self.packs[pack.name] = pack
+    async def save(self):
+        """Write everything that changed since the last save in a single transaction. Unchanged rows aren't written
+        again, so this is cheap to call after every state transition."""
+        if not self.dirty:
+            return
+
+        async with in_transaction() as connection:
+            if not self.model_object:
+                path_model = TaskExecutionModel(
+                    body=self.body.model_object,
+                    agent=self.agent_name,
+                    instructions=self.instructions,
+                    inputs=self.inputs,
+                    outputs=self.outputs,
+                    complete=self.complete,
+                )
+                await path_model.save(using_db=connection)
+                self.model_object = path_model
+            elif self.model_object.complete != self.complete:
+                self.model_object.complete = self.complete
+                await self.model_object.save(
+                    update_fields=["complete"], using_db=connection
+                )
+
+            for step in self.steps:
+                await step.save(using_db=connection)
+
+    async def get_packs(self) -> dict[str, Pack]:
+        if not self.packs:
+            self.packs = await self.body.pack_manager.get_packs(self.agent.PACKS)
         return self.packs
 
     async def execute(self, decision: Decision, retry_count: int = 0) -> Observation:
@@ -244,7 +269,16 @@ class TaskExecution:
     async def decide(self, oversight: Oversight = None) -> Decision:
         """Execute an action and keep track of state"""
         try:
-            decision = await Decider(self).decide_with_retry(oversight=oversight)
+            decision = None
+            # A decision made alongside the plan is only valid if the plan wasn't changed during oversight
+            if self.body.config.fused_cycle and (
+                not oversight
+                or oversight.modified_plan_text == oversight.original_plan_text
+            ):
+                decision = self.current_step.decision
+
+            if not decision:
+                decision = await Decider(self).decide_with_retry(oversight=oversight)
             await self.add_decision(decision)
 
             return decision
@@ -255,7 +289,10 @@ class TaskExecution:
     async def plan(self) -> Plan:
         """Take the current task and history and develop a plan"""
         try:
-            plan = await Planner(self).plan()
+            if self.body.config.fused_cycle:
+                plan, self.pending_decision = await Planner(self).plan_and_decide()
+            else:
+                plan = await Planner(self).plan()
             await self.add_plan(plan)
             return plan
         finally:
@@ -263,6 +300,60 @@ class TaskExecution:
                 self.state.oversee()
             await self.save()
 
+    def can_plan_speculatively(self, decision: Decision) -> bool:
+        return (
+            self.body.config.speculative_planning
+            and decision.tool_name in READ_ONLY_PACKS
+        )
+
+    async def execute_and_plan(self, decision: Decision) -> Union[Plan, None]:
+        """Execute a read-only Decision while planning the next step with a provisional observation. The speculative
+        plan is kept if execution succeeds, otherwise it is discarded and None is returned so that a regular plan is
+        made with the real observation."""
+        prompt, prompt_variables = await self.provisional_planning_prompt()
+        planning = asyncio.create_task(
+            Planner(self).plan_from_prompt(prompt, prompt_variables)
+        )
+
+        try:
+            observation = await self.execute(decision)
+        except BaseException:
+            await discard_speculative_plan(planning)
+            raise
+
+        if (
+            self.complete
+            or not observation
+            or not observation.success
+            or (observation.response or "").startswith("Error")
+        ):
+            logger.info("\n=== Speculative plan discarded ===")
+            await discard_speculative_plan(planning)
+            return None
+
+        try:
+            plan = await planning
+            await self.add_plan(plan)
+            return plan
+        finally:
+            self.state.oversee()
+            await self.save()
+
+    async def provisional_planning_prompt(self) -> tuple[str, dict[str, str]]:
+        """Render the planning prompt as if the current step had succeeded, without knowing its result yet"""
+        step = self.current_step
+        variable_name = f"{step.decision.tool_name}_{len(self.steps)}"
+        provisional_names = self.variables.setdefault(PROVISIONAL_OBSERVATION, [])
+        provisional_names.append(variable_name)
+        step.observation = Observation(response=PROVISIONAL_OBSERVATION)
+        try:
+            return await self.agent.planning_prompt()
+        finally:
+            step.observation = None
+            provisional_names.remove(variable_name)
+            if not provisional_names:
+                self.variables.pop(PROVISIONAL_OBSERVATION)
+
     async def create_initial_oversight(self) -> Oversight:
         oversight = await Overseer(self).initial_oversight()
         await self.add_oversight(oversight)
@@ -273,3 +364,22 @@ class TaskExecution:
 
     def compile_variables(self) -> str:
         return self.agent.compile_variables()
+
+    async def compile_context(self, model_name: str) -> tuple[str, str]:
+        return await self.agent.compile_context(model_name)
+
+
+async def discard_speculative_plan(planning: asyncio.Task):
+    """Stop a speculative planning task, deleting its Plan if it was already created"""
+    if not planning.done():
+        planning.cancel()
+
+    try:
+        plan = await planning
+    except asyncio.CancelledError:
+        return
+    except Exception as e:
+        logger.warning(f"Speculative planning failed: {e}")
+        return
+
+    await plan.delete()
@@ -2,6 +2,8 @@ from typing import TYPE_CHECKING
 
 from statemachine import StateMachine, State
 
+from beebot.notifications import publish_notification_soon
+
 if TYPE_CHECKING:
     from beebot.execution.task_execution import TaskExecution
 
@@ -23,3 +25,16 @@ class TaskStateMachine(StateMachine):
     def __init__(self, task_execution: "TaskExecution"):
         self.task_execution = task_execution
         super().__init__()
+
+    def after_transition(self, event: str, source: State, target: State):
+        model_object = self.task_execution.model_object
+        publish_notification_soon(
+            {
+                "task_execution_state": {
+                    "task_execution_id": model_object.id if model_object else None,
+                    "event": event,
+                    "source": source.id,
+                    "state": target.id,
+                }
+            }
+        )
@@ -5,6 +5,9 @@ from dotenv import load_dotenv
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
+from beebot.agents import BaseAgent
+from beebot.api.body_cache import BodyCache
+from beebot.api.step_runner import StepRunner
 from beebot.api.routes import (
     create_agent_task,
     execute_agent_task_step,
@@ -12,8 +15,10 @@ from beebot.api.routes import (
     get_agent_task,
     list_agent_task_steps,
     get_agent_task_step,
+    download_agent_task_artifact,
 )
 from beebot.api.websocket import websocket_endpoint
+from beebot.body.llm import close_llm_clients
 from beebot.config import Config
 
 logger = logging.getLogger(__name__)
@@ -34,6 +39,10 @@ def create_app() -> FastAPI:
         description="",
         version="v1",
     )
+    app.add_event_handler("startup", BaseAgent.precompute_functions)
+    app.add_event_handler("shutdown", StepRunner.global_runner(config).shutdown)
+    app.add_event_handler("shutdown", BodyCache.global_cache(config).clear)
+    app.add_event_handler("shutdown", close_llm_clients)
     app.add_websocket_route("/notifications", websocket_endpoint)
     app.add_route("/agent/tasks", create_agent_task, methods=["POST"])
     app.add_route(
@@ -43,6 +52,9 @@ def create_app() -> FastAPI:
     app.add_route("/agent/tasks/{task_id}", get_agent_task)
     app.add_route("/agent/tasks/{task_id}/steps", list_agent_task_steps)
     app.add_route("/agent/tasks/{task_id}/steps/{step_id}", get_agent_task_step)
+    app.add_route(
+        "/agent/tasks/{task_id}/artifacts/{artifact_id}", download_agent_task_artifact
+    )
 
     app.add_middleware(
         CORSMiddleware,
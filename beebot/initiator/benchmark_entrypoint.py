@@ -3,7 +3,9 @@ import sys
 
 from dotenv import load_dotenv
 
+from beebot.agents import BaseAgent
 from beebot.body import Body
+from beebot.body.llm import close_llm_clients
 from beebot.config import Config
 from beebot.models.database_models import initialize_db
 
@@ -13,6 +15,7 @@ async def run_specific_agent(task: str) -> None:
 
     config = Config.global_config()
     config.setup_logging()
+    BaseAgent.precompute_functions()
     await initialize_db(config.database_url)
 
     body = Body(task=task, config=config)
@@ -21,6 +24,9 @@ async def run_specific_agent(task: str) -> None:
         if output.observation:
             print(output.observation.response)
 
+    await body.pack_manager.teardown()
+    await close_llm_clients()
+
 
 if __name__ == "__main__":
     if len(sys.argv) != 2:
@@ -4,7 +4,9 @@ import asyncio
 
 from dotenv import load_dotenv
 
+from beebot.agents import BaseAgent
 from beebot.body import Body
+from beebot.body.llm import close_llm_clients
 from beebot.config import Config
 from beebot.models.database_models import initialize_db
 
@@ -33,6 +35,7 @@ async def main():
 
     config = Config.global_config()
     config.setup_logging()
+    BaseAgent.precompute_functions()
     await initialize_db(config.database_url)
 
     body = Body(task=task, config=config)
@@ -42,6 +45,9 @@ async def main():
             print("\n=== Cycle Output ===")
             print(output.observation.response)
 
+    await body.pack_manager.teardown()
+    await close_llm_clients()
+
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,4 +1,5 @@
 __all__ = [
+    "BlobModel",
     "BodyModel",
     "DocumentModel",
     "TaskExecutionModel",
@@ -8,9 +9,11 @@ __all__ = [
     "Decision",
     "Observation",
     "DocumentStep",
+    "LLMCacheEntry",
 ]
 
 from .database_models import (
+    BlobModel,
     BodyModel,
     DocumentModel,
     TaskExecutionModel,
@@ -20,4 +23,5 @@ from .database_models import (
     Decision,
     Observation,
     DocumentStep,
+    LLMCacheEntry,
 )
@@ -1,10 +1,71 @@
+import codecs
+import hashlib
 import json
+from typing import ClassVar, Union
 
-from tortoise import fields, Tortoise
+from tortoise import BaseDBAsyncClient, fields, Tortoise
 from tortoise.fields import JSONField, BooleanField
 from tortoise.models import Model
 from yoyo import get_backend, read_migrations
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Blobs at least this large are compressed
+BLOB_COMPRESSION_THRESHOLD = 16 * 1024
+TEXT_CONTENT_TYPE = "text/plain"
+BINARY_CONTENT_TYPE = "application/octet-stream"
+# Content types recognized by the bytes their content starts with
+CONTENT_SIGNATURES = {
+    b"\x89PNG\r\n\x1a\n": "image/png",
+    b"\xff\xd8\xff": "image/jpeg",
+    b"GIF87a": "image/gif",
+    b"GIF89a": "image/gif",
+    b"%PDF-": "application/pdf",
+    b"PK\x03\x04": "application/zip",
+    b"\x1f\x8b": "application/gzip",
+    b"SQLite format 3\x00": "application/vnd.sqlite3",
+    b"PAR1": "application/vnd.apache.parquet",
+}
+# How much of the content is looked at to tell text from binary
+CONTENT_SNIFF_SIZE = 8 * 1024
+
+# Text is stored as its UTF-8 encoding, so a file hashes the same whether it was read as text or as bytes
+Content = Union[str, bytes]
+
+
+def encode_content(content: Content) -> bytes:
+    return content.encode("utf-8") if isinstance(content, str) else content
+
+
+def hash_content(content: Content) -> str:
+    return hashlib.sha256(encode_content(content)).hexdigest()
+
+
+def detect_content_type(content: Content, partial: bool = False) -> str:
+    """
+    The content type of the content, recognized by its first bytes. Anything else which isn't valid UTF-8 is binary.
+
+    Args:
+        content: The content, or only the start of it if `partial` is set.
+    """
+    if isinstance(content, str):
+        return TEXT_CONTENT_TYPE
+
+    for signature, content_type in CONTENT_SIGNATURES.items():
+        if content.startswith(signature):
+            return content_type
+    if b"\x00" in content[:CONTENT_SNIFF_SIZE]:
+        return BINARY_CONTENT_TYPE
+    try:
+        # The start of the content may end partway through a character
+        codecs.getincrementaldecoder("utf-8")().decode(content, final=not partial)
+    except UnicodeDecodeError:
+        return BINARY_CONTENT_TYPE
+    return TEXT_CONTENT_TYPE
+
 
 class BaseModel(Model):
     id = fields.IntField(pk=True)
@@ -22,7 +83,15 @@ class BaseModel(Model):
 
 
 class BodyModel(BaseModel):
-    INCLUSIVE_PREFETCH = "task_executions__steps__document_steps__document"
+    # Everything `Body.from_model` needs. Each relation is fetched with one query however many rows it covers, so a
+    # Body is loaded in a constant number of queries.
+    INCLUSIVE_PREFETCH = (
+        "task_executions__steps__document_steps__document",
+        "task_executions__steps__oversight",
+        "task_executions__steps__decision",
+        "task_executions__steps__observation",
+        "task_executions__steps__plan",
+    )
 
     task = fields.TextField()
 
@@ -45,6 +114,8 @@ class TaskExecutionModel(BaseModel):
 
 
 class StepModel(BaseModel):
+    RELATED_PREFETCH = ("oversight", "decision", "observation", "plan")
+
     task_execution = fields.ForeignKeyField(
         "models.TaskExecutionModel", related_name="steps"
     )
@@ -102,23 +173,308 @@ class Plan(BaseModel):
         table = "plan"
 
 
+class BlobModel(BaseModel):
+    """
+    File content, stored once however many documents have it. Large bodies are compressed if `blob_compression` is
+    enabled and zstandard is installed. The content is stored as bytes, text as its UTF-8 encoding.
+    """
+
+    hash = fields.CharField(max_length=64, unique=True)
+    data = fields.BinaryField()
+    compression = fields.CharField(max_length=16, default="")
+    # The size of the content, before compression
+    size = fields.IntField()
+    # Large files are kept on disk in the large file store, named by their hash, rather than in `data`
+    external = BooleanField(default=False)
+    content_type = fields.CharField(max_length=255, default=TEXT_CONTENT_TYPE)
+
+    # Set from `Config.blob_compression`
+    compress_large_blobs: ClassVar[bool] = False
+
+    class Meta:
+        table = "blob"
+
+    @property
+    def binary(self) -> bool:
+        return self.content_type != TEXT_CONTENT_TYPE
+
+    @property
+    def content_bytes(self) -> memoryview:
+        """The content without copying it, unless it has to be decompressed"""
+        if self.external:
+            raise RuntimeError(
+                f"Blob {self.hash} is stored on disk, read it from there"
+            )
+        if self.compression == "zstd":
+            if not zstandard:
+                raise RuntimeError(
+                    f"Blob {self.hash} is compressed, install zstandard to read it"
+                )
+            return memoryview(zstandard.ZstdDecompressor().decompress(self.data))
+        return memoryview(self.data)
+
+    @property
+    def content(self) -> Content:
+        """Text is decoded, binary content is returned as bytes"""
+        if self.binary:
+            return bytes(self.content_bytes)
+        return str(self.content_bytes, "utf-8")
+
+    @classmethod
+    def from_content(cls, content: Content) -> "BlobModel":
+        """An unsaved blob of this content"""
+        encoded_content = encode_content(content)
+        data, compression = encoded_content, ""
+        if (
+            cls.compress_large_blobs
+            and zstandard
+            and len(encoded_content) >= BLOB_COMPRESSION_THRESHOLD
+        ):
+            compressed_content = zstandard.ZstdCompressor().compress(encoded_content)
+            if len(compressed_content) < len(encoded_content):
+                data, compression = compressed_content, "zstd"
+
+        return cls(
+            hash=hash_content(encoded_content),
+            data=data,
+            compression=compression,
+            size=len(encoded_content),
+            content_type=detect_content_type(content),
+        )
+
+    @classmethod
+    async def store(cls, content: Content) -> "BlobModel":
+        """The blob with this content, created if there isn't one yet"""
+        blob = await cls.get_or_none(hash=hash_content(content))
+        if blob:
+            return blob
+
+        new_blob = cls.from_content(content)
+        blob, _created = await cls.get_or_create(
+            hash=new_blob.hash,
+            defaults={
+                "data": new_blob.data,
+                "compression": new_blob.compression,
+                "size": new_blob.size,
+                "content_type": new_blob.content_type,
+            },
+        )
+        return blob
+
+    @classmethod
+    async def store_many(
+        cls, contents: dict[str, Content], using_db: BaseDBAsyncClient = None
+    ) -> dict[str, int]:
+        """
+        Create the blobs which don't exist yet, in a constant number of queries.
+
+        Args:
+            contents: The content to store, by its hash.
+
+        Returns:
+            The ID of the blob of each content, by its hash.
+        """
+        blob_ids = dict(
+            await cls.filter(hash__in=list(contents))
+            .using_db(using_db)
+            .values_list("hash", "id")
+        )
+        new_blobs = [
+            cls.from_content(content)
+            for content_hash, content in contents.items()
+            if content_hash not in blob_ids
+        ]
+        if new_blobs:
+            await cls.bulk_create(new_blobs, ignore_conflicts=True, using_db=using_db)
+            new_hashes = [blob.hash for blob in new_blobs]
+            blob_ids.update(
+                await cls.filter(hash__in=new_hashes)
+                .using_db(using_db)
+                .values_list("hash", "id")
+            )
+        return blob_ids
+
+    @classmethod
+    async def store_external(
+        cls, files: dict[str, tuple[int, str]], using_db: BaseDBAsyncClient = None
+    ) -> dict[str, int]:
+        """
+        Create the blobs of files kept in the large file store which don't exist yet, in a constant number of queries.
+
+        Args:
+            files: The size and content type of each file, by its hash.
+
+        Returns:
+            The ID of the blob of each file, by its hash.
+        """
+        blob_ids = dict(
+            await cls.filter(hash__in=list(files))
+            .using_db(using_db)
+            .values_list("hash", "id")
+        )
+        new_blobs = [
+            cls(
+                hash=content_hash,
+                data=b"",
+                size=size,
+                content_type=content_type,
+                external=True,
+            )
+            for content_hash, (size, content_type) in files.items()
+            if content_hash not in blob_ids
+        ]
+        if new_blobs:
+            await cls.bulk_create(new_blobs, ignore_conflicts=True, using_db=using_db)
+            blob_ids.update(
+                await cls.filter(hash__in=[blob.hash for blob in new_blobs])
+                .using_db(using_db)
+                .values_list("hash", "id")
+            )
+        return blob_ids
+
+
 class DocumentModel(BaseModel):
     name = fields.TextField()
-    content = fields.TextField()
+    blob = fields.ForeignKeyField("models.BlobModel", related_name="documents")
 
     class Meta:
         table = "document"
+        unique_together = (("name", "blob"),)
+
+    @property
+    def content(self) -> Content:
+        """The blob has to be fetched first, e.g. with `prefetch_related("blob")`"""
+        return self.blob.content
+
+    @classmethod
+    async def store(cls, name: str, content: Content) -> "DocumentModel":
+        """The document with this name and content, created if there isn't one yet"""
+        blob = await BlobModel.store(content)
+        document, _created = await cls.get_or_create(name=name, blob=blob)
+        document.blob = blob
+        return document
+
+    @classmethod
+    async def store_many(
+        cls, files: dict[str, Content], using_db: BaseDBAsyncClient = None
+    ) -> dict[str, int]:
+        """
+        Create the documents which don't exist yet, and their blobs, in a constant number of queries.
+
+        Args:
+            files: The content of each document, by name.
+
+        Returns:
+            The ID of each document, by name.
+        """
+        content_hashes = {
+            name: hash_content(content) for name, content in files.items()
+        }
+        blob_ids = await BlobModel.store_many(
+            {content_hashes[name]: content for name, content in files.items()},
+            using_db=using_db,
+        )
+        return await cls.store_for_blobs(
+            {name: blob_ids[content_hashes[name]] for name in files},
+            using_db=using_db,
+        )
+
+    @classmethod
+    async def store_for_blobs(
+        cls, blob_ids: dict[str, int], using_db: BaseDBAsyncClient = None
+    ) -> dict[str, int]:
+        """
+        Create the documents which don't exist yet for blobs which do, in a constant number of queries.
+
+        Args:
+            blob_ids: The ID of the blob of each document, by name.
+
+        Returns:
+            The ID of each document, by name.
+        """
+
+        async def existing_document_ids() -> dict[tuple[str, int], int]:
+            rows = (
+                await cls.filter(
+                    name__in=list(blob_ids), blob_id__in=list(set(blob_ids.values()))
+                )
+                .using_db(using_db)
+                .values_list("name", "blob_id", "id")
+            )
+            return {(name, blob_id): document_id for name, blob_id, document_id in rows}
+
+        document_ids = await existing_document_ids()
+        new_documents = [
+            cls(name=name, blob_id=blob_id)
+            for name, blob_id in blob_ids.items()
+            if (name, blob_id) not in document_ids
+        ]
+        if new_documents:
+            await cls.bulk_create(
+                new_documents, ignore_conflicts=True, using_db=using_db
+            )
+            document_ids = await existing_document_ids()
+
+        return {
+            name: document_ids[(name, blob_id)] for name, blob_id in blob_ids.items()
+        }
+
+
+class LLMCacheEntry(BaseModel):
+    key = fields.CharField(max_length=64, unique=True)
+    model = fields.TextField()
+    text = fields.TextField(default="")
+    function_call = JSONField(default=dict)
+
+    class Meta:
+        table = "llm_cache"
 
 
 class DocumentStep(BaseModel):
+    """
+    The changes a step made to the files. A step inherits the files of the steps before it in its task execution, so
+    only the documents it wrote are linked to it, and the ones it deleted are linked with `deleted` set.
+    """
+
     step = fields.ForeignKeyField("models.StepModel", related_name="document_steps")
     document = fields.ForeignKeyField(
         "models.DocumentModel", related_name="document_steps"
     )
+    deleted = BooleanField(default=False)
 
     class Meta:
         table = "document_step"
 
+    @classmethod
+    async def snapshot(cls, step: StepModel) -> dict[str, int]:
+        """
+        The ID of the document of each file as of `step`, by name. Only the latest change of each file is read, by
+        step and then by ID, as the links of older steps may have been added later on by a migration.
+        """
+        connection = Tortoise.get_connection("default")
+        if connection.capabilities.dialect == "postgres":
+            task_execution_parameter, step_parameter = "$1", "$2"
+        else:
+            task_execution_parameter, step_parameter = "?", "?"
+
+        _count, rows = await connection.execute_query(
+            f"""
+            SELECT name, document_id
+            FROM (
+                SELECT d.name, ds.document_id, ds.deleted, ROW_NUMBER() OVER (
+                    PARTITION BY d.name ORDER BY ds.step_id DESC, ds.id DESC
+                ) AS position
+                FROM document_step AS ds
+                JOIN step AS s ON s.id = ds.step_id
+                JOIN document AS d ON d.id = ds.document_id
+                WHERE s.task_execution_id = {task_execution_parameter} AND ds.step_id <= {step_parameter}
+            ) AS changes
+            WHERE position = 1 AND NOT deleted
+            """,
+            [step.task_execution_id, step.id],
+        )
+        return {row["name"]: row["document_id"] for row in rows}
+
 
 def apply_migrations(db_url: str):
     """Apply any outstanding migrations"""
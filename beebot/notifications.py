@@ -0,0 +1,111 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, ClassVar
+
+from tortoise import Tortoise
+from tortoise.exceptions import BaseORMException
+
+from beebot.config import Config
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_CHANNEL = "beebot_notifications"
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_PAYLOAD_SIZE = 7999
+# Identifies the notifications sent by this process, so that they aren't delivered twice when they come back over NOTIFY
+PROCESS_ID = uuid.uuid4().hex
+ORIGIN_KEY = "_origin"
+
+# Notifications being sent to other processes from synchronous code, kept so they aren't garbage collected early
+_pending_notifications: set[asyncio.Task] = set()
+
+
+class NotificationBus:
+    """
+    In-process pub/sub for notifications. Each subscriber (i.e. each `/notifications` websocket) gets its own bounded
+    queue. A slow subscriber loses its oldest notifications once its queue is full, rather than holding up the others
+    or growing without bound.
+    """
+
+    subscribers: set[asyncio.Queue]
+
+    _global_bus: ClassVar["NotificationBus"] = None
+
+    def __init__(self):
+        self.subscribers = set()
+
+    @classmethod
+    def global_bus(cls) -> "NotificationBus":
+        if not cls._global_bus:
+            cls._global_bus = cls()
+        return cls._global_bus
+
+    def subscribe(self, queue_size: int = 100) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=queue_size)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, notification: dict[str, Any]):
+        for queue in self.subscribers:
+            if queue.full():
+                # Drop the oldest notification to make room, the subscriber is falling behind
+                queue.get_nowait()
+                logger.warning("Subscriber is too slow, dropped a notification")
+            queue.put_nowait(notification)
+
+
+async def publish_notification(payload: dict[str, Any]):
+    """Publish a payload to everything listening on the notifications channel (i.e. the `/notifications` websocket).
+    Subscribers in this process get it directly, other processes get it over Postgres NOTIFY if it is enabled.
+    """
+    NotificationBus.global_bus().publish({NOTIFICATION_CHANNEL: payload})
+    await notify_other_processes(payload)
+
+
+def publish_notification_soon(payload: dict[str, Any]):
+    """Publish a notification from synchronous code. Subscribers in this process get it immediately, other processes
+    once the NOTIFY has been sent in the background."""
+    NotificationBus.global_bus().publish({NOTIFICATION_CHANNEL: payload})
+    if not cross_process_notifications_enabled():
+        return
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+
+    task = loop.create_task(notify_other_processes(payload))
+    _pending_notifications.add(task)
+    task.add_done_callback(_pending_notifications.discard)
+
+
+def cross_process_notifications_enabled() -> bool:
+    if not Tortoise._inited:
+        return False
+    connection = Tortoise.get_connection("default")
+    if connection.capabilities.dialect != "postgres":
+        return False
+    return Config.global_config().cross_process_notifications
+
+
+async def notify_other_processes(payload: dict[str, Any]):
+    """Only Postgres supports this, so this is a no-op on other databases"""
+    if not cross_process_notifications_enabled():
+        return
+
+    serialized_payload = json.dumps({**payload, ORIGIN_KEY: PROCESS_ID})
+    if len(serialized_payload.encode("utf-8")) > MAX_PAYLOAD_SIZE:
+        logger.warning("Notification payload is too large to publish, dropping it")
+        return
+
+    try:
+        await Tortoise.get_connection("default").execute_query(
+            "SELECT pg_notify($1, $2)", [NOTIFICATION_CHANNEL, serialized_payload]
+        )
+    except BaseORMException as e:
+        logger.warning(f"Could not send notification to other processes: {e}")
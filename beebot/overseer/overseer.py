@@ -1,8 +1,9 @@
 import logging
 from typing import TYPE_CHECKING
 
-from beebot.body.llm import call_llm
+from beebot.body.llm import call_llm, stream_llm_text
 from beebot.models import Oversight
+from beebot.notifications import publish_notification
 
 if TYPE_CHECKING:
     from beebot.execution.task_execution import TaskExecution
@@ -27,6 +28,9 @@ class Overseer:
         ) = await self.task_execution.agent.planning_prompt()
         logger.info(prompt)
 
+        if self.task_execution.body.config.stream_plans:
+            return await self.stream_initial_oversight(prompt, prompt_variables)
+
         response = await call_llm(
             self.task_execution.body,
             message=prompt,
@@ -44,3 +48,59 @@ class Overseer:
         )
         await oversight.save()
         return oversight
+
+    async def stream_initial_oversight(
+        self, prompt: str, prompt_variables: dict[str, str]
+    ) -> Oversight:
+        """Create the initial plan as the LLM generates it, so that partial plans are visible before it has
+        finished"""
+        oversight = Oversight(
+            prompt_variables=prompt_variables,
+            original_plan_text="",
+            modified_plan_text="",
+        )
+        await oversight.save()
+
+        async def on_update(text: str, delta: str):
+            oversight.original_plan_text = text
+            oversight.modified_plan_text = text
+            await oversight.save()
+            await publish_notification(
+                {
+                    "oversight_delta": {
+                        "oversight_id": oversight.id,
+                        "task_execution_id": self.task_execution.model_object.id,
+                        "delta": delta,
+                    }
+                }
+            )
+
+        try:
+            text = await stream_llm_text(
+                self.task_execution.body,
+                message=prompt,
+                on_update=on_update,
+                function_call="none",
+            )
+        except BaseException as e:
+            # Don't leave a half-written plan behind
+            await publish_notification(
+                {
+                    "oversight_failed": {
+                        "oversight_id": oversight.id,
+                        "task_execution_id": self.task_execution.model_object.id,
+                        "error": str(e),
+                    }
+                }
+            )
+            await oversight.delete()
+            raise
+
+        logger.info("\n=== Initial Plan Created ===")
+        logger.info(text)
+
+        oversight.original_plan_text = text
+        oversight.modified_plan_text = text
+        oversight.llm_response = text
+        await oversight.save()
+        return oversight
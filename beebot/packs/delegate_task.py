@@ -24,11 +24,15 @@ class DelegateTask(SystemBasePack):
         from beebot.body import Body
 
         try:
-            subagent = Body(task)
+            subagent = Body(task, workspace_path=self.body.workspace_path)
             await subagent.setup()
-            subagent_output = []
-            while output := await subagent.cycle():
-                subagent_output.append(output.observation.response)
+            try:
+                subagent_output = []
+                while output := await subagent.cycle():
+                    subagent_output.append(output.observation.response)
+            finally:
+                # The subagent's packs are its own, release them once its task is done
+                await subagent.pack_manager.teardown()
 
             return "\n".join(subagent_output)
 
@@ -71,9 +71,9 @@ class ExecutePythonFile(SystemBasePack):
             return "Error: Executing Python code is not allowed"
 
         await self.body.file_manager.flush_to_directory()
-        file_path = os.path.join(self.body.config.workspace_path, file_path)
+        file_path = os.path.join(self.body.workspace_path, file_path)
         try:
-            abs_path = restrict_path(file_path, self.body.config.workspace_path)
+            abs_path = restrict_path(file_path, self.body.workspace_path)
             if not abs_path:
                 return (
                     f"Error: File {file_path} does not exist. You must create it first."
@@ -87,7 +87,7 @@ class ExecutePythonFile(SystemBasePack):
                 timeout=self.body.config.process_timeout,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                cwd=self.body.config.workspace_path,
+                cwd=self.body.workspace_path,
             )
             os_subprocess = process.process
             output, error = os_subprocess.communicate()
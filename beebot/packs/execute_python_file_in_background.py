@@ -56,11 +56,11 @@ class ExecutePythonFileInBackground(SystemBasePack):
         if self.body.config.restrict_code_execution:
             return "Error: Executing Python code is not allowed"
 
-        file_path = os.path.join(self.body.config.workspace_path, file_path)
+        file_path = os.path.join(self.body.workspace_path, file_path)
         if not os.path.exists(file_path):
             return f"Error: File {file_path} does not exist. You must create it first."
 
-        abs_path = restrict_path(file_path, self.body.config.workspace_path)
+        abs_path = restrict_path(file_path, self.body.workspace_path)
         if not abs_path:
             return f"Error: File {file_path} does not exist. You must create it first."
 
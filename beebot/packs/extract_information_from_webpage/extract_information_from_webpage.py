@@ -1,4 +1,7 @@
+import asyncio
+import logging
 import subprocess
+from typing import ClassVar
 
 from autopack import Pack
 from autopack.utils import call_llm, acall_llm
@@ -7,6 +10,8 @@ from playwright.async_api import async_playwright
 from playwright.sync_api import PlaywrightContextManager
 from pydantic import BaseModel, Field
 
+logger = logging.getLogger(__name__)
+
 PACK_DESCRIPTION = "Extracts specific information from a webpage's content."
 
 PROMPT_TEMPLATE = """Please provide a summary of the following content, which was gathered from the website {url}:
@@ -39,14 +44,42 @@ class ExtractInformationFromWebpage(Pack):
     categories = ["Web"]
     dependencies = ["playwright", "beautifulsoup4"]
 
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
+    # Whether `playwright install` has run in this process
+    browsers_installed: ClassVar[bool] = False
+
+    async def warm_up(self):
+        """Install the browsers used by playwright. Only needed once per process."""
+        if ExtractInformationFromWebpage.browsers_installed:
+            return
+
         # FIXME: Create an installer type system
-        subprocess.run(
-            ["playwright", "install"], stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        process = await asyncio.create_subprocess_exec(
+            "playwright",
+            "install",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
         )
+        _output, error = await process.communicate()
+        if process.returncode:
+            # Left unset so that the install is tried again on the next run
+            logger.warning(f"Could not install playwright browsers: {error.decode()}")
+            return
+        ExtractInformationFromWebpage.browsers_installed = True
 
     def _run(self, url: str, information: str = "") -> str:
+        if not ExtractInformationFromWebpage.browsers_installed:
+            process = subprocess.run(
+                ["playwright", "install"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+            if process.returncode:
+                logger.warning(
+                    f"Could not install playwright browsers: {process.stderr.decode()}"
+                )
+            else:
+                ExtractInformationFromWebpage.browsers_installed = True
+
         playwright = PlaywrightContextManager().start()
         browser = playwright.chromium.launch()
         try:
@@ -77,6 +110,7 @@ class ExtractInformationFromWebpage(Pack):
         return response
 
     async def _arun(self, url: str, information: str = "") -> str:
+        await self.warm_up()
         async with async_playwright() as playwright:
             browser = await playwright.chromium.launch()
             page = await browser.new_page()
@@ -1,12 +1,22 @@
 from autopack import Pack
 from pydantic import BaseModel, Field
 
+from beebot.config.large_files import DEFAULT_WINDOW_LINES, window_lines
+
 
 class ReadFileArgs(BaseModel):
     filename: str = Field(
         ...,
         description="The name of the file to be read.",
     )
+    start_line: int = Field(
+        None,
+        description="Only read the file from this line on, counting from 1. Required for very large files.",
+    )
+    line_count: int = Field(
+        None,
+        description="The number of lines to read from start_line.",
+    )
 
 
 class ReadFile(Pack):
@@ -15,8 +25,23 @@ class ReadFile(Pack):
     args_schema = ReadFileArgs
     categories = ["Files"]
 
-    def _run(self, filename: str) -> str:
-        return self.filesystem_manager.read_file(filename)
+    def _run(
+        self, filename: str, start_line: int = None, line_count: int = None
+    ) -> str:
+        content = self.filesystem_manager.read_file(filename)
+        if start_line is None and line_count is None:
+            return content
+        # Synchronous file managers only read whole files, the window is cut out the same way `aread_file` does
+        return window_lines(
+            content, max(start_line or 1, 1), line_count or DEFAULT_WINDOW_LINES
+        )
 
-    async def _arun(self, filename: str) -> str:
-        return await self.filesystem_manager.aread_file(filename)
+    async def _arun(
+        self, filename: str, start_line: int = None, line_count: int = None
+    ) -> str:
+        window = {}
+        if start_line is not None:
+            window["start_line"] = start_line
+        if line_count is not None:
+            window["line_count"] = line_count
+        return await self.filesystem_manager.aread_file(filename, **window)
@@ -36,7 +36,7 @@ class InstallPythonPackage(SystemBasePack):
             process = subprocess.run(
                 cmd,
                 universal_newlines=True,
-                cwd=self.body.config.workspace_path,
+                cwd=self.body.workspace_path,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
             )
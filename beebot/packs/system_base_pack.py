@@ -11,7 +11,9 @@ class SystemBasePack(Pack):
     body: Body
 
     def __init__(self, **kwargs):
-        llm = llm_wrapper(kwargs.get("body"))
+        # Bodies share one LLM wrapper between their packs, see PackManager
+        llm = kwargs.pop("llm", None) or llm_wrapper(kwargs.get("body"))
+        kwargs.pop("allm", None)
 
         run_args = {}
         if args_schema := kwargs.get("args_schema"):
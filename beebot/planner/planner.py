@@ -1,10 +1,14 @@
+import json
 import logging
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Union
 
 from langchain.chat_models.base import BaseChatModel
 
-from beebot.body.llm import call_llm
-from beebot.models.database_models import Plan
+from beebot.body.llm import call_llm, stream_llm_text
+from beebot.decider.decider import interpret_llm_response
+from beebot.models.database_models import Decision, Plan
+from beebot.notifications import publish_notification
+from beebot.planner.planning_prompt import fused_decision_instructions
 
 if TYPE_CHECKING:
     from beebot.execution.task_execution import TaskExecution
@@ -22,10 +26,17 @@ class Planner:
 
     async def plan(self) -> Plan:
         prompt, prompt_variables = await self.task_execution.agent.planning_prompt()
+        return await self.plan_from_prompt(prompt, prompt_variables)
 
+    async def plan_from_prompt(
+        self, prompt: str, prompt_variables: dict[str, str]
+    ) -> Plan:
         logger.info("\n=== Plan Request ===")
         logger.info(prompt)
 
+        if self.task_execution.body.config.stream_plans:
+            return await self.stream_plan(prompt, prompt_variables)
+
         response = await call_llm(
             self.task_execution.body,
             message=prompt,
@@ -43,3 +54,91 @@ class Planner:
         )
         await plan.save()
         return plan
+
+    async def plan_and_decide(self) -> tuple[Plan, Union[Decision, None]]:
+        """Make the plan and decide on the next action with a single LLM request. The Decision may be None if the LLM
+        did not call a function, in which case the Decider will need to be consulted as usual.
+        """
+        prompt, prompt_variables = await self.task_execution.agent.planning_prompt()
+        prompt += fused_decision_instructions()
+
+        logger.info("\n=== Fused Plan Request ===")
+        logger.info(prompt)
+
+        response = await call_llm(
+            self.task_execution.body,
+            message=prompt,
+            function_call="auto",
+            include_functions=True,
+        )
+
+        decision = None
+        if response.function_call:
+            decision = await interpret_llm_response(
+                prompt_variables=prompt_variables, response=response
+            )
+
+        plan_text = response.text
+        if not plan_text and decision:
+            plan_text = f"Call {decision.tool_name}({json.dumps(decision.tool_args)})"
+
+        logger.info("\n=== Fused Plan Created ===")
+        logger.info(plan_text)
+        if decision:
+            logger.info(json.dumps(response.function_call, indent=4))
+
+        plan = Plan(
+            prompt_variables=prompt_variables,
+            plan_text=plan_text,
+            llm_response=response.text,
+        )
+        await plan.save()
+        return plan, decision
+
+    async def stream_plan(self, prompt: str, prompt_variables: dict[str, str]) -> Plan:
+        """Create the plan as the LLM generates it, so that partial plans are visible before it has finished"""
+        plan = Plan(prompt_variables=prompt_variables, plan_text="")
+        await plan.save()
+
+        async def on_update(text: str, delta: str):
+            plan.plan_text = text
+            await plan.save()
+            await publish_notification(
+                {
+                    "plan_delta": {
+                        "plan_id": plan.id,
+                        "task_execution_id": self.task_execution.model_object.id,
+                        "delta": delta,
+                    }
+                }
+            )
+
+        try:
+            text = await stream_llm_text(
+                self.task_execution.body,
+                message=prompt,
+                on_update=on_update,
+                function_call="none",
+                include_functions=True,
+            )
+        except BaseException as e:
+            # Don't leave a half-written plan behind
+            await publish_notification(
+                {
+                    "plan_failed": {
+                        "plan_id": plan.id,
+                        "task_execution_id": self.task_execution.model_object.id,
+                        "error": str(e),
+                    }
+                }
+            )
+            await plan.delete()
+            raise
+
+        logger.info("\n=== Plan Created ===")
+        logger.info(text)
+
+        plan.plan_text = text
+        plan.llm_response = text
+        await plan.save()
+        return plan
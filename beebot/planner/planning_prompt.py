@@ -29,3 +29,12 @@ Provide a concise analysis of the past history, followed by an overview of your
 
 def planning_prompt_template() -> str:
     return PLANNING_PROMPT_TEMPLATE
+
+
+FUSED_DECISION_INSTRUCTIONS = """
+
+After providing your plan, implement the immediate next action yourself in the same response by calling exactly one of the provided functions through the `function_call` parameter. Be sure to fully expand variables and avoid the use of placeholders."""
+
+
+def fused_decision_instructions() -> str:
+    return FUSED_DECISION_INSTRUCTIONS
@@ -0,0 +1,46 @@
+"""
+Measures how long it takes to compile the history of a task as the number of steps grows. With the incremental
+history buffer the cost of each compilation should stay flat rather than grow with the number of steps.
+
+Usage: poetry run python -m benchmarks.history_compilation [max_steps]
+"""
+import asyncio
+import sys
+import time
+from types import SimpleNamespace
+
+from beebot.agents import BaseAgent
+from beebot.execution import Step
+from beebot.execution.history_buffer import HistoryBuffer
+from beebot.models.database_models import Decision, Observation
+
+REPORT_INTERVAL = 250
+
+
+async def run(max_steps: int):
+    task_execution = SimpleNamespace(steps=[], variables={}, history=HistoryBuffer())
+    agent = BaseAgent(task_execution)
+
+    print(f"{'steps':>8} {'ms / compile':>14} {'history size':>14}")
+    for step_number in range(1, max_steps + 1):
+        response = f"Result {step_number % 10}"
+        decision = Decision(
+            tool_name="read_file", tool_args={"filename": f"{step_number}.txt"}
+        )
+        task_execution.steps.append(
+            Step(decision=decision, observation=Observation(response=response))
+        )
+        task_execution.variables.setdefault(response, []).append(
+            f"read_file_{step_number}"
+        )
+
+        start = time.perf_counter()
+        history = await agent.compile_history()
+        elapsed = time.perf_counter() - start
+
+        if step_number % REPORT_INTERVAL == 0:
+            print(f"{step_number:>8} {elapsed * 1000:>14.3f} {len(history):>14}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 3000))
@@ -0,0 +1,100 @@
+"""
+Counts the database queries made while persisting each cycle of a task as the number of steps grows. Only the rows
+which changed are written, so the number of queries per cycle should stay flat rather than grow with the number of
+steps.
+
+Usage: poetry run python -m benchmarks.persistence_queries [max_steps]
+"""
+import asyncio
+import logging
+import sys
+from types import SimpleNamespace
+
+from tortoise import Tortoise
+
+# The Body has to be imported before the TaskExecution, or the import is circular
+import beebot.body  # noqa: F401
+from beebot.execution import Step
+from beebot.execution.task_execution import TaskExecution
+from beebot.models.database_models import (
+    BodyModel,
+    Decision,
+    Observation,
+    Oversight,
+    Plan,
+    initialize_db,
+)
+
+REPORT_INTERVAL = 50
+
+
+class QueryCounter(logging.Handler):
+    """Tortoise logs every query it sends to the database at the debug level"""
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.count = 0
+
+    def emit(self, record: logging.LogRecord):
+        self.count += 1
+
+
+async def run_cycle(task_execution: TaskExecution, step_number: int):
+    """Persist a cycle the same way `TaskExecution.cycle` does, without calling the LLM or any packs"""
+    task_execution.state.oversee()
+    await task_execution.save()
+
+    decision = Decision(tool_name="read_file", tool_args={"filename": "a.txt"})
+    await decision.save()
+    task_execution.state.decide()
+    await task_execution.add_decision(decision)
+    task_execution.state.execute()
+    await task_execution.save()
+
+    await task_execution.add_observation(Observation(response=f"Result {step_number}"))
+    task_execution.state.plan()
+    await task_execution.save()
+
+    plan = Plan(plan_text="Read the file again")
+    await plan.save()
+    await task_execution.add_plan(plan)
+    await task_execution.save()
+    await task_execution.finish_step()
+
+
+async def run(max_steps: int):
+    await initialize_db("sqlite://:memory:")
+    body = SimpleNamespace(
+        config=SimpleNamespace(),
+        global_variables={},
+        model_object=await BodyModel.create(task="Read a file repeatedly"),
+    )
+    task_execution = TaskExecution(body, instructions="Read a file repeatedly")
+    oversight = await Oversight.create(
+        original_plan_text="Read the file", modified_plan_text="Read the file"
+    )
+    task_execution.steps.append(
+        Step(task_execution=task_execution, oversight=oversight)
+    )
+    await task_execution.save()
+
+    query_logger = logging.getLogger("tortoise.db_client")
+    query_logger.setLevel(logging.DEBUG)
+    query_logger.propagate = False
+    counter = QueryCounter()
+    query_logger.addHandler(counter)
+
+    print(f"{'steps':>8} {'queries / cycle':>16}")
+    try:
+        for step_number in range(1, max_steps + 1):
+            counter.count = 0
+            await run_cycle(task_execution, step_number)
+
+            if step_number % REPORT_INTERVAL == 0:
+                print(f"{step_number:>8} {counter.count:>16}")
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
@@ -0,0 +1,16 @@
+--
+-- depends: 20230717_01_initial_schema
+
+CREATE TABLE llm_cache (
+  id SERIAL PRIMARY KEY,
+  key VARCHAR(64) NOT NULL,
+  model TEXT NOT NULL,
+  text TEXT NOT NULL DEFAULT '',
+  function_call JSONB,
+  created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+  updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE UNIQUE INDEX idx_llm_cache_key ON llm_cache(key);
+
+CREATE INDEX idx_llm_cache_updated_at ON llm_cache(updated_at);
@@ -0,0 +1,6 @@
+--
+-- depends: 20261018_01_llm_cache
+
+CREATE INDEX idx_task_execution_body_id ON task_execution(body_id);
+
+CREATE INDEX idx_step_task_execution_id ON step(task_execution_id, id);
@@ -0,0 +1,12 @@
+--
+-- depends: 20261018_02_list_indexes
+
+ALTER TABLE document ADD COLUMN size INTEGER NOT NULL DEFAULT 0;
+
+ALTER TABLE document ADD COLUMN content_hash VARCHAR(64) NOT NULL DEFAULT '';
+
+UPDATE document SET
+  size = octet_length(content),
+  content_hash = encode(sha256(convert_to(content, 'UTF8')), 'hex');
+
+CREATE INDEX idx_document_step_step_id ON document_step(step_id);
@@ -0,0 +1,31 @@
+--
+-- depends: 20261018_03_document_metadata
+
+CREATE TABLE blob (
+  id SERIAL PRIMARY KEY,
+  hash VARCHAR(64) NOT NULL,
+  data BYTEA NOT NULL,
+  compression VARCHAR(16) NOT NULL DEFAULT '',
+  size INTEGER NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+  updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE UNIQUE INDEX idx_blob_hash ON blob(hash);
+
+INSERT INTO blob (hash, data, size)
+SELECT DISTINCT ON (content_hash) content_hash, convert_to(content, 'UTF8'), size
+FROM document
+ORDER BY content_hash, id;
+
+ALTER TABLE document ADD COLUMN blob_id INTEGER REFERENCES blob(id);
+
+UPDATE document SET blob_id = blob.id FROM blob WHERE blob.hash = document.content_hash;
+
+ALTER TABLE document ALTER COLUMN blob_id SET NOT NULL;
+
+DROP INDEX idx_document_name_content;
+
+ALTER TABLE document DROP COLUMN content, DROP COLUMN size, DROP COLUMN content_hash;
+
+CREATE UNIQUE INDEX idx_document_name_blob_id ON document(name, blob_id);
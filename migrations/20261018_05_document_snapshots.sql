@@ -0,0 +1,34 @@
+--
+-- depends: 20261018_04_document_blobs
+
+ALTER TABLE document_step ADD COLUMN deleted BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- Every step used to be linked to all of its files, so a file missing from a step was deleted in it
+INSERT INTO document_step (step_id, document_id, deleted)
+SELECT s.id, previous_ds.document_id, TRUE
+FROM step AS s
+JOIN document_step AS previous_ds ON previous_ds.step_id = (
+  SELECT max(id) FROM step WHERE task_execution_id = s.task_execution_id AND id < s.id
+)
+JOIN document AS previous_d ON previous_d.id = previous_ds.document_id
+WHERE NOT EXISTS (
+  SELECT 1
+  FROM document_step AS ds
+  JOIN document AS d ON d.id = ds.document_id
+  WHERE ds.step_id = s.id AND d.name = previous_d.name
+);
+
+-- Links which repeat the previous step's version of a file are inherited now
+DELETE FROM document_step AS ds
+USING step AS s
+WHERE ds.step_id = s.id
+  AND NOT ds.deleted
+  AND EXISTS (
+    SELECT 1
+    FROM document_step AS previous_ds
+    WHERE previous_ds.document_id = ds.document_id
+      AND NOT previous_ds.deleted
+      AND previous_ds.step_id = (
+        SELECT max(id) FROM step WHERE task_execution_id = s.task_execution_id AND id < s.id
+      )
+  );
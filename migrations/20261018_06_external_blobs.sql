@@ -0,0 +1,4 @@
+--
+-- depends: 20261018_05_document_snapshots
+
+ALTER TABLE blob ADD COLUMN external BOOLEAN NOT NULL DEFAULT FALSE;
@@ -0,0 +1,4 @@
+--
+-- depends: 20261018_06_external_blobs
+
+ALTER TABLE blob ADD COLUMN content_type VARCHAR(255) NOT NULL DEFAULT 'text/plain';
@@ -0,0 +1,6 @@
+--
+-- depends: 20261018_07_blob_content_types
+
+-- Snapshots find the latest link of each file up to a step, the document is read from the index too
+CREATE INDEX idx_document_step_step_id_document_id ON document_step(step_id, document_id);
+DROP INDEX idx_document_step_step_id;
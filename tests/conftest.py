@@ -1,8 +1,10 @@
 # each test runs on cwd to its temp dir
 import asyncio
+import logging
 import os
 import signal
 import sys
+from types import SimpleNamespace
 
 import psutil
 import pytest
@@ -11,7 +13,7 @@ from dotenv import load_dotenv
 from tortoise import Tortoise
 
 from beebot.body import Body
-from beebot.models.database_models import initialize_db
+from beebot.models.database_models import BodyModel, initialize_db
 
 
 def pytest_configure():
@@ -53,6 +55,55 @@ def cleanup_processes():
     kill_child_processes(os.getpid())
 
 
+class QueryCounter(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.queries = []
+
+    def emit(self, record: logging.LogRecord):
+        self.queries.append(record.getMessage())
+
+
+@pytest.fixture
+def query_counter():
+    """Collects the queries Tortoise sends to the database, it logs each one at the debug level"""
+    query_logger = logging.getLogger("tortoise.db_client")
+    previous_level = query_logger.level
+    query_logger.setLevel(logging.DEBUG)
+    counter = QueryCounter()
+    query_logger.addHandler(counter)
+    yield counter
+    query_logger.removeHandler(counter)
+    query_logger.setLevel(previous_level)
+
+
+class FakeFileManager:
+    async def document_names(self) -> list[str]:
+        return []
+
+
+@pytest.fixture
+def fake_task_body():
+    """Builds a stand-in for a Body with just what a TaskExecution needs, the config is set from the keyword args"""
+
+    async def make_fake_task_body(task: str, **config) -> SimpleNamespace:
+        return SimpleNamespace(
+            config=SimpleNamespace(
+                history_window_steps=10,
+                history_token_budget=lambda model_name: 3000,
+                response_token_reserve=1000,
+                **config,
+            ),
+            planner_llm=SimpleNamespace(model_name="gpt-4"),
+            decider_llm=SimpleNamespace(model_name="gpt-4"),
+            file_manager=FakeFileManager(),
+            global_variables={},
+            model_object=await BodyModel.create(task=task),
+        )
+
+    return make_fake_task_body
+
+
 def db_url() -> str:
     return os.environ.get("TORTOISE_TEST_DB", "sqlite://:memory:")
 
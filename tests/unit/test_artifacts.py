@@ -0,0 +1,121 @@
+import hashlib
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from beebot.api.routes import download_agent_task_artifact
+from beebot.config.database_file_manager import DatabaseFileManager
+from beebot.models.database_models import (
+    BodyModel,
+    DocumentModel,
+    DocumentStep,
+    Oversight,
+    StepModel,
+    TaskExecutionModel,
+)
+
+
+async def create_step(task_execution: TaskExecutionModel) -> StepModel:
+    oversight = await Oversight.create(original_plan_text="", modified_plan_text="")
+    return await StepModel.create(task_execution=task_execution, oversight=oversight)
+
+
+async def link_documents(step: StepModel, documents: list[DocumentModel]):
+    for document in documents:
+        await DocumentStep.create(step=step, document=document)
+
+
+def file_manager(step: StepModel, body_model: BodyModel) -> DatabaseFileManager:
+    current_step = SimpleNamespace(model_object=step)
+    body = SimpleNamespace(
+        model_object=body_model,
+        current_task_execution=SimpleNamespace(steps=[current_step]),
+    )
+    return DatabaseFileManager(body=body)
+
+
+@pytest.mark.asyncio
+async def test_artifacts_are_metadata_and_deltas(initialize_tests):
+    await initialize_tests
+    body = await BodyModel.create(task="Write some files")
+    task_execution = await TaskExecutionModel.create(
+        body=body, agent="GeneralistAgent", instructions=body.task
+    )
+    unchanged = await DocumentModel.store("a.txt", "unchanged")
+    old_version = await DocumentModel.store("b.txt", "before")
+    removed = await DocumentModel.store("c.txt", "removed")
+    new_version = await DocumentModel.store("b.txt", "after ✓")
+
+    first_step = await create_step(task_execution)
+    await link_documents(first_step, [unchanged, old_version, removed])
+    second_step = await create_step(task_execution)
+    await link_documents(second_step, [new_version])
+    await DocumentStep.create(step=second_step, document=removed, deleted=True)
+
+    artifacts, removed_names = await file_manager(second_step, body).artifacts()
+    assert artifacts == [
+        {
+            "artifact_id": str(unchanged.id),
+            "name": "a.txt",
+            "size": 9,
+            "hash": hashlib.sha256(b"unchanged").hexdigest(),
+            "content_type": "text/plain",
+        },
+        {
+            "artifact_id": str(new_version.id),
+            "name": "b.txt",
+            "size": len("after ✓".encode("utf-8")),
+            "hash": hashlib.sha256("after ✓".encode("utf-8")).hexdigest(),
+            "content_type": "text/plain",
+        },
+    ]
+    assert removed_names == []
+
+    changed, removed_names = await file_manager(second_step, body).artifacts(
+        since_step_id=first_step.id
+    )
+    assert [artifact["artifact_id"] for artifact in changed] == [str(new_version.id)]
+    assert removed_names == ["c.txt"]
+
+    other_body = await BodyModel.create(task="Write other files")
+    other_task_execution = await TaskExecutionModel.create(
+        body=other_body, agent="GeneralistAgent", instructions=other_body.task
+    )
+    other_step = await create_step(other_task_execution)
+    with pytest.raises(ValueError):
+        await file_manager(second_step, body).artifacts(since_step_id=other_step.id)
+
+
+@pytest.mark.asyncio
+async def test_download_streams_artifact_of_task(initialize_tests):
+    await initialize_tests
+    body = await BodyModel.create(task="Write a file")
+    other_body = await BodyModel.create(task="Write another file")
+    task_execution = await TaskExecutionModel.create(
+        body=body, agent="GeneralistAgent", instructions=body.task
+    )
+    document = await DocumentModel.store("poem.txt", "x" * 100_000)
+    await link_documents(await create_step(task_execution), [document])
+
+    def request(task_id: int) -> Request:
+        return Request(
+            {
+                "type": "http",
+                "path_params": {
+                    "task_id": str(task_id),
+                    "artifact_id": str(document.id),
+                },
+            }
+        )
+
+    response = await download_agent_task_artifact(request(body.id))
+    chunks = [chunk async for chunk in response.body_iterator]
+    assert len(chunks) > 1
+    assert b"".join(chunks) == document.content.encode("utf-8")
+    assert response.headers["content-length"] == "100000"
+
+    with pytest.raises(HTTPException) as error:
+        await download_agent_task_artifact(request(other_body.id))
+    assert error.value.status_code == 404
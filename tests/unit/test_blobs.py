@@ -0,0 +1,51 @@
+import pytest
+
+from beebot.models.database_models import (
+    BLOB_COMPRESSION_THRESHOLD,
+    BlobModel,
+    DocumentModel,
+)
+
+
+@pytest.mark.asyncio
+async def test_content_is_stored_once(initialize_tests):
+    await initialize_tests
+    first = await DocumentModel.store("a.txt", "hello")
+    copy = await DocumentModel.store("b.txt", "hello")
+    same = await DocumentModel.store("a.txt", "hello")
+    edited = await DocumentModel.store("a.txt", "hello world")
+
+    assert same.id == first.id
+    assert copy.id != first.id
+    assert copy.blob.id == first.blob.id
+    assert edited.blob.id != first.blob.id
+    assert await BlobModel.all().count() == 2
+
+    fetched = await DocumentModel.get(id=edited.id).prefetch_related("blob")
+    assert fetched.content == "hello world"
+    assert fetched.blob.size == 11
+
+
+@pytest.mark.asyncio
+async def test_large_content_is_compressed(initialize_tests, monkeypatch):
+    await initialize_tests
+    pytest.importorskip("zstandard")
+    monkeypatch.setattr(BlobModel, "compress_large_blobs", True)
+    content = "all work and no play " * BLOB_COMPRESSION_THRESHOLD
+    document = await DocumentModel.store("large.txt", content)
+
+    blob = await BlobModel.get(id=document.blob.id)
+    assert blob.compression == "zstd"
+    assert len(blob.data) < blob.size
+    assert blob.content == content
+
+
+@pytest.mark.asyncio
+async def test_compression_is_opt_in(initialize_tests):
+    await initialize_tests
+    content = "all work and no play " * BLOB_COMPRESSION_THRESHOLD
+    document = await DocumentModel.store("large.txt", content)
+
+    blob = await BlobModel.get(id=document.blob.id)
+    assert blob.compression == ""
+    assert blob.content == content
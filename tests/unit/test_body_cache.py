@@ -0,0 +1,154 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from beebot.api.body_cache import BodyCache
+from beebot.config import Config
+from beebot.models.database_models import (
+    BodyModel,
+    Oversight,
+    StepModel,
+    TaskExecutionModel,
+)
+from beebot.packs.filesystem.write_file import WriteFile
+
+
+class FakePackManager:
+    def __init__(self):
+        self.torn_down = False
+
+    async def teardown(self):
+        self.torn_down = True
+
+
+def fake_body(task_id: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        model_object=SimpleNamespace(id=task_id), pack_manager=FakePackManager()
+    )
+
+
+@pytest.mark.asyncio
+async def test_hit_skips_hydration(initialize_tests):
+    await initialize_tests
+    cache = BodyCache()
+    body = fake_body(1)
+    await cache.add(body)
+
+    assert await cache.get(1) is body
+
+
+@pytest.mark.asyncio
+async def test_miss_for_unknown_task(initialize_tests):
+    await initialize_tests
+    assert await BodyCache().get(12345) is None
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_is_evicted(initialize_tests):
+    await initialize_tests
+    cache = BodyCache(max_size=2)
+    first, second, third = fake_body(1), fake_body(2), fake_body(3)
+    await cache.add(first)
+    await cache.add(second)
+    await cache.get(1)
+    await cache.add(third)
+
+    assert list(cache.bodies) == [1, 3]
+    assert second.pack_manager.torn_down
+    assert not first.pack_manager.torn_down
+
+
+@pytest.mark.asyncio
+async def test_idle_bodies_are_evicted(initialize_tests, monkeypatch):
+    await initialize_tests
+    now = 1000.0
+    monkeypatch.setattr("beebot.api.body_cache.time.monotonic", lambda: now)
+    cache = BodyCache(idle_timeout=60)
+    body = fake_body(1)
+    await cache.add(body)
+
+    now += 61
+    assert await cache.get(1) is None
+    assert body.pack_manager.torn_down
+
+
+@pytest.mark.asyncio
+async def test_checked_out_bodies_are_not_evicted(initialize_tests, monkeypatch):
+    await initialize_tests
+    now = 1000.0
+    monkeypatch.setattr("beebot.api.body_cache.time.monotonic", lambda: now)
+    cache = BodyCache(max_size=1, idle_timeout=60)
+    first, second, third = fake_body(1), fake_body(2), fake_body(3)
+    await cache.add(first)
+
+    async with cache.checkout(1) as body:
+        assert body is first
+        await cache.add(second)
+        now += 61
+        await cache.evict_idle()
+        assert not first.pack_manager.torn_down
+        assert list(cache.bodies) == [1]
+
+    await cache.add(third)
+    assert first.pack_manager.torn_down
+    assert list(cache.bodies) == [3]
+
+
+@pytest.mark.asyncio
+async def test_locks_are_only_kept_for_cached_tasks(initialize_tests):
+    await initialize_tests
+    cache = BodyCache()
+    async with cache.checkout(12345) as body:
+        assert body is None
+    assert cache.locks == {}
+
+    await cache.add(fake_body(1))
+    async with cache.checkout(1):
+        pass
+    assert list(cache.locks) == [1]
+
+    await cache.evict(1)
+    assert cache.locks == {}
+    assert cache.checkout_counts == {}
+
+
+async def create_task(task: str) -> int:
+    body_model = await BodyModel.create(task=task)
+    task_execution = await TaskExecutionModel.create(
+        body=body_model, agent="GeneralistAgent", instructions=task
+    )
+    oversight = await Oversight.create(original_plan_text="", modified_plan_text="")
+    await StepModel.create(task_execution=task_execution, oversight=oversight)
+    return body_model.id
+
+
+@pytest.mark.asyncio
+async def test_interleaved_tasks_keep_their_own_files(
+    initialize_tests, tmp_path, monkeypatch
+):
+    await initialize_tests
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    config = Config(decomposer_model="gpt-4-0613", workspace_path=str(tmp_path))
+    monkeypatch.setattr(Config, "_global_config", config)
+    cache = BodyCache(workspace_path=str(tmp_path))
+    first_id = await create_task("Write the first file")
+    second_id = await create_task("Write the second file")
+
+    async with cache.checkout(first_id) as first:
+        first_packs = await first.pack_manager.get_packs([WriteFile])
+    # The second task is hydrated last, the first one is then a cache hit
+    async with cache.checkout(second_id) as second:
+        second_packs = await second.pack_manager.get_packs([WriteFile])
+    async with cache.checkout(first_id) as body:
+        assert body is first
+        await first_packs["write_file"].arun(filename="a.txt", text_content="First")
+        await first.save()
+    async with cache.checkout(second_id):
+        await second_packs["write_file"].arun(filename="b.txt", text_content="Second")
+        await second.save()
+
+    assert await first.file_manager.document_names() == ["a.txt"]
+    assert await second.file_manager.document_names() == ["b.txt"]
+    assert os.listdir(tmp_path / f"task_{first_id}") == ["a.txt"]
+    assert os.listdir(tmp_path / f"task_{second_id}") == ["b.txt"]
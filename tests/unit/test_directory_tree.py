@@ -0,0 +1,37 @@
+import pytest
+
+from beebot.config.directory_tree import DirectoryTree
+
+
+@pytest.mark.asyncio
+async def test_lists_directories(initialize_tests):
+    await initialize_tests
+    tree = DirectoryTree(["src/app/main.py", "src/util.py", "README.md", "src2.py"])
+
+    assert tree.list_files("") == [
+        "README.md",
+        "src/app/main.py",
+        "src/util.py",
+        "src2.py",
+    ]
+    assert tree.list_files("src") == ["src/app/main.py", "src/util.py"]
+    assert tree.list_files("./src/app/") == ["src/app/main.py"]
+    assert tree.list_files("lib") == []
+
+    tree.remove("src/app/main.py")
+    assert tree.list_files("src") == ["src/util.py"]
+    assert "app" not in tree.node("src").children
+
+
+@pytest.mark.asyncio
+async def test_renders_structure(initialize_tests):
+    await initialize_tests
+    tree = DirectoryTree(["src/app/main.py", "src/util.py", "README.md"])
+
+    assert tree.render() == [
+        " - README.md",
+        " - src/",
+        "  - app/",
+        "   - main.py",
+        "  - util.py",
+    ]
@@ -0,0 +1,136 @@
+from types import SimpleNamespace
+
+import pytest
+
+import beebot.body  # noqa: F401
+from beebot.config.database_file_manager import DatabaseFileManager
+from beebot.execution import Step
+from beebot.models.database_models import (
+    BodyModel,
+    DocumentModel,
+    DocumentStep,
+    Oversight,
+    StepModel,
+    TaskExecutionModel,
+)
+
+
+async def new_step(task_execution: TaskExecutionModel, steps: list[Step]) -> Step:
+    oversight = await Oversight.create(original_plan_text="", modified_plan_text="")
+    step_model = await StepModel.create(
+        task_execution=task_execution, oversight=oversight
+    )
+    step = Step(model_object=step_model)
+    steps.append(step)
+    return step
+
+
+async def file_contents(step: Step) -> dict[str, str]:
+    documents = await step.documents
+    return {name: document.content for name, document in documents.items()}
+
+
+@pytest.mark.asyncio
+async def test_steps_inherit_files_and_record_changes(initialize_tests):
+    await initialize_tests
+    body = await BodyModel.create(task="Write some files")
+    task_execution = await TaskExecutionModel.create(
+        body=body, agent="GeneralistAgent", instructions=body.task
+    )
+    steps = []
+    file_manager = DatabaseFileManager(
+        body=SimpleNamespace(current_task_execution=SimpleNamespace(steps=steps))
+    )
+
+    first_step = await new_step(task_execution, steps)
+    await file_manager.awrite_file("a.txt", "a")
+    await file_manager.awrite_file("b.txt", "b")
+
+    # A step which doesn't touch the files has no rows of its own
+    second_step = await new_step(task_execution, steps)
+    assert await DocumentStep.filter(step=second_step.model_object).count() == 0
+    assert await file_manager.aread_file("a.txt") == "a"
+
+    third_step = await new_step(task_execution, steps)
+    await file_manager.awrite_file("a.txt", "a, edited")
+    deleted = await file_manager.adelete_file("b.txt")
+    assert deleted == "Successfully deleted file b.txt."
+    assert await DocumentStep.filter(step=third_step.model_object).count() == 2
+
+    assert await file_contents(third_step) == {"a.txt": "a, edited"}
+    assert await file_manager.alist_files("") == "a.txt"
+
+    # The earlier steps still see their own versions
+    for step in [first_step, second_step]:
+        assert await file_contents(step) == {"a.txt": "a", "b.txt": "b"}
+
+
+@pytest.mark.asyncio
+async def test_repeated_reads_use_the_index(initialize_tests, query_counter):
+    await initialize_tests
+    body = await BodyModel.create(task="Read some files")
+    task_execution = await TaskExecutionModel.create(
+        body=body, agent="GeneralistAgent", instructions=body.task
+    )
+    steps = []
+    file_manager = DatabaseFileManager(
+        body=SimpleNamespace(current_task_execution=SimpleNamespace(steps=steps))
+    )
+    await new_step(task_execution, steps)
+    await file_manager.awrite_file("a.txt", "a")
+    await file_manager.awrite_file("b.txt", "b")
+
+    await new_step(task_execution, steps)
+    assert await file_manager.aread_file("a.txt") == "a"
+
+    query_counter.queries.clear()
+    assert await file_manager.aread_file("a.txt") == "a"
+    assert await file_manager.alist_files("") == "a.txt\nb.txt"
+    assert await file_manager.document_names() == ["a.txt", "b.txt"]
+    assert query_counter.queries == []
+
+    # Writes and deletes keep the index up to date
+    await file_manager.awrite_file("c.txt", "c")
+    await file_manager.adelete_file("b.txt")
+    query_counter.queries.clear()
+    assert await file_manager.document_names() == ["a.txt", "c.txt"]
+    assert query_counter.queries == []
+    assert await file_manager.aread_file("c.txt") == "c"
+
+    file_manager.invalidate_index()
+    assert await file_manager.document_names() == ["a.txt", "c.txt"]
+
+
+@pytest.mark.asyncio
+async def test_snapshot_reads_latest_change_by_step(initialize_tests):
+    await initialize_tests
+    body = await BodyModel.create(task="Rewrite a file")
+    task_execution = await TaskExecutionModel.create(
+        body=body, agent="GeneralistAgent", instructions=body.task
+    )
+    first_version = await DocumentModel.store("a.txt", "first")
+    second_version = await DocumentModel.store("a.txt", "second")
+    kept = await DocumentModel.store("b.txt", "kept")
+
+    steps = []
+    first_step = (await new_step(task_execution, steps)).model_object
+    second_step = (await new_step(task_execution, steps)).model_object
+    third_step = (await new_step(task_execution, steps)).model_object
+    for step, document in [
+        (first_step, first_version),
+        (first_step, kept),
+        (third_step, second_version),
+    ]:
+        await DocumentStep.create(step=step, document=document)
+    # A link added to an older step after the newer ones, as the snapshot migration does
+    await DocumentStep.create(step=second_step, document=first_version, deleted=True)
+
+    assert await DocumentStep.snapshot(first_step) == {
+        "a.txt": first_version.id,
+        "b.txt": kept.id,
+    }
+    assert await DocumentStep.snapshot(second_step) == {"b.txt": kept.id}
+    assert await DocumentStep.snapshot(third_step) == {
+        "a.txt": second_version.id,
+        "b.txt": kept.id,
+    }
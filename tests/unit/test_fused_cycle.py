@@ -0,0 +1,79 @@
+import pytest
+
+from beebot.body.llm import LLMResponse
+from beebot.decider import Decider
+from beebot.execution import Step
+from beebot.execution.task_execution import TaskExecution
+from beebot.models.database_models import Oversight, Plan
+from beebot.planner import planner as planner_module
+
+
+@pytest.fixture()
+def llm_messages(monkeypatch) -> list[str]:
+    messages = []
+
+    async def fake_call_llm(body, message, **kwargs) -> LLMResponse:
+        messages.append(message)
+        return LLMResponse(
+            text="Read the instructions next.",
+            function_call={
+                "name": "read_file",
+                "arguments": '{"filename": "instructions.txt"}',
+            },
+        )
+
+    monkeypatch.setattr(planner_module, "call_llm", fake_call_llm)
+    return messages
+
+
+@pytest.fixture()
+def fused_task_execution(fake_task_body):
+    async def make_fused_task_execution() -> TaskExecution:
+        body = await fake_task_body("Follow the instructions", fused_cycle=True)
+        body.current_task_execution = task_execution = TaskExecution(
+            body, instructions="Follow the instructions"
+        )
+        await task_execution.save()
+        return task_execution
+
+    return make_fused_task_execution
+
+
+@pytest.mark.asyncio
+async def test_plan_and_decide_records_plan_and_decision(
+    initialize_tests, llm_messages, fused_task_execution
+):
+    await initialize_tests
+    task_execution = await fused_task_execution()
+
+    plan, decision = await planner_module.Planner(task_execution).plan_and_decide()
+
+    assert len(llm_messages) == 1
+    assert plan.plan_text == "Read the instructions next."
+    assert await Plan.filter(id=plan.id).exists()
+    assert decision.tool_name == "read_file"
+    assert decision.tool_args == {"filename": "instructions.txt"}
+
+
+@pytest.mark.asyncio
+async def test_fused_decision_skips_decider(
+    initialize_tests, llm_messages, fused_task_execution, monkeypatch
+):
+    await initialize_tests
+    task_execution = await fused_task_execution()
+    _plan, decision = await planner_module.Planner(task_execution).plan_and_decide()
+
+    async def fail_decide(self, *args, **kwargs):
+        raise AssertionError("The Decider should not be called")
+
+    monkeypatch.setattr(Decider, "decide_with_retry", fail_decide)
+    oversight = await Oversight.create(
+        original_plan_text="plan", modified_plan_text="plan"
+    )
+    task_execution.steps.append(
+        Step(task_execution=task_execution, oversight=oversight, decision=decision)
+    )
+    task_execution.state.oversee()
+    task_execution.state.decide()
+
+    assert await task_execution.decide(oversight) is decision
@@ -0,0 +1,179 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from beebot.agents import BaseAgent
+from beebot.execution import Step
+from beebot.execution.history_buffer import HistoryBuffer
+from beebot.models.database_models import Decision, Observation
+
+
+def naive_history(steps: list[Step], variables: dict[str, list[str]]) -> str:
+    """The original, non-incremental history compilation"""
+    step_table = []
+    used_variables = []
+    for step in steps:
+        if not step.observation:
+            continue
+
+        outcome = step.observation.response
+        variable_names = variables.get(outcome)
+        try:
+            variable_name = next(
+                name for name in variable_names if name not in used_variables
+            )
+        except StopIteration:
+            variable_name = variable_names[-1]
+        used_variables.append(variable_name)
+
+        tool_args = ", ".join(
+            f"{name}={json.dumps(value)}"
+            for name, value in step.decision.tool_args.items()
+        )
+        if outcome and outcome in variables:
+            step_table.append(
+                f">>> {variable_name} = {step.decision.tool_name}({tool_args})"
+            )
+        else:
+            step_table.append(f">>> {step.decision.tool_name}({tool_args})")
+
+        if not step.observation.success or outcome.startswith("Error"):
+            step_table.append(step.observation.error_reason or outcome)
+        else:
+            step_table.append(
+                f"Success! Result stored in local variable {variable_name}."
+            )
+
+    return "\n".join(step_table)
+
+
+def fake_task_execution() -> SimpleNamespace:
+    task_execution = SimpleNamespace(steps=[], variables={}, history=HistoryBuffer())
+    task_execution.agent = BaseAgent(task_execution)
+    return task_execution
+
+
+def add_step(task_execution: SimpleNamespace, response: str):
+    decision = Decision(tool_name="read_file", tool_args={"filename": response})
+    step = Step(decision=decision, observation=Observation(response=response))
+    task_execution.steps.append(step)
+    variable_name = f"read_file_{len(task_execution.steps)}"
+    task_execution.variables.setdefault(response, []).append(variable_name)
+
+
+@pytest.mark.asyncio
+async def test_matches_full_compilation(initialize_tests):
+    await initialize_tests
+    task_execution = fake_task_execution()
+    responses = ["a", "b", "a", "Error: nope", "", "", "a", "c"]
+
+    for response in responses:
+        add_step(task_execution, response)
+        # The current step has not been observed yet
+        task_execution.steps.append(Step(decision=Decision(tool_name="exit")))
+        assert await task_execution.agent.compile_history() == naive_history(
+            task_execution.steps, task_execution.variables
+        )
+        task_execution.steps.pop()
+        assert await task_execution.agent.compile_history() == naive_history(
+            task_execution.steps, task_execution.variables
+        )
+
+
+@pytest.mark.asyncio
+async def test_finished_steps_render_once(initialize_tests):
+    await initialize_tests
+    task_execution = fake_task_execution()
+    rendered = []
+    render_step = task_execution.agent.compile_step_history
+
+    def counting_render_step(step, variable_name):
+        rendered.append(step)
+        return render_step(step, variable_name)
+
+    task_execution.agent.compile_step_history = counting_render_step
+    step_count = 3000
+    for i in range(step_count):
+        add_step(task_execution, str(i % 7))
+        await task_execution.agent.compile_history()
+
+    # Every finished step once, plus the current step on every call
+    assert len(rendered) == (step_count - 1) + step_count
+
+
+@pytest.mark.asyncio
+async def test_context_folds_old_steps_into_summary(initialize_tests, monkeypatch):
+    await initialize_tests
+    task_execution = fake_task_execution()
+    task_execution.instructions = "Read some files"
+    task_execution.body = SimpleNamespace(
+        global_variables={},
+        config=SimpleNamespace(
+            history_window_steps=10,
+            history_token_budget=lambda model_name: 200,
+        ),
+    )
+
+    prompts = []
+
+    async def fake_call_llm(body, message, **kwargs):
+        prompts.append(message)
+        return SimpleNamespace(text=f"summary {len(prompts)}")
+
+    monkeypatch.setattr("beebot.agents.base_agent.call_llm", fake_call_llm)
+
+    for i in range(25):
+        add_step(task_execution, f"contents of file {i}")
+    history, variables = await task_execution.agent.compile_context("gpt-4")
+
+    # One window is folded, at least one full window of recent steps is kept verbatim
+    assert len(prompts) == 1
+    assert history.startswith("(Summary of the first 10 functions executed)\nsummary 1")
+    assert "read_file_10 =" not in history
+    assert "read_file_11 = read_file" in history
+    assert "read_file_25 = read_file" in history
+    assert "read_file_10 =" not in variables
+    assert "read_file_11 =" in variables
+
+    # Summaries are cached, the next window is only folded once a full window follows it
+    for i in range(25, 29):
+        add_step(task_execution, f"contents of file {i}")
+        await task_execution.agent.compile_context("gpt-4")
+    assert len(prompts) == 1
+    add_step(task_execution, "contents of file 29")
+    history, _variables = await task_execution.agent.compile_context("gpt-4")
+    assert len(prompts) == 2
+    assert "summary 1" in prompts[-1]
+    assert history.startswith("(Summary of the first 20 functions executed)\nsummary 2")
+
+
+@pytest.mark.asyncio
+async def test_context_tokenizes_each_step_once(initialize_tests, monkeypatch):
+    await initialize_tests
+    task_execution = fake_task_execution()
+    task_execution.body = SimpleNamespace(
+        global_variables={},
+        config=SimpleNamespace(
+            history_window_steps=10,
+            history_token_budget=lambda model_name: 100_000,
+        ),
+    )
+    tokenized = []
+
+    def counting_count_tokens(text, model_name):
+        tokenized.append(text)
+        return len(text.split())
+
+    monkeypatch.setattr(
+        "beebot.execution.history_buffer.count_tokens", counting_count_tokens
+    )
+    monkeypatch.setattr("beebot.agents.base_agent.count_tokens", counting_count_tokens)
+
+    step_count = 200
+    for i in range(step_count):
+        add_step(task_execution, f"contents of file {i}")
+        await task_execution.agent.compile_context("gpt-4")
+
+    # Every finished step once, the current step on every call, and each variable and the variables header once
+    assert len(tokenized) == (step_count - 1) + step_count + step_count + 1
@@ -0,0 +1,92 @@
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from beebot.body.pack_manager import PackManager
+from beebot.execution.task_execution import TaskExecution
+from beebot.models.database_models import (
+    BodyModel,
+    Decision,
+    Observation,
+    Plan,
+    StepModel,
+    TaskExecutionModel,
+)
+
+
+class QueryCounter(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.count = 0
+
+    def emit(self, record: logging.LogRecord):
+        self.count += 1
+
+
+@pytest.fixture
+def query_counter():
+    query_logger = logging.getLogger("tortoise.db_client")
+    previous_level = query_logger.level
+    query_logger.setLevel(logging.DEBUG)
+    counter = QueryCounter()
+    query_logger.addHandler(counter)
+    yield counter
+    query_logger.removeHandler(counter)
+    query_logger.setLevel(previous_level)
+
+
+async def create_body_model(step_count: int) -> BodyModel:
+    body_model = await BodyModel.create(task="Read some files")
+    execution_model = await TaskExecutionModel.create(
+        body=body_model, agent="", instructions="Read some files", state="oversight"
+    )
+    for i in range(step_count):
+        await StepModel.create(
+            task_execution=execution_model,
+            decision=await Decision.create(tool_name="read_file"),
+            observation=await Observation.create(response=f"contents {i}"),
+            # The last step is still waiting for its plan
+            plan=await Plan.create(plan_text="Read another")
+            if i < step_count - 1
+            else None,
+        )
+    return body_model
+
+
+async def hydrate(body_model_id: int) -> tuple[list[TaskExecution], int]:
+    body_model = await BodyModel.get(id=body_model_id).prefetch_related(
+        *BodyModel.INCLUSIVE_PREFETCH
+    )
+    body = SimpleNamespace(model_object=body_model)
+    body.pack_manager = PackManager(body)
+    return [
+        await TaskExecution.from_model(body, execution_model)
+        for execution_model in body_model.task_executions
+    ]
+
+
+@pytest.mark.asyncio
+async def test_hydration_queries_do_not_grow_with_steps(
+    initialize_tests, query_counter
+):
+    await initialize_tests
+    small_body_model = await create_body_model(5)
+    large_body_model = await create_body_model(100)
+
+    query_counter.count = 0
+    await hydrate(small_body_model.id)
+    small_query_count = query_counter.count
+
+    query_counter.count = 0
+    (task_execution,) = await hydrate(large_body_model.id)
+    assert query_counter.count == small_query_count
+
+    assert len(task_execution.steps) == 100
+    assert [step.observation.response for step in task_execution.steps[:3]] == [
+        "contents 0",
+        "contents 1",
+        "contents 2",
+    ]
+    assert task_execution.steps[0].plan.plan_text == "Read another"
+    assert task_execution.current_step.plan is None
@@ -0,0 +1,129 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+from starlette.requests import Request
+
+import beebot.body  # noqa: F401
+from beebot.api import routes
+from beebot.config.database_file_manager import DatabaseFileManager
+from beebot.config.large_files import read_lines, window_lines
+from beebot.execution import Step
+from beebot.packs.filesystem.read_file import ReadFile
+from beebot.models.database_models import (
+    BlobModel,
+    BodyModel,
+    DocumentModel,
+    Oversight,
+    StepModel,
+    TaskExecutionModel,
+)
+
+LINE_COUNT = 1000
+
+
+@pytest.mark.asyncio
+async def test_read_lines_matches_window_lines(initialize_tests, tmp_path):
+    await initialize_tests
+    # Only "\n" ends a line, the other characters `str.splitlines` splits on don't
+    content = "".join(f"Line {i}\r\n\x0c\u2028\n" for i in range(1, 11)) + "Last"
+    path = tmp_path / "lines.txt"
+    path.write_bytes(content.encode("utf-8"))
+
+    windows = [(1, 3), (4, 2), (9, 5), (11, 1), (20, 1), (19, 2), (21, 1), (22, 1)]
+    for start_line, line_count in windows:
+        assert read_lines(str(path), start_line, line_count) == window_lines(
+            content, start_line, line_count
+        )
+    assert window_lines(content, 2, 1) == "\x0c\u2028\n"
+
+
+@pytest.mark.asyncio
+async def test_synchronous_read_file_is_windowed(initialize_tests):
+    await initialize_tests
+    content = "".join(f"Line {i}\n" for i in range(1, 11))
+    pack = SimpleNamespace(
+        filesystem_manager=SimpleNamespace(read_file=lambda _filename: content)
+    )
+
+    assert ReadFile._run(pack, "lines.txt") == content
+    assert ReadFile._run(pack, "lines.txt", 4, 2) == "Line 4\nLine 5\n"
+    assert ReadFile._run(pack, "lines.txt", 9) == "Line 9\nLine 10\n"
+    assert ReadFile._run(pack, "lines.txt", line_count=1) == "Line 1\n"
+
+
+async def large_file_manager(workspace: str) -> DatabaseFileManager:
+    body = await BodyModel.create(task="Read a large file")
+    task_execution = await TaskExecutionModel.create(
+        body=body, agent="GeneralistAgent", instructions=body.task
+    )
+    oversight = await Oversight.create(original_plan_text="", modified_plan_text="")
+    step_model = await StepModel.create(
+        task_execution=task_execution, oversight=oversight
+    )
+    return DatabaseFileManager(
+        body=SimpleNamespace(
+            current_task_execution=SimpleNamespace(
+                steps=[Step(model_object=step_model)]
+            ),
+            workspace_path=workspace,
+            config=SimpleNamespace(
+                large_file_threshold=1024,
+                large_file_store_path=os.path.join(workspace, ".large_files"),
+            ),
+        )
+    )
+
+
+@pytest.mark.asyncio
+async def test_large_files_stay_on_disk(initialize_tests, tmp_path, monkeypatch):
+    await initialize_tests
+
+    workspace = str(tmp_path / "workspace")
+    os.makedirs(workspace)
+    content = "".join(f"Line {i}\n" for i in range(1, LINE_COUNT + 1))
+    with open(os.path.join(workspace, "large.txt"), "w") as f:
+        f.write(content)
+    with open(os.path.join(workspace, "small.txt"), "w") as f:
+        f.write("Small")
+
+    file_manager = await large_file_manager(workspace)
+    await file_manager.load_from_directory()
+
+    large_blob = await BlobModel.get(size=len(content))
+    assert large_blob.external
+    assert large_blob.data == b""
+    assert not (await BlobModel.get(size=len("Small"))).external
+
+    assert "too large" in await file_manager.aread_file("large.txt")
+    assert await file_manager.aread_file("large.txt", 500, 2) == "Line 500\nLine 501\n"
+    assert await file_manager.aread_file("small.txt") == "Small"
+    assert await file_manager.aread_bytes("large.txt", 0, 6) == b"Line 1"
+
+    flushed = str(tmp_path / "flushed")
+    await file_manager.flush_to_directory(flushed)
+    with open(os.path.join(flushed, "large.txt")) as f:
+        assert f.read() == content
+
+    # Downloads read the large file store of the task's own Body
+    body_model = await BodyModel.get(task="Read a large file")
+    document = await DocumentModel.get(name="large.txt")
+
+    async def cached_body(_task_id: int):
+        return file_manager.body
+
+    monkeypatch.setattr(routes, "body_cache", lambda: SimpleNamespace(get=cached_body))
+    response = await routes.download_agent_task_artifact(
+        Request(
+            {
+                "type": "http",
+                "path_params": {
+                    "task_id": str(body_model.id),
+                    "artifact_id": str(document.id),
+                },
+            }
+        )
+    )
+    assert b"".join([chunk async for chunk in response.body_iterator]) == (
+        content.encode("utf-8")
+    )
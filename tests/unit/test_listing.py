@@ -0,0 +1,114 @@
+import json
+from urllib.parse import urlencode
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from beebot.api.routes import agent_task_ids, list_agent_task_steps
+from beebot.models.database_models import (
+    BodyModel,
+    Oversight,
+    StepModel,
+    TaskExecutionModel,
+)
+
+
+def make_request(path_params: dict = None, **query_params) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/",
+            "headers": [],
+            "query_string": urlencode(query_params).encode(),
+            "path_params": path_params or {},
+        }
+    )
+
+
+async def list_response(route, request: Request) -> dict:
+    response = await route(request)
+    return json.loads(response.body)
+
+
+@pytest.mark.asyncio
+async def test_tasks_are_paginated_by_cursor(initialize_tests):
+    await initialize_tests
+    bodies = [await BodyModel.create(task=f"Task {i}") for i in range(5)]
+
+    first_page = await list_response(agent_task_ids, make_request(page_size=2))
+    assert first_page["tasks"] == [{"task_id": str(body.id)} for body in bodies[:2]]
+
+    task_ids = [task["task_id"] for task in first_page["tasks"]]
+    cursor = first_page["next_cursor"]
+    while cursor:
+        page = await list_response(
+            agent_task_ids, make_request(page_size=2, cursor=cursor)
+        )
+        task_ids += [task["task_id"] for task in page["tasks"]]
+        cursor = page["next_cursor"]
+
+    assert task_ids == [str(body.id) for body in bodies]
+
+
+@pytest.mark.asyncio
+async def test_fields_projection(initialize_tests):
+    await initialize_tests
+    body = await BodyModel.create(task="Write a poem")
+
+    page = await list_response(
+        agent_task_ids, make_request(fields="task_id,input,created_at")
+    )
+    assert page["tasks"] == [
+        {
+            "task_id": str(body.id),
+            "input": "Write a poem",
+            "created_at": body.created_at.isoformat(),
+        }
+    ]
+    assert page["next_cursor"] is None
+
+    with pytest.raises(HTTPException) as error:
+        await agent_task_ids(make_request(fields="task_id,packs"))
+    assert error.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_steps_are_listed_without_hydrating_the_body(initialize_tests):
+    await initialize_tests
+    body = await BodyModel.create(task="Write a poem")
+    other_body = await BodyModel.create(task="Write a song")
+    steps = []
+    for task_body in [body, other_body]:
+        task_execution = await TaskExecutionModel.create(
+            body=task_body, agent="GeneralistAgent", instructions=task_body.task
+        )
+        for _ in range(3):
+            oversight = await Oversight.create(
+                original_plan_text="", modified_plan_text=""
+            )
+            step = await StepModel.create(
+                task_execution=task_execution, oversight=oversight
+            )
+            if task_body is body:
+                steps.append(step)
+
+    page = await list_response(
+        list_agent_task_steps,
+        make_request({"task_id": str(body.id)}, page_size=2, fields="step_id"),
+    )
+    assert page["steps"] == [{"step_id": str(step.id)} for step in steps[:2]]
+    assert page["next_cursor"] == str(steps[1].id)
+
+    with pytest.raises(HTTPException) as error:
+        await list_agent_task_steps(make_request({"task_id": "12345"}))
+    assert error.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_invalid_cursor(initialize_tests):
+    await initialize_tests
+    with pytest.raises(HTTPException) as error:
+        await agent_task_ids(make_request(cursor="abc"))
+    assert error.value.status_code == 400
@@ -0,0 +1,142 @@
+from types import SimpleNamespace
+
+import pytest
+from langchain.schema import AIMessage, ChatGeneration, LLMResult
+
+from beebot.body.llm import LLMResponse, call_llm, close_llm_clients
+from beebot.body.llm_cache import LLMResponseCache, cache_key
+from beebot.models.database_models import LLMCacheEntry
+
+
+class FakeLLM:
+    model_name = "gpt-4"
+
+    def __init__(self, text: str):
+        self.text = text
+        self.calls = 0
+
+    async def agenerate(self, messages, **kwargs) -> LLMResult:
+        self.calls += 1
+        return LLMResult(
+            generations=[[ChatGeneration(message=AIMessage(content=self.text))]]
+        )
+
+
+@pytest.fixture()
+def fake_body() -> SimpleNamespace:
+    LLMResponseCache._global_cache = None
+    config = SimpleNamespace(
+        llm_cache_enabled=True,
+        llm_cache_ttl=86400,
+        llm_cache_max_entries=5000,
+        llm_max_connections=10,
+    )
+    return SimpleNamespace(
+        config=config, current_task_execution=SimpleNamespace(packs={})
+    )
+
+
+@pytest.mark.asyncio
+async def test_cache_key_covers_request_shape(initialize_tests):
+    await initialize_tests
+    key = cache_key(
+        "gpt-4", "hello", functions=[{"name": "exit"}], function_call="auto"
+    )
+
+    assert key == cache_key(
+        "gpt-4", "hello", functions=[{"name": "exit"}], function_call="auto"
+    )
+    assert key != cache_key("gpt-3.5-turbo", "hello", [{"name": "exit"}], "auto")
+    assert key != cache_key("gpt-4", "hello", [{"name": "exit"}], "none")
+    assert key != cache_key("gpt-4", "hello", [], "auto")
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_and_miss_counters(initialize_tests):
+    await initialize_tests
+    cache = LLMResponseCache()
+    key = cache_key("gpt-4", "hello")
+
+    assert await cache.get(key) is None
+    await cache.set(key, "gpt-4", LLMResponse(text="hi", function_call={}))
+    cached = await cache.get(key)
+
+    assert cached.text == "hi"
+    assert cache.stats == {"hits": 1, "misses": 1}
+
+
+@pytest.mark.asyncio
+async def test_cache_expiry(initialize_tests):
+    await initialize_tests
+    cache = LLMResponseCache(ttl=-1)
+    key = cache_key("gpt-4", "hello")
+    await LLMCacheEntry.create(key=key, model="gpt-4", text="hi")
+
+    assert await cache.get(key) is None
+    assert await LLMCacheEntry.filter(key=key).count() == 0
+
+
+@pytest.mark.asyncio
+async def test_cache_refresh_restarts_ttl(initialize_tests):
+    await initialize_tests
+    cache = LLMResponseCache(ttl=60, eviction_interval=1)
+    key = cache_key("gpt-4", "hello")
+    entry = await LLMCacheEntry.create(key=key, model="gpt-4", text="stale")
+    await LLMCacheEntry.filter(id=entry.id).update(
+        created_at=cache.expiry_cutoff().replace(year=2000)
+    )
+
+    await cache.set(key, "gpt-4", LLMResponse(text="fresh", function_call={}))
+    await cache.evict()
+
+    assert (await cache.get(key)).text == "fresh"
+
+
+@pytest.mark.asyncio
+async def test_cache_evicts_least_recently_used(initialize_tests):
+    await initialize_tests
+    cache = LLMResponseCache(max_entries=2, eviction_interval=1)
+    keys = [cache_key("gpt-4", str(i)) for i in range(3)]
+
+    await cache.set(keys[0], "gpt-4", LLMResponse(text="0", function_call={}))
+    await cache.set(keys[1], "gpt-4", LLMResponse(text="1", function_call={}))
+    await cache.get(keys[0])
+    await cache.set(keys[2], "gpt-4", LLMResponse(text="2", function_call={}))
+
+    remaining = await LLMCacheEntry.all().values_list("key", flat=True)
+    assert sorted(remaining) == sorted([keys[0], keys[2]])
+
+
+@pytest.mark.asyncio
+async def test_call_llm_uses_cache(initialize_tests, fake_body):
+    await initialize_tests
+    llm = FakeLLM("cached answer")
+
+    first = await call_llm(fake_body, "hello", include_functions=False, llm=llm)
+    second = await call_llm(fake_body, "hello", include_functions=False, llm=llm)
+    await close_llm_clients()
+
+    assert first.text == second.text == "cached answer"
+    assert llm.calls == 1
+    assert LLMResponseCache.global_cache(fake_body.config).stats == {
+        "hits": 1,
+        "misses": 1,
+    }
+
+
+@pytest.mark.asyncio
+async def test_call_llm_disregard_cache_skips_lookup(initialize_tests, fake_body):
+    await initialize_tests
+    llm = FakeLLM("first answer")
+    await call_llm(fake_body, "hello", include_functions=False, llm=llm)
+
+    llm.text = "second answer"
+    response = await call_llm(
+        fake_body, "hello", include_functions=False, disregard_cache=True, llm=llm
+    )
+    cached = await call_llm(fake_body, "hello", include_functions=False, llm=llm)
+    await close_llm_clients()
+
+    assert response.text == "second answer"
+    assert cached.text == "second answer"
+    assert llm.calls == 2
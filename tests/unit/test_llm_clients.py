@@ -0,0 +1,73 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from beebot.body import llm as llm_module
+from beebot.body.llm import close_llm_clients, create_llm, shared_aiosession
+
+
+def fake_config(**kwargs) -> SimpleNamespace:
+    config = {
+        "openai_api_base": None,
+        "helicone_key": None,
+        "llm_max_connections": 10,
+        **kwargs,
+    }
+    return SimpleNamespace(**config)
+
+
+@pytest.fixture()
+def llm_clients(monkeypatch) -> dict:
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    clients = {}
+    monkeypatch.setattr(llm_module, "_llm_clients", clients)
+    return clients
+
+
+@pytest.mark.asyncio
+async def test_create_llm_shares_clients(initialize_tests, llm_clients):
+    await initialize_tests
+    config = fake_config()
+
+    assert create_llm(config, "gpt-4") is create_llm(config, "gpt-4")
+    assert create_llm(config, "gpt-4") is not create_llm(config, "gpt-3.5-turbo")
+    assert create_llm(config, "gpt-4") is not create_llm(
+        fake_config(helicone_key="key"), "gpt-4"
+    )
+    assert len(llm_clients) == 3
+
+
+@pytest.mark.asyncio
+async def test_shared_aiosession_is_reused(initialize_tests):
+    await initialize_tests
+    config = fake_config()
+
+    session = shared_aiosession(config)
+    assert shared_aiosession(config) is session
+
+    await close_llm_clients()
+    assert session.closed
+    assert shared_aiosession(config) is not session
+    await close_llm_clients()
+
+
+@pytest.mark.asyncio
+async def test_shared_aiosession_released_when_loop_changes(
+    initialize_tests, monkeypatch
+):
+    await initialize_tests
+    config = fake_config()
+    old_session = shared_aiosession(config)
+    old_connector = old_session.connector
+
+    # Pretend the session was created on a loop that has since been closed
+    old_loop = asyncio.new_event_loop()
+    old_loop.close()
+    monkeypatch.setattr(llm_module, "_aiosession", (old_loop, old_session))
+    new_session = shared_aiosession(config)
+
+    assert old_session.closed
+    assert new_session is not old_session
+    await old_connector.close()
+    await close_llm_clients()
@@ -0,0 +1,135 @@
+from types import SimpleNamespace
+
+import openai
+import pytest
+from langchain.chat_models import ChatOpenAI
+
+from beebot.body import llm as llm_module
+from beebot.body.llm import close_llm_clients, stream_llm, stream_llm_text
+from beebot.body.llm_cache import LLMResponseCache
+from beebot.models.database_models import Plan
+from beebot.planner import Planner
+
+TOKENS = ["The ", "plan ", "is ", "to ", "exit."]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture()
+def clock(monkeypatch) -> FakeClock:
+    fake_clock = FakeClock()
+    monkeypatch.setattr(llm_module, "time", fake_clock)
+    return fake_clock
+
+
+@pytest.fixture()
+def fake_body() -> SimpleNamespace:
+    LLMResponseCache._global_cache = None
+    config = SimpleNamespace(
+        llm_cache_enabled=True,
+        llm_cache_ttl=86400,
+        llm_cache_max_entries=5000,
+        llm_max_connections=10,
+    )
+    return SimpleNamespace(
+        config=config,
+        current_task_execution=SimpleNamespace(packs={}),
+        planner_llm=ChatOpenAI(model_name="gpt-4", openai_api_key="test-key"),
+    )
+
+
+@pytest.fixture()
+def stream_requests(monkeypatch, clock) -> list[dict]:
+    requests = []
+
+    async def fake_acreate(**params):
+        requests.append(params)
+
+        async def chunks():
+            for token in TOKENS:
+                # Each token takes a tenth of a second to arrive
+                clock.now += 0.1
+                yield {"choices": [{"delta": {"content": token}}]}
+
+        return chunks()
+
+    monkeypatch.setattr(openai.ChatCompletion, "acreate", fake_acreate)
+    return requests
+
+
+@pytest.mark.asyncio
+async def test_stream_llm_yields_tokens(initialize_tests, fake_body, stream_requests):
+    await initialize_tests
+
+    tokens = [token async for token in stream_llm(fake_body, "plan something")]
+    await close_llm_clients()
+
+    assert tokens == TOKENS
+    assert stream_requests[0]["stream"] is True
+    assert stream_requests[0]["model"] == "gpt-4"
+    assert stream_requests[0]["messages"] == [
+        {"role": "system", "content": "plan something"}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stream_llm_text_throttles_updates(
+    initialize_tests, fake_body, stream_requests
+):
+    await initialize_tests
+    updates = []
+
+    async def on_update(text: str, delta: str):
+        updates.append((text, delta))
+
+    text = await stream_llm_text(fake_body, "plan something", on_update=on_update)
+    await close_llm_clients()
+
+    assert text == "The plan is to exit."
+    assert updates == [
+        ("The plan is ", "The plan is "),
+        ("The plan is to exit.", "to exit."),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stream_llm_caches_final_text(
+    initialize_tests, fake_body, stream_requests
+):
+    await initialize_tests
+
+    [token async for token in stream_llm(fake_body, "plan something")]
+    cached = [token async for token in stream_llm(fake_body, "plan something")]
+    await close_llm_clients()
+
+    assert cached == ["The plan is to exit."]
+    assert len(stream_requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_stream_deletes_partial_plan(
+    initialize_tests, fake_body, monkeypatch
+):
+    await initialize_tests
+
+    async def failing_acreate(**params):
+        async def chunks():
+            yield {"choices": [{"delta": {"content": "The "}}]}
+            raise openai.error.APIConnectionError("Stream dropped")
+
+        return chunks()
+
+    monkeypatch.setattr(openai.ChatCompletion, "acreate", failing_acreate)
+    task_execution = SimpleNamespace(body=fake_body, model_object=SimpleNamespace(id=1))
+
+    with pytest.raises(openai.error.APIConnectionError):
+        await Planner(task_execution).stream_plan("plan something", {})
+    await close_llm_clients()
+
+    assert await Plan.all().count() == 0
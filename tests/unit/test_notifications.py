@@ -0,0 +1,151 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from beebot.api.websocket import NotificationListener, websocket_endpoint
+from beebot.execution.task_state_machine import TaskStateMachine
+from beebot.notifications import (
+    NOTIFICATION_CHANNEL,
+    ORIGIN_KEY,
+    PROCESS_ID,
+    NotificationBus,
+    publish_notification,
+)
+
+
+@pytest.fixture
+def bus(monkeypatch) -> NotificationBus:
+    bus = NotificationBus()
+    monkeypatch.setattr(NotificationBus, "_global_bus", bus)
+    return bus
+
+
+@pytest.mark.asyncio
+async def test_notifications_fan_out_to_every_subscriber(initialize_tests, bus):
+    await initialize_tests
+    queues = [bus.subscribe(), bus.subscribe()]
+
+    await publish_notification({"plan_delta": {"plan_id": 1}})
+
+    for queue in queues:
+        notification = queue.get_nowait()
+        assert notification == {NOTIFICATION_CHANNEL: {"plan_delta": {"plan_id": 1}}}
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_drops_oldest(initialize_tests, bus):
+    await initialize_tests
+    queue = bus.subscribe(queue_size=2)
+
+    for i in range(3):
+        bus.publish({"number": i})
+
+    assert queue.get_nowait() == {"number": 1}
+    assert queue.get_nowait() == {"number": 2}
+
+
+@pytest.mark.asyncio
+async def test_state_transitions_are_published(initialize_tests, bus):
+    await initialize_tests
+    queue = bus.subscribe()
+    state = TaskStateMachine(SimpleNamespace(model_object=SimpleNamespace(id=3)))
+
+    state.oversee()
+    state.decide()
+
+    notifications = [queue.get_nowait()[NOTIFICATION_CHANNEL] for _ in range(2)]
+    assert notifications == [
+        {
+            "task_execution_state": {
+                "task_execution_id": 3,
+                "event": "oversee",
+                "source": "waiting",
+                "state": "oversight",
+            }
+        },
+        {
+            "task_execution_state": {
+                "task_execution_id": 3,
+                "event": "decide",
+                "source": "oversight",
+                "state": "deciding",
+            }
+        },
+    ]
+
+
+@pytest.mark.asyncio
+async def test_listener_skips_own_notifications(initialize_tests, bus):
+    await initialize_tests
+    queue = bus.subscribe()
+    listener = NotificationListener("postgres://unused")
+
+    own_payload = {"plan_delta": {"plan_id": 1}, ORIGIN_KEY: PROCESS_ID}
+    other_payload = {"plan_delta": {"plan_id": 2}, ORIGIN_KEY: "another process"}
+    listener.dispatch(None, 1, NOTIFICATION_CHANNEL, json.dumps(own_payload))
+    listener.dispatch(None, 1, NOTIFICATION_CHANNEL, json.dumps(other_payload))
+    listener.dispatch(None, 1, NOTIFICATION_CHANNEL, "not json")
+
+    notification = queue.get_nowait()
+    assert notification == {NOTIFICATION_CHANNEL: {"plan_delta": {"plan_id": 2}}}
+    assert queue.empty()
+
+
+class FakeWebSocket:
+    def __init__(self, fail_sends: bool = False):
+        self.fail_sends = fail_sends
+        self.sent = []
+        self.messages = asyncio.Queue()
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, data):
+        if self.fail_sends and self.sent:
+            raise RuntimeError("Cannot call send once a close message has been sent")
+        self.sent.append(data)
+
+    async def receive(self):
+        return await self.messages.get()
+
+
+async def start_endpoint(websocket: FakeWebSocket, bus: NotificationBus, monkeypatch):
+    config = SimpleNamespace(notification_queue_size=10)
+    monkeypatch.setattr("beebot.config.Config._global_config", config)
+    endpoint = asyncio.create_task(websocket_endpoint(websocket))
+    while not bus.subscribers and not endpoint.done():
+        await asyncio.sleep(0)
+    assert bus.subscribers
+    return endpoint
+
+
+@pytest.mark.asyncio
+async def test_websocket_unsubscribes_when_client_leaves(
+    initialize_tests, bus, monkeypatch
+):
+    await initialize_tests
+    websocket = FakeWebSocket()
+    endpoint = await start_endpoint(websocket, bus, monkeypatch)
+
+    # No notification is ever published, the disconnect is noticed by the receive loop
+    await websocket.messages.put({"type": "websocket.disconnect", "code": 1000})
+    await asyncio.wait_for(endpoint, timeout=1)
+
+    assert websocket.sent == [{"ready": True}]
+    assert not bus.subscribers
+
+
+@pytest.mark.asyncio
+async def test_websocket_unsubscribes_when_send_fails(
+    initialize_tests, bus, monkeypatch
+):
+    await initialize_tests
+    websocket = FakeWebSocket(fail_sends=True)
+    endpoint = await start_endpoint(websocket, bus, monkeypatch)
+
+    bus.publish({"plan_delta": {"plan_id": 1}})
+    await asyncio.wait_for(endpoint, timeout=1)
+
+    assert not bus.subscribers
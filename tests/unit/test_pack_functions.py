@@ -0,0 +1,72 @@
+import pytest
+from autopack import Pack
+from pydantic import BaseModel, Field
+
+from beebot.body import pack_utils
+from beebot.body.pack_utils import (
+    functions_detail_list,
+    openai_functions,
+    precompute_pack_functions,
+)
+
+
+class GreetArgs(BaseModel):
+    name: str = Field(..., description="Who to greet")
+    loud: bool = Field(False, description="Whether to shout")
+
+
+class GreetPack(Pack):
+    name = "greet"
+    description = "Greet someone"
+    args_schema = GreetArgs
+
+    def _run(self, name: str, loud: bool = False) -> str:
+        return f"Hello {name}"
+
+    async def _arun(self, name: str, loud: bool = False) -> str:
+        return self._run(name, loud)
+
+
+@pytest.fixture
+def empty_caches(monkeypatch):
+    monkeypatch.setattr(pack_utils, "_functions_detail_lists", {})
+    monkeypatch.setattr(pack_utils, "_openai_functions", {})
+
+
+@pytest.mark.asyncio
+async def test_functions_are_rendered_once_per_pack_set(
+    initialize_tests, empty_caches, monkeypatch
+):
+    await initialize_tests
+    rendered = []
+    render = pack_utils.format_packs_to_openai_functions
+
+    def counting_render(packs):
+        rendered.append(packs)
+        return render(packs)
+
+    monkeypatch.setattr(pack_utils, "format_packs_to_openai_functions", counting_render)
+
+    first = openai_functions([GreetPack()])
+    second = openai_functions([GreetPack()])
+
+    assert first is second
+    assert len(rendered) == 1
+    assert functions_detail_list([GreetPack()]) == "greet(name: str, loud: bool)"
+
+
+@pytest.mark.asyncio
+async def test_precomputed_functions_match_instances(initialize_tests, empty_caches):
+    await initialize_tests
+    precompute_pack_functions([GreetPack])
+    precomputed = (
+        functions_detail_list([GreetPack()]),
+        openai_functions([GreetPack()]),
+    )
+
+    pack_utils._functions_detail_lists.clear()
+    pack_utils._openai_functions.clear()
+    assert precomputed == (
+        functions_detail_list([GreetPack()]),
+        openai_functions([GreetPack()]),
+    )
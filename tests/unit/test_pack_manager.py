@@ -0,0 +1,100 @@
+from types import SimpleNamespace
+from typing import ClassVar
+
+import pytest
+from autopack import Pack
+from autopack.pack_config import PackConfig
+
+from beebot.body import pack_manager
+from beebot.body.pack_manager import PackManager
+from beebot.packs.delegate_task import DelegateTask
+
+
+class CountingPack(Pack):
+    name = "counting"
+    description = "Counts its lifecycle events"
+
+    instances: ClassVar[int] = 0
+    warm_ups: ClassVar[int] = 0
+    teardowns: ClassVar[int] = 0
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        CountingPack.instances += 1
+
+    async def warm_up(self):
+        CountingPack.warm_ups += 1
+
+    async def teardown(self):
+        CountingPack.teardowns += 1
+
+    def _run(self) -> str:
+        return "counted"
+
+    async def _arun(self) -> str:
+        return self._run()
+
+
+@pytest.fixture
+def counting_pack(monkeypatch):
+    monkeypatch.setattr(pack_manager, "_warmed_up_pack_classes", set())
+    CountingPack.instances = CountingPack.warm_ups = CountingPack.teardowns = 0
+    return CountingPack
+
+
+def fake_body() -> SimpleNamespace:
+    return SimpleNamespace(config=SimpleNamespace(), pack_config=PackConfig())
+
+
+@pytest.mark.asyncio
+async def test_packs_are_created_once_per_body(initialize_tests, counting_pack):
+    await initialize_tests
+    manager = PackManager(fake_body())
+
+    first = await manager.get_packs([counting_pack])
+    second = await manager.get_packs([counting_pack])
+
+    assert first["counting"] is second["counting"]
+    assert counting_pack.instances == 1
+
+
+@pytest.mark.asyncio
+async def test_warm_up_runs_once_per_process(initialize_tests, counting_pack):
+    await initialize_tests
+    first_manager = PackManager(fake_body())
+    second_manager = PackManager(fake_body())
+
+    await first_manager.get_packs([counting_pack])
+    await second_manager.get_packs([counting_pack])
+    assert counting_pack.instances == 2
+    assert counting_pack.warm_ups == 1
+
+    await first_manager.teardown()
+    assert counting_pack.teardowns == 1
+    assert first_manager.packs == {}
+
+
+@pytest.mark.asyncio
+async def test_delegated_task_tears_down_subagent(initialize_tests, monkeypatch):
+    await initialize_tests
+    teardowns = []
+
+    class FakeSubagent:
+        def __init__(self, task: str, workspace_path: str):
+            self.pack_manager = SimpleNamespace(teardown=self.teardown)
+
+        async def setup(self):
+            pass
+
+        async def cycle(self):
+            raise RuntimeError("The subagent failed")
+
+        async def teardown(self):
+            teardowns.append(self)
+
+    monkeypatch.setattr("beebot.body.Body", FakeSubagent)
+
+    delegator = SimpleNamespace(body=SimpleNamespace(workspace_path="workspace"))
+    output = await DelegateTask._arun(delegator, "Do something")
+    assert output == "Error: The subagent failed"
+    assert len(teardowns) == 1
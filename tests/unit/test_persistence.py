@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import pytest
+
+from beebot.execution import Step
+from beebot.execution.task_execution import TaskExecution
+from beebot.models.database_models import (
+    BodyModel,
+    Decision,
+    Observation,
+    StepModel,
+    TaskExecutionModel,
+)
+
+
+async def saved_task_execution(step_count: int) -> TaskExecution:
+    body = SimpleNamespace(
+        model_object=await BodyModel.create(task="Read some files"),
+    )
+    task_execution = TaskExecution(body, instructions="Read some files")
+    for _ in range(step_count):
+        decision = await Decision.create(tool_name="read_file")
+        task_execution.steps.append(
+            Step(task_execution=task_execution, decision=decision)
+        )
+    await task_execution.save()
+    return task_execution
+
+
+@pytest.mark.asyncio
+async def test_unchanged_save_writes_nothing(initialize_tests, query_counter):
+    await initialize_tests
+    task_execution = await saved_task_execution(20)
+
+    query_counter.queries.clear()
+    await task_execution.save()
+
+    assert query_counter.queries == []
+
+
+@pytest.mark.asyncio
+async def test_only_changed_rows_are_written(initialize_tests, query_counter):
+    await initialize_tests
+    task_execution = await saved_task_execution(20)
+
+    query_counter.queries.clear()
+    await task_execution.add_observation(Observation(response="contents"))
+    task_execution.complete = True
+    await task_execution.save()
+
+    inserts = [query for query in query_counter.queries if "INSERT" in query]
+    updates = [query for query in query_counter.queries if "UPDATE" in query]
+    # The new observation, then the current step and the task execution
+    assert len(inserts) == 1
+    assert len(updates) == 2
+
+    step_model = await StepModel.get(id=task_execution.current_step.model_object.id)
+    assert (await step_model.observation).response == "contents"
+    task_execution_model = await TaskExecutionModel.get(
+        id=task_execution.model_object.id
+    )
+    assert task_execution_model.complete
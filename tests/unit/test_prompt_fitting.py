@@ -0,0 +1,54 @@
+import pytest
+
+from beebot.body import tokens
+from beebot.body.tokens import context_window, fit_prompt_variables
+
+TEMPLATE = "Task: {task}\nFiles: {file_list}\nHistory: {history}"
+
+
+@pytest.mark.asyncio
+async def test_context_window_uses_longest_prefix(initialize_tests):
+    await initialize_tests
+    assert context_window("gpt-4-0613") == 8192
+    assert context_window("gpt-3.5-turbo-16k-0613") == 16384
+    assert context_window("some-other-model") == tokens.DEFAULT_CONTEXT_WINDOW
+
+
+@pytest.mark.asyncio
+async def test_prompt_that_fits_is_untouched(initialize_tests, monkeypatch):
+    await initialize_tests
+    monkeypatch.setattr(tokens, "encoding_for_model", lambda model_name: None)
+    prompt_variables = {"task": "Do it", "file_list": "a.txt", "history": "Done"}
+
+    fitted = fit_prompt_variables(TEMPLATE, prompt_variables, "gpt-4")
+
+    assert {name: fitted[name] for name in prompt_variables} == prompt_variables
+    assert fitted["token_counts"]["task"] == 2
+
+
+@pytest.mark.asyncio
+async def test_sections_are_truncated_by_priority(initialize_tests, monkeypatch):
+    await initialize_tests
+    monkeypatch.setattr(tokens, "encoding_for_model", lambda model_name: None)
+    monkeypatch.setattr(tokens, "MODEL_CONTEXT_WINDOWS", {"gpt-4": 1000})
+    prompt_variables = {
+        "task": "Do it",
+        "file_list": "f" * 800,
+        "history": "first step\n" + "h" * 3600 + "\nlatest step",
+    }
+
+    fitted = fit_prompt_variables(
+        TEMPLATE, prompt_variables, "gpt-4", {"response": 200}
+    )
+
+    token_counts = fitted["token_counts"]
+    # The file list goes first, then only as much history as needed
+    assert token_counts["file_list"] == 0
+    assert 0 < token_counts["history"] < 800
+    assert fitted["history"].startswith("first step")
+    assert fitted["history"].endswith("latest step")
+    assert fitted["task"] == "Do it"
+    assert token_counts["response"] == 200
+    assert (
+        sum(token_counts.values()) <= 1000
+    ), "the prompt and reserved tokens fit in the context window"
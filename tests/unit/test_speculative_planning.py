@@ -0,0 +1,85 @@
+import pytest
+
+from beebot.execution import Step
+from beebot.execution.task_execution import PROVISIONAL_OBSERVATION, TaskExecution
+from beebot.models.database_models import Decision, Plan
+from beebot.planner import Planner
+
+
+class FakePack:
+    name = "read_file"
+    description = "Read a file"
+    args = {"filename": {"name": "filename", "type": "string"}}
+
+    def __init__(self, result: str):
+        self.result = result
+
+    async def arun(self, **kwargs) -> str:
+        return self.result
+
+
+@pytest.fixture()
+def planning_prompts(monkeypatch) -> list[str]:
+    prompts = []
+
+    async def fake_plan_from_prompt(self, prompt, prompt_variables) -> Plan:
+        prompts.append(prompt)
+        return await Plan.create(plan_text="Write the file", prompt_variables={})
+
+    monkeypatch.setattr(Planner, "plan_from_prompt", fake_plan_from_prompt)
+    return prompts
+
+
+@pytest.fixture()
+def executing_task(fake_task_body):
+    async def make_executing_task(pack_result: str) -> TaskExecution:
+        body = await fake_task_body("Read a file", speculative_planning=True)
+        body.current_task_execution = task_execution = TaskExecution(
+            body, instructions="Read a file"
+        )
+        task_execution.packs = {"read_file": FakePack(pack_result)}
+
+        decision = await Decision.create(
+            tool_name="read_file", tool_args={"filename": "a.txt"}
+        )
+        task_execution.steps.append(
+            Step(task_execution=task_execution, decision=decision)
+        )
+        await task_execution.save()
+        task_execution.state.oversee()
+        task_execution.state.decide()
+        task_execution.state.execute()
+        return task_execution
+
+    return make_executing_task
+
+
+@pytest.mark.asyncio
+async def test_speculative_plan_kept_on_success(
+    initialize_tests, planning_prompts, executing_task
+):
+    await initialize_tests
+    task_execution = await executing_task("file contents")
+
+    assert task_execution.can_plan_speculatively(task_execution.current_step.decision)
+    plan = await task_execution.execute_and_plan(task_execution.current_step.decision)
+
+    assert plan.plan_text == "Write the file"
+    assert PROVISIONAL_OBSERVATION in planning_prompts[0]
+    assert task_execution.current_step.observation.response == "file contents"
+    assert PROVISIONAL_OBSERVATION not in task_execution.variables
+    assert task_execution.state.current_state.id == "oversight"
+
+
+@pytest.mark.asyncio
+async def test_speculative_plan_discarded_on_error(
+    initialize_tests, planning_prompts, executing_task
+):
+    await initialize_tests
+    task_execution = await executing_task("Error: File not found")
+
+    plan = await task_execution.execute_and_plan(task_execution.current_step.decision)
+
+    assert plan is None
+    assert await Plan.all().count() == 0
+    assert task_execution.state.current_state.id == "planning"
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from beebot.api.step_runner import StepRunner
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded(initialize_tests):
+    await initialize_tests
+    runner = StepRunner(max_concurrent_steps=2)
+    running = 0
+    max_running = 0
+    release = asyncio.Event()
+
+    async def run_step():
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await release.wait()
+        running -= 1
+
+    jobs = [runner.submit(1, step_id, run_step()) for step_id in range(5)]
+    await asyncio.sleep(0.01)
+    assert max_running == 2
+    assert not any(job.done for job in jobs)
+
+    release.set()
+    await asyncio.gather(*(job.asyncio_task for job in jobs))
+    assert max_running == 2
+    assert all(job.status == "completed" for job in jobs)
+
+
+@pytest.mark.asyncio
+async def test_failures_are_recorded(initialize_tests):
+    await initialize_tests
+    runner = StepRunner()
+
+    async def run_step():
+        raise ValueError("No decision supplied")
+
+    job = runner.submit(1, 7, run_step())
+    await job.asyncio_task
+
+    assert runner.job(7) is job
+    assert job.status == "failed"
+    assert job.error == "No decision supplied"
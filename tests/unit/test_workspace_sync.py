@@ -0,0 +1,168 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import beebot.body  # noqa: F401
+from beebot.config import database_file_manager
+from beebot.config.database_file_manager import DatabaseFileManager
+from beebot.execution import Step
+from beebot.models.database_models import (
+    BlobModel,
+    BodyModel,
+    DocumentStep,
+    Oversight,
+    StepModel,
+    TaskExecutionModel,
+)
+
+FILE_COUNT = 200
+
+
+@pytest.fixture
+def opened_files(monkeypatch) -> list[str]:
+    opened = []
+
+    def counting_open(path, *args, **kwargs):
+        opened.append(os.path.basename(path))
+        return open(path, *args, **kwargs)
+
+    monkeypatch.setattr(database_file_manager, "open", counting_open, raising=False)
+    return opened
+
+
+async def synced_file_manager(workspace: str) -> DatabaseFileManager:
+    body = await BodyModel.create(task="Sync the workspace")
+    task_execution = await TaskExecutionModel.create(
+        body=body, agent="GeneralistAgent", instructions=body.task
+    )
+    oversight = await Oversight.create(original_plan_text="", modified_plan_text="")
+    step_model = await StepModel.create(
+        task_execution=task_execution, oversight=oversight
+    )
+    file_manager = DatabaseFileManager(
+        body=SimpleNamespace(
+            current_task_execution=SimpleNamespace(
+                steps=[Step(model_object=step_model)]
+            ),
+            workspace_path=workspace,
+            config=SimpleNamespace(
+                large_file_threshold=10 * 1024 * 1024,
+                large_file_store_path=os.path.join(workspace, ".large_files"),
+            ),
+        )
+    )
+
+    for i in range(FILE_COUNT):
+        with open(os.path.join(workspace, f"file_{i}.txt"), "w") as f:
+            f.write(f"File {i}")
+    await file_manager.load_from_directory()
+    return file_manager
+
+
+@pytest.mark.asyncio
+async def test_load_ingests_only_changed_files(
+    initialize_tests, tmp_path, opened_files, query_counter
+):
+    await initialize_tests
+    file_manager = await synced_file_manager(str(tmp_path))
+    step_model = file_manager.current_step.model_object
+    assert await DocumentStep.filter(step=step_model).count() == FILE_COUNT
+
+    opened_files.clear()
+    query_counter.queries.clear()
+    await file_manager.load_from_directory()
+    assert opened_files == []
+    assert query_counter.queries == []
+
+    with open(tmp_path / "file_7.txt", "w") as f:
+        f.write("File 7, edited")
+    await file_manager.load_from_directory()
+    assert opened_files == ["file_7.txt"]
+    assert len(query_counter.queries) < 15
+    assert await file_manager.aread_file("file_7.txt") == "File 7, edited"
+    assert await DocumentStep.filter(step=step_model).count() == FILE_COUNT
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_only_changed_documents(
+    initialize_tests, tmp_path, opened_files
+):
+    await initialize_tests
+    file_manager = await synced_file_manager(str(tmp_path))
+
+    opened_files.clear()
+    await file_manager.flush_to_directory()
+    assert opened_files == []
+
+    await file_manager.awrite_file("file_3.txt", "File 3, edited")
+    await file_manager.flush_to_directory()
+    assert opened_files == ["file_3.txt"]
+    assert (tmp_path / "file_3.txt").read_text() == "File 3, edited"
+
+    # Files changed on disk behind its back are written again
+    (tmp_path / "file_4.txt").write_text("Overwritten")
+    opened_files.clear()
+    await file_manager.flush_to_directory()
+    assert opened_files == ["file_4.txt"]
+    assert (tmp_path / "file_4.txt").read_text() == "File 4"
+
+
+@pytest.mark.asyncio
+async def test_nested_directories_are_synced(initialize_tests, tmp_path):
+    await initialize_tests
+    file_manager = await synced_file_manager(str(tmp_path))
+
+    (tmp_path / "src" / "app").mkdir(parents=True)
+    (tmp_path / "src" / "app" / "main.py").write_text("print('hi')")
+    (tmp_path / "__pycache__").mkdir()
+    (tmp_path / "__pycache__" / "main.pyc").write_text("")
+    await file_manager.load_from_directory()
+    assert await file_manager.alist_files("src") == "src/app/main.py"
+
+    await file_manager.awrite_file("src/app/util.py", "VALUE = 1")
+    await file_manager.awrite_file("../outside.txt", "Not allowed")
+    await file_manager.flush_to_directory()
+    assert (tmp_path / "src" / "app" / "util.py").read_text() == "VALUE = 1"
+    assert not (tmp_path.parent / "outside.txt").exists()
+
+
+@pytest.mark.asyncio
+async def test_symlinks_are_not_followed(initialize_tests, tmp_path):
+    await initialize_tests
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    (outside / "secret.txt").write_text("Secret")
+    workspace = tmp_path / "workspace"
+    workspace.mkdir()
+    (workspace / "notes.txt").write_text("Notes")
+    (workspace / "linked_dir").symlink_to(outside, target_is_directory=True)
+    (workspace / "linked_file.txt").symlink_to(outside / "secret.txt")
+    (workspace / "loop").symlink_to(workspace, target_is_directory=True)
+
+    names = [name for name, _path in database_file_manager.workspace_files(workspace)]
+    assert names == ["notes.txt"]
+
+
+@pytest.mark.asyncio
+async def test_binary_files_round_trip(initialize_tests, tmp_path):
+    await initialize_tests
+    file_manager = await synced_file_manager(str(tmp_path))
+
+    image = b"\x89PNG\r\n\x1a\n" + bytes(range(256))
+    (tmp_path / "plot.png").write_bytes(image)
+    (tmp_path / "data.bin").write_bytes(b"\xff\xfe\x00\x01")
+    await file_manager.load_from_directory()
+
+    plot = (await file_manager.documents_index())["plot.png"]
+    assert plot.content_type == "image/png"
+    assert plot.size == len(image)
+    assert (await BlobModel.get(hash=plot.content_hash)).content == image
+    assert "binary file" in await file_manager.aread_file("data.bin")
+    assert await file_manager.aread_bytes("plot.png", 0, 4) == b"\x89PNG"
+
+    flushed = tmp_path / "flushed"
+    await file_manager.flush_to_directory(str(flushed))
+    assert (flushed / "plot.png").read_bytes() == image
+    assert (flushed / "data.bin").read_bytes() == b"\xff\xfe\x00\x01"
+    assert (flushed / "file_1.txt").read_text() == "File 1"